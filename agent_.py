@@ -1,19 +1,39 @@
 
+import asyncio
+import atexit
+import json
 import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
 from dotenv import load_dotenv
-from llama_index.llms.groq import Groq
 from llama_index.core.agent import ReActAgent
 from llama_index.core.tools import FunctionTool
 from llama_index.core import Settings
-from llama_index.core.tools import QueryEngineTool
-from llama_index.core.node_parser import SentenceSplitter
-from llama_index.core import SimpleDirectoryReader, VectorStoreIndex
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.memory.mem0 import Mem0Memory
-from llama_index.core.chat_engine import SimpleChatEngine
-from typing import List, Dict, Any
+from llama_index.core.callbacks import CallbackManager
+from llama_index.core.memory import ChatMemoryBuffer
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.query_engine import RetrieverQueryEngine
+from typing import List, Dict, Any, AsyncIterator, Callable, Iterator, Optional, Tuple
 import logging
 
+from agent_tracing import AgentTracer
+from context_memory import CompactingChatMemory, LLMSummarizer
+from fast_router import FastRouter, Route
+from local_memory import LocalMemory
+from memory_writer import MemoryWriter
+from movie_catalog import MAX_COUNT, MAX_SEARCH_LIMIT, MovieCatalog
+from response_cache import SemanticCache, TTLCache, memoize, refers_to_context, refers_to_user
+from safe_calculator import SafeCalculator
+from stream_events import ToolEventHandler
+
+# Heavy integrations (torch/MiniLM, Mem0, the Groq SDK and the index readers) are
+# imported inside the setup methods so that lazy mode does not pay for them at import.
+
 # Load environment variables
 load_dotenv()
 
@@ -21,57 +41,384 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Chat session of the turn running in the current context, so shared tools can scope memory reads to it
+_current_session: ContextVar[Optional[str]] = ContextVar("agent_session", default=None)
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    """Read a boolean flag from the environment."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _format_rating(rating: Optional[float]) -> str:
+    """Render a catalog rating out of 10, or N/A when the catalog has none."""
+    return "N/A" if rating is None else f"{rating}/10"
+
+
+class _ChatSession:
+    """Per-session agent state: its own agent and a lock serializing its turns."""
+    
+    def __init__(self, agent: ReActAgent):
+        self.agent = agent
+        self.lock = asyncio.Lock()
+
 
 class AIAgent:
     """A comprehensive AI Agent using LlamaIndex with Groq LLM, memory, and tools."""
     
-    def __init__(self, groq_api_key: str, documents_path: str = None):
+    DEFAULT_SESSION = "default"
+    
+    def __init__(self, groq_api_key: str, documents_path: str = None, index_dir: str = None,
+                 lazy: bool = None, warmup: bool = None, max_concurrency: int = None,
+                 max_sessions: int = None, llm: Any = None, embed_model: Any = None,
+                 memory: Any = None, agent_mode: str = None, fast_router: bool = None,
+                 knowledge_index: Any = None, watch_documents: bool = None):
         """
         Initialize the AI Agent.
         
         Args:
             groq_api_key: API key for Groq
             documents_path: Path to documents for knowledge base (optional)
+            index_dir: Directory where the knowledge base index is persisted (optional)
+            lazy: Build the embedding model, knowledge base and Mem0 on first use
+                (defaults to the AGENT_LAZY_INIT environment variable)
+            warmup: In lazy mode, build the deferred components in a background thread
+                (defaults to the AGENT_WARMUP environment variable)
+            max_concurrency: Maximum number of async chat turns running at once
+            max_sessions: Maximum number of chat sessions kept in memory
+            llm: Pre-built LLM to use instead of Groq (e.g. a local stand-in for benchmarks)
+            embed_model: Pre-built embedding model to use instead of HuggingFace
+            memory: Pre-built memory with Mem0's ``add``/``search`` interface to use instead of Mem0
+            agent_mode: "react" or "parallel" (defaults to the AGENT_MODE environment variable)
+            fast_router: Answer trivial requests (arithmetic, weather, exact movie titles) with a
+                direct tool call instead of the agent (defaults to the FAST_ROUTER environment variable)
+            knowledge_index: Already loaded ``PersistentKnowledgeIndex`` to serve from (e.g. one
+                loaded before forking server workers) instead of loading it from ``index_dir``
+            watch_documents: Re-index created, modified and deleted documents in the background
+                while running (defaults to the KB_WATCH environment variable)
         """
         self.groq_api_key = groq_api_key
         self.documents_path = documents_path
+        self.index_dir = index_dir or os.getenv("INDEX_DIR", "./storage")
+        
+        # Knowledge base: "synthesize" answers lookups with a separate LLM call,
+        # "retrieve" hands the top chunks straight to the agent
+        self.kb_mode = os.getenv("KB_MODE", "synthesize").lower()
+        if self.kb_mode not in ("synthesize", "retrieve"):
+            logger.warning(f"Unknown KB_MODE '{self.kb_mode}', using 'synthesize'")
+            self.kb_mode = "synthesize"
+        self.kb_chunk_size = int(os.getenv("KB_CHUNK_SIZE", "1024"))
+        self.kb_chunk_overlap = int(os.getenv("KB_CHUNK_OVERLAP", "200"))
+        self.kb_context_tokens = int(os.getenv("KB_CONTEXT_TOKENS", "1500"))
+        # Live re-indexing of the documents directory (not for a shared, preloaded index)
+        self.watch_documents = _env_flag("KB_WATCH") if watch_documents is None else watch_documents
+        self.kb_watcher = None
+        self.kb_update_timings = deque(maxlen=1000)
+        
+        # Agent loop: "react" takes one LLM step per tool call; "parallel" uses native
+        # function calling and runs the independent tool calls of a step concurrently
+        self.agent_mode = (agent_mode or os.getenv("AGENT_MODE", "react")).lower()
+        if self.agent_mode not in ("react", "parallel"):
+            logger.warning(f"Unknown AGENT_MODE '{self.agent_mode}', using 'react'")
+            self.agent_mode = "react"
+        self.tool_executor = None
+        if self.agent_mode == "parallel":
+            self.tool_executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("PARALLEL_TOOL_WORKERS", "8")),
+                thread_name_prefix="agent-tool"
+            )
+        # Context compaction: recent turns verbatim, older turns in a running summary,
+        # every request within CONTEXT_TOKEN_BUDGET tokens
+        self.context_compaction = _env_flag("CONTEXT_COMPACTION", True)
+        self.context_keep_turns = int(os.getenv("CONTEXT_KEEP_TURNS", "4"))
+        self.context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+        self.context_summary_tokens = int(os.getenv("CONTEXT_SUMMARY_TOKENS", "400"))
+        self.context_summary_mode = os.getenv("CONTEXT_SUMMARY", "llm").lower()
+        self.summary_executor = None
+        if self.context_compaction:
+            self.summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="context-summary")
+        self._prompt_overhead_tokens = None
+        # Prompt token accounting of recent agent turns
+        self.turn_contexts = deque(maxlen=1000)
+        self.fast_router_enabled = _env_flag("FAST_ROUTER", True) if fast_router is None else fast_router
+        self.router = None
+        self.lazy = _env_flag("AGENT_LAZY_INIT") if lazy is None else lazy
+        self._llm_override = llm
+        self._embed_model_override = embed_model
+        self._memory_override = memory
+        self._knowledge_index_override = knowledge_index
+        self.llm_gateway = None
+        # Long-term memory: "mem0" (cloud), "local" (SQLite + memory-mapped vectors),
+        # "none", or "auto" (Mem0 when MEM0_API_KEY is set, local otherwise)
+        self.memory_backend = os.getenv("MEMORY_BACKEND", "auto").lower()
+        if self.memory_backend not in ("auto", "mem0", "local", "none"):
+            logger.warning(f"Unknown MEMORY_BACKEND '{self.memory_backend}', using 'auto'")
+            self.memory_backend = "auto"
+        
+        # Per-component startup timings in seconds, filled in as components are built
+        self.startup_timings: Dict[str, float] = {}
+        self._component_locks = {
+            name: threading.Lock() for name in ("embeddings", "memory", "knowledge_base", "recommender")
+        }
+        self._ready = set()
+        self.embed_model = None
+        self.memory = None
+        self.session_id = None
+        self.session_start = None
+        self.query_engine = None
+        self.kb_retriever = None
+        self.knowledge_index = None
+        self.movie_catalog = None
+        self.recommender = None
+        self._warmup_thread = None
+        
+        # Async multi-session serving
+        self.max_concurrency = max_concurrency or int(os.getenv("AGENT_MAX_CONCURRENCY", "8"))
+        self.max_sessions = max_sessions or int(os.getenv("AGENT_MAX_SESSIONS", "1000"))
+        self._sessions: "OrderedDict[str, _ChatSession]" = OrderedDict()
+        self._sessions_lock = threading.Lock()
+        self._semaphore = None
+        self._semaphore_loop = None
+        
+        # Structured spans per chat turn (TRACE_EXPORT=jsonl|otlp), off by default
+        try:
+            self.tracer = AgentTracer.from_env(self.index_dir)
+        except Exception as e:
+            logger.warning(f"Tracing disabled: {e}")
+            self.tracer = None
+        
+        # Memory writes happen in the background, batched, off the response path
+        self.memory_writer = MemoryWriter(
+            self._get_memory,
+            max_queue=int(os.getenv("MEMORY_QUEUE_SIZE", "1000")),
+            max_batch=int(os.getenv("MEMORY_BATCH_SIZE", "8")),
+            max_wait=float(os.getenv("MEMORY_FLUSH_INTERVAL", "0.5")),
+            tracer=self.tracer
+        )
+        atexit.register(self.close)
+        
+        # Deterministic tool results are memoized; final answers are optionally
+        # cached by query embedding (SEMANTIC_CACHE=true)
+        self.tool_cache_enabled = _env_flag("TOOL_CACHE", True)
+        self.tool_caches: Dict[str, TTLCache] = {}
+        self.answer_cache = None
+        if _env_flag("SEMANTIC_CACHE"):
+            self.answer_cache = SemanticCache(
+                threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+                max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", "10000")),
+                ttl=float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+            )
+        
+        # Tool calls are reported to streaming callers as they happen
+        self.tool_events = ToolEventHandler()
+        self.callback_manager = CallbackManager(
+            [self.tool_events] + ([self.tracer] if self.tracer is not None else [])
+        )
+        # The knowledge base index and query engine pick up callbacks from Settings
+        Settings.callback_manager = self.callback_manager
+        # Time to first token and total time of recent streamed turns
+        self.turn_timings = deque(maxlen=1000)
         
         # Initialize components
-        self._setup_llm()
-        self._setup_embeddings()
-        self._setup_memory()
-        self._setup_knowledge_base()
-        self._setup_tools()
-        self._setup_agent()
+        with self._timed("llm"):
+            self._setup_llm()
+        with self._timed("movie_catalog"):
+            self._setup_movie_catalog()
+        if not self.lazy:
+            self._ensure_embeddings()
+            self._ensure_memory()
+            self._ensure_knowledge_base()
+            self._ensure_recommender()
+        with self._timed("tools"):
+            self._setup_tools()
+        with self._timed("agent"):
+            self._setup_agent()
+        with self._timed("router"):
+            self._setup_router()
+        self._log_startup_timings()
+        
+        if self.lazy and (_env_flag("AGENT_WARMUP") if warmup is None else warmup):
+            self.warmup()
+    
+    @contextmanager
+    def _timed(self, component: str):
+        """Record how long building a component takes."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup_timings[component] = time.perf_counter() - start
+    
+    def _log_startup_timings(self):
+        """Log the startup time breakdown per component."""
+        breakdown = ", ".join(f"{name}={seconds:.2f}s" for name, seconds in self.startup_timings.items())
+        deferred = [name for name in self._component_locks if name not in self._ready]
+        if deferred:
+            breakdown += f" (deferred: {', '.join(deferred)})"
+        logger.info(f"Startup timings: {breakdown}")
+    
+    def _ensure(self, component: str, setup):
+        """Build a component once, on first use; safe to call from several threads."""
+        if component in self._ready:
+            return
+        with self._component_locks[component]:
+            if component in self._ready:
+                return
+            with self._timed(component):
+                setup()
+            self._ready.add(component)
+        if self.lazy:
+            logger.info(f"Lazily initialized {component} in {self.startup_timings[component]:.2f}s")
+    
+    def _ensure_embeddings(self):
+        """Build the embedding model if it has not been built yet."""
+        self._ensure("embeddings", self._setup_embeddings)
+    
+    def _ensure_memory(self):
+        """Connect to Mem0 if it has not been set up yet."""
+        self._ensure("memory", self._setup_memory)
+    
+    def _ensure_knowledge_base(self):
+        """Load or build the knowledge base index if it has not been built yet."""
+        def setup():
+            self._ensure_embeddings()
+            self._setup_knowledge_base()
+        self._ensure("knowledge_base", setup)
+    
+    def _ensure_recommender(self):
+        """Load or build the movie recommendation vectors if they have not been loaded yet."""
+        def setup():
+            self._ensure_embeddings()
+            self._setup_recommender()
+        self._ensure("recommender", setup)
+    
+    def warmup(self) -> threading.Thread:
+        """
+        Build the deferred components in a background thread.
+        
+        Returns:
+            The warm-up thread (already started)
+        """
+        def run():
+            start = time.perf_counter()
+            for ensure in (self._ensure_embeddings, self._ensure_knowledge_base,
+                           self._ensure_recommender, self._ensure_memory):
+                try:
+                    ensure()
+                except Exception as e:
+                    logger.warning(f"Warm-up step failed: {e}")
+            logger.info(f"Background warm-up finished in {time.perf_counter() - start:.2f}s")
+            self._log_startup_timings()
+        
+        if self._warmup_thread is None:
+            self._warmup_thread = threading.Thread(target=run, name="agent-warmup", daemon=True)
+            self._warmup_thread.start()
+        return self._warmup_thread
     
     def _setup_llm(self):
         """Set up the Groq LLM."""
-        self.llm = Groq(
-            model="llama3-70b-8192",
-            api_key=self.groq_api_key,
-            temperature=0.1
-        )
+        if self._llm_override is not None:
+            self.llm = self._llm_override
+            Settings.llm = self.llm
+            logger.info(f"Using provided LLM {type(self.llm).__name__}")
+            return
+        
+        from llama_index.llms.groq import Groq
+        from llm_gateway import GROQ_API_BASE, LLMGateway
+        
+        model = os.getenv("GROQ_MODEL", "llama3-70b-8192")
+        api_base = os.getenv("GROQ_API_BASE", GROQ_API_BASE)
+        if _env_flag("LLM_GATEWAY", default=True):
+            # Pooled connections, rate-limit scheduling, retries, hedging and model
+            # fallback happen in the gateway, so the client's own retries are off
+            self.llm_gateway = LLMGateway.from_env(model)
+            self.llm = Groq(
+                model=model,
+                api_key=self.groq_api_key,
+                api_base=api_base,
+                temperature=0.1,
+                max_retries=0,
+                timeout=self.llm_gateway.deadline,
+                http_client=self.llm_gateway.client(),
+                async_http_client=self.llm_gateway.async_client()
+            )
+        else:
+            self.llm = Groq(
+                model=model,
+                api_key=self.groq_api_key,
+                api_base=api_base,
+                temperature=0.1
+            )
         Settings.llm = self.llm
-        logger.info("Groq LLM initialized successfully")
+        logger.info(f"Groq LLM initialized successfully ({model} at {api_base})")
     
     def _setup_embeddings(self):
-        """Set up HuggingFace embeddings."""
-        self.embed_model = HuggingFaceEmbedding(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
+        """Set up the embedding model (EMBED_BACKEND) behind a shared on-disk cache."""
+        from embedding_cache import CachedEmbedding, EmbeddingCacheStore
+        
+        if self._embed_model_override is not None:
+            self.embed_model = self._embed_model_override
+        else:
+            from fast_embedding import create_embed_model
+            
+            # "huggingface" (fp32 PyTorch) or a CPU-optimized backend: int8, onnx, onnx-int8
+            self.embed_model = create_embed_model()
+        
+        # Cache embeddings by model name and text hash; the SQLite file can be
+        # shared by every worker process on the host. Set EMBED_CACHE_PATH to an
+        # empty string to disable it.
+        cache_path = os.getenv("EMBED_CACHE_PATH", os.path.join(self.index_dir, "embedding_cache.sqlite"))
+        if cache_path:
+            try:
+                store = EmbeddingCacheStore(
+                    cache_path,
+                    max_entries=int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "200000"))
+                )
+                self.embed_model = CachedEmbedding(self.embed_model, store)
+                logger.info(f"Embedding cache enabled at {cache_path}")
+            except Exception as e:
+                logger.warning(f"Embedding cache unavailable, embedding without it: {e}")
+        
+        # Report embedding batches to the agent's callbacks (tracing)
+        self.embed_model.callback_manager = self.callback_manager
         Settings.embed_model = self.embed_model
-        logger.info("HuggingFace embeddings initialized successfully")
+        logger.info(f"Embeddings initialized successfully ({self.embed_model.model_name})")
+    
+    def embedding_cache_stats(self) -> Dict[str, Any]:
+        """Return embedding cache hit/miss counters, or an empty dict if caching is off."""
+        if hasattr(self.embed_model, "stats"):
+            return self.embed_model.stats()
+        return {}
     
     def _setup_memory(self):
-        """Set up memory system with enhanced Mem0 integration."""
-        try:
-            # Check if Mem0 API key is available
-            mem0_api_key = os.getenv("MEM0_API_KEY")
+        """Set up long-term memory: Mem0 when configured, otherwise the local SQLite store (MEMORY_BACKEND)."""
+        if self._memory_override is not None:
+            from datetime import datetime
             
-            if mem0_api_key and mem0_api_key != "your_mem0_api_key_here":
+            self.memory = self._memory_override
+            self.session_id = os.getenv("USER_SESSION_ID", "local")
+            self.session_start = datetime.now().isoformat()
+            logger.info(f"Using provided memory {type(self.memory).__name__}")
+            return
+        
+        self.memory = None
+        self.session_id = None
+        self.session_start = None
+        mem0_api_key = os.getenv("MEM0_API_KEY")
+        has_mem0_key = bool(mem0_api_key) and mem0_api_key != "your_mem0_api_key_here"
+        backend = self.memory_backend
+        if backend == "auto":
+            backend = "mem0" if has_mem0_key else "local"
+        
+        if backend == "mem0" and has_mem0_key:
+            try:
                 # Initialize Mem0 with enhanced configuration
                 import uuid
                 from datetime import datetime
+                from llama_index.memory.mem0 import Mem0Memory
                 
                 # Generate or use existing user session ID
                 session_id = os.getenv("USER_SESSION_ID", str(uuid.uuid4())[:8])
@@ -92,77 +439,224 @@ class AIAgent:
                 logger.info(f"Mem0 memory initialized successfully with session: {session_id}")
                 
                 # Add initial session context to memory if this is a new session
-                try:
-                    self.memory.add(
-                        messages=[{
-                            "role": "system", 
-                            "content": f"New AI Agent session started at {self.session_start}. Session ID: {session_id}. This is a comprehensive AI assistant with capabilities including movie information, calculations, weather, and knowledge base queries."
-                        }]
-                    )
-                except Exception as mem_error:
-                    logger.warning(f"Could not add session context to memory: {mem_error}")
-                    
-            else:
-                # Use basic memory without Mem0 cloud service
-                logger.info("No Mem0 API key found. Using basic memory.")
-                logger.info("For persistent memory across sessions, set up your Mem0 API key from: https://mem0.ai")
-                self.memory = None
-                self.session_id = None
-                self.session_start = None
+                self.memory_writer.submit(
+                    messages=[{
+                        "role": "system", 
+                        "content": f"New AI Agent session started at {self.session_start}. Session ID: {session_id}. This is a comprehensive AI assistant with capabilities including movie information, calculations, weather, and knowledge base queries."
+                    }],
+                    metadata={"session_id": session_id, "message_type": "session_start"}
+                )
+                return
+            except Exception as e:
+                logger.warning(f"Failed to initialize Mem0 memory: {e}")
+                logger.info("Falling back to local memory")
+                backend = "local"
+        elif backend == "mem0":
+            logger.info("No Mem0 API key found. Using local memory.")
+            logger.info("For Mem0 cloud memory, set up your Mem0 API key from: https://mem0.ai")
+            backend = "local"
+        
+        if backend == "local":
+            try:
+                from datetime import datetime
                 
-        except Exception as e:
-            logger.warning(f"Failed to initialize Mem0 memory: {e}")
-            logger.info("Continuing without persistent memory")
-            self.memory = None
-            self.session_id = None
-            self.session_start = None
+                # Stable by default so memory carries over between runs
+                session_id = os.getenv("USER_SESSION_ID", "local")
+                self.memory = LocalMemory(
+                    os.getenv("MEMORY_DB", os.path.join(self.index_dir, "memory.sqlite")),
+                    embed_model=self._get_embed_model,
+                    user_id=session_id
+                )
+                self.session_id = session_id
+                self.session_start = datetime.now().isoformat()
+                logger.info(f"Local memory initialized at {self.memory.path} for user {session_id}")
+            except Exception as e:
+                logger.warning(f"Failed to initialize local memory: {e}")
+                logger.info("Continuing without persistent memory")
+                self.memory = None
+        else:
+            logger.info("Long-term memory disabled (MEMORY_BACKEND=none)")
     
     def _setup_knowledge_base(self):
-        """Set up knowledge base from documents."""
+        """Set up knowledge base from documents, reusing the persisted index when possible."""
         self.query_engine = None
-        if self.documents_path and os.path.exists(self.documents_path):
+        self.kb_retriever = None
+        self.knowledge_index = None
+        if self.has_knowledge_base:
             try:
-                # Load documents
-                documents = SimpleDirectoryReader(self.documents_path).load_data()
-                
-                # Create node parser
-                node_parser = SentenceSplitter(chunk_size=1024, chunk_overlap=200)
+                from knowledge_index import PersistentKnowledgeIndex
                 
-                # Create vector store index
-                index = VectorStoreIndex.from_documents(
-                    documents, 
-                    node_parser=node_parser,
-                    embed_model=self.embed_model
-                )
+                if self._knowledge_index_override is not None:
+                    # Shared with other worker processes; read-only here
+                    self.knowledge_index = self._knowledge_index_override
+                    index = self.knowledge_index.index
+                else:
+                    # Load the persisted index; only new, changed or deleted files are re-embedded
+                    self.knowledge_index = PersistentKnowledgeIndex(
+                        self.documents_path,
+                        self.index_dir,
+                        embed_model=self.embed_model,
+                        chunk_size=self.kb_chunk_size,
+                        chunk_overlap=self.kb_chunk_overlap
+                    )
+                    index = self.knowledge_index.load_or_build()
                 
-                # Create query engine
-                self.query_engine = index.as_query_engine(llm=self.llm)
-                logger.info(f"Knowledge base created from {len(documents)} documents")
+                self.kb_retriever, self.query_engine = self._kb_components(self.knowledge_index)
+                self._drop_kb_answers()
+                logger.info(f"Knowledge base ready with {len(index.ref_doc_info)} documents")
+                if self.watch_documents and self._knowledge_index_override is None:
+                    self._start_kb_watcher()
             except Exception as e:
                 logger.error(f"Failed to create knowledge base: {e}")
     
+    def _drop_kb_answers(self):
+        """Drop cached knowledge base lookups and final answers, which may be built on an older index."""
+        if "knowledge_base" in self.tool_caches:
+            self.tool_caches["knowledge_base"].clear()
+        if self.answer_cache is not None:
+            self.answer_cache.clear()
+    
+    def _kb_components(self, knowledge_index) -> Tuple[Any, Any]:
+        """Build the retriever and (in synthesize mode) query engine over a knowledge index."""
+        # Exact terms (titles, names) rank poorly with dense retrieval alone;
+        # by default BM25 and vector results are fused (KB_RETRIEVAL=dense to opt out)
+        retriever = knowledge_index.as_retriever(
+            mode=os.getenv("KB_RETRIEVAL", "hybrid").lower(),
+            top_k=int(os.getenv("KB_TOP_K", "2")),
+            candidates=int(os.getenv("KB_HYBRID_CANDIDATES", "10")),
+            embed_model=self.embed_model
+        )
+        query_engine = None
+        if self.kb_mode == "synthesize":
+            query_engine = RetrieverQueryEngine.from_args(retriever, llm=self.llm)
+        return retriever, query_engine
+    
+    def _start_kb_watcher(self):
+        """Poll the documents directory and re-index changes in the background."""
+        from kb_watcher import DocumentWatcher
+        
+        if self.kb_watcher is not None:
+            return
+        self.kb_watcher = DocumentWatcher(
+            self.documents_path,
+            self._apply_document_changes,
+            interval=float(os.getenv("KB_WATCH_INTERVAL", "1.0")),
+            debounce=float(os.getenv("KB_WATCH_DEBOUNCE", "0.5"))
+        )
+        self.kb_watcher.start()
+    
+    def _apply_document_changes(self, changes):
+        """Re-index changed documents into a fresh copy of the index and swap it in."""
+        start = time.perf_counter()
+        # Only the changed files are re-chunked and re-embedded; queries keep using
+        # the current index until the new one is complete
+        knowledge_index = self.knowledge_index.reload(changes.names)
+        retriever, query_engine = self._kb_components(knowledge_index)
+        # Turns already running finish on the retriever they started with
+        self.knowledge_index, self.kb_retriever, self.query_engine = knowledge_index, retriever, query_engine
+        self._drop_kb_answers()
+        timing = {
+            "files": len(changes.names),
+            "index": time.perf_counter() - start,
+            # From the file change (its modification time) to queryable
+            "latency": max(time.time() - changes.changed_at, 0.0)
+        }
+        self.kb_update_timings.append(timing)
+        logger.info(
+            f"Knowledge base updated for {changes}: re-indexed in {timing['index']:.2f}s, "
+            f"queryable {timing['latency']:.2f}s after the change"
+        )
+    
+    @property
+    def has_knowledge_base(self) -> bool:
+        """Whether a documents directory is configured, without building the index."""
+        return bool(self.documents_path and os.path.exists(self.documents_path))
+    
+    def _get_query_engine(self):
+        """Return the knowledge base query engine, building the index on first use."""
+        self._ensure_knowledge_base()
+        return self.query_engine
+    
+    def _get_kb_retriever(self):
+        """Return the knowledge base retriever, building the index on first use."""
+        self._ensure_knowledge_base()
+        return self.kb_retriever
+    
+    def _get_embed_model(self):
+        """Return the embedding model, building it on first use."""
+        self._ensure_embeddings()
+        return self.embed_model
+    
+    def _get_memory(self):
+        """Return the Mem0 memory, connecting on first use."""
+        self._ensure_memory()
+        return self.memory
+    
+    def _setup_movie_catalog(self):
+        """Open the indexed movie catalog, compiling it from its source file if needed."""
+        
+        self.movie_catalog = None
+        source_path = os.getenv(
+            "MOVIE_CATALOG_PATH",
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "movies.jsonl")
+        )
+        db_path = os.getenv("MOVIE_CATALOG_DB", os.path.join(self.index_dir, "movies.sqlite"))
+        try:
+            self.movie_catalog = MovieCatalog(db_path, source_path=source_path)
+            logger.info(f"Movie catalog loaded with {len(self.movie_catalog)} movies")
+        except Exception as e:
+            logger.error(f"Failed to load movie catalog: {e}")
+    
+    def _setup_recommender(self):
+        """Load the movie embedding matrix, embedding the catalog the first time."""
+        self.recommender = None
+        if self.movie_catalog is None:
+            return
+        try:
+            from movie_recommender import MovieRecommender
+            
+            self.recommender = MovieRecommender(
+                self.movie_catalog,
+                self.embed_model,
+                persist_dir=os.path.dirname(os.path.abspath(self.movie_catalog.db_path))
+            ).load_or_build()
+        except Exception as e:
+            logger.error(f"Failed to set up movie recommendations: {e}")
+    
+    def _cached_tool(self, name: str, fn: Callable[..., str]) -> Callable[..., str]:
+        """Memoize a deterministic tool with TTL/LRU eviction (unless TOOL_CACHE is off)."""
+        if not self.tool_cache_enabled:
+            return fn
+        cache = TTLCache(
+            max_entries=int(os.getenv("TOOL_CACHE_SIZE", "10000")),
+            ttl=float(os.getenv("TOOL_CACHE_TTL", "3600"))
+        )
+        self.tool_caches[name] = cache
+        # Errors and "not available" answers may succeed on retry, so they are not cached
+        return memoize(cache, should_cache=lambda result: not (
+            result.startswith(("❌", "Error")) or "not available" in result
+        ))(fn)
+    
     def _setup_tools(self):
         """Set up tools for the agent."""
         self.tools = []
         
-        # Calculator tool
+        # Calculator tool: AST-based evaluation with size, exponent and time limits
+        self.calculator = SafeCalculator(timeout=float(os.getenv("CALCULATOR_TIMEOUT", "0.05")))
+        
         def calculator(expression: str) -> str:
             """Calculate mathematical expressions safely."""
-            try:
-                # Basic safety check
-                allowed_chars = set('0123456789+-*/().% ')
-                if not all(c in allowed_chars for c in expression):
-                    return "Error: Invalid characters in expression"
-                
-                result = eval(expression)
-                return f"Result: {result}"
-            except Exception as e:
-                return f"Error: {str(e)}"
+            return self.calculator(expression)
         
         calculator_tool = FunctionTool.from_defaults(
-            fn=calculator,
+            fn=self._cached_tool("calculator", calculator),
             name="calculator",
-            description="Calculate mathematical expressions"
+            description=(
+                "Calculate mathematical expressions. Supports + - * / // % ** (or ^), parentheses, "
+                "percentages ('15% of 80'), sqrt, log (natural, or log(x, base)), log10, log2, exp, "
+                "sin, cos, tan, abs, round, floor, ceil, min, max, factorial and the constants pi and e. "
+                "Separate several expressions with ';' to evaluate them all in one call."
+            )
         )
         self.tools.append(calculator_tool)
         
@@ -182,192 +676,207 @@ class AIAgent:
         # Movie information tool
         def get_movie_info(movie_title: str) -> str:
             """Get information about movies including plot, cast, ratings, and more."""
-            # This is a comprehensive movie information function
             # In a real implementation, you would integrate with APIs like TMDB, OMDB, etc.
+            if self.movie_catalog is None:
+                return "🎬 Movie database is not available."
             
-            # Mock movie database for demonstration
-            movies_db = {
-                "the godfather": {
-                    "title": "The Godfather",
-                    "year": 1972,
-                    "director": "Francis Ford Coppola",
-                    "cast": ["Marlon Brando", "Al Pacino", "James Caan", "Robert Duvall", "Diane Keaton"],
-                    "genre": "Crime, Drama",
-                    "rating": "9.2/10",
-                    "plot": "The aging patriarch of an organized crime dynasty transfers control to his reluctant son."
-                },
-                "inception": {
-                    "title": "Inception",
-                    "year": 2010,
-                    "director": "Christopher Nolan",
-                    "cast": ["Leonardo DiCaprio", "Marion Cotillard", "Tom Hardy", "Ellen Page", "Ken Watanabe"],
-                    "genre": "Action, Sci-Fi, Thriller",
-                    "rating": "8.8/10",
-                    "plot": "A thief who steals corporate secrets through dream-sharing technology is given the inverse task of planting an idea."
-                },
-                "pulp fiction": {
-                    "title": "Pulp Fiction",
-                    "year": 1994,
-                    "director": "Quentin Tarantino",
-                    "cast": ["John Travolta", "Uma Thurman", "Samuel L. Jackson", "Bruce Willis", "Harvey Keitel"],
-                    "genre": "Crime, Drama",
-                    "rating": "8.9/10",
-                    "plot": "The lives of two mob hitmen, a boxer, a gangster and his wife intertwine in four tales of violence and redemption."
-                },
-                "the dark knight": {
-                    "title": "The Dark Knight",
-                    "year": 2008,
-                    "director": "Christopher Nolan",
-                    "cast": ["Christian Bale", "Heath Ledger", "Aaron Eckhart", "Michael Caine", "Gary Oldman"],
-                    "genre": "Action, Crime, Drama",
-                    "rating": "9.0/10",
-                    "plot": "Batman faces the Joker, a criminal mastermind who wants to plunge Gotham City into anarchy."
-                },
-                "forrest gump": {
-                    "title": "Forrest Gump",
-                    "year": 1994,
-                    "director": "Robert Zemeckis",
-                    "cast": ["Tom Hanks", "Robin Wright", "Gary Sinise", "Mykelti Williamson", "Sally Field"],
-                    "genre": "Drama, Romance",
-                    "rating": "8.8/10",
-                    "plot": "The story of a man with low IQ who accomplishes great things and influences many historical events."
-                },
-                "the shawshank redemption": {
-                    "title": "The Shawshank Redemption",
-                    "year": 1994,
-                    "director": "Frank Darabont",
-                    "cast": ["Tim Robbins", "Morgan Freeman", "Bob Gunton", "William Sadler", "Clancy Brown"],
-                    "genre": "Drama",
-                    "rating": "9.3/10",
-                    "plot": "Two imprisoned men bond over years, finding solace and eventual redemption through acts of common decency."
-                },
-                "goodfellas": {
-                    "title": "Goodfellas",
-                    "year": 1990,
-                    "director": "Martin Scorsese",
-                    "cast": ["Robert De Niro", "Ray Liotta", "Joe Pesci", "Lorraine Bracco", "Paul Sorvino"],
-                    "genre": "Biography, Crime, Drama",
-                    "rating": "8.7/10",
-                    "plot": "The story of Henry Hill and his life in the mob, covering his relationship with his wife Karen Hill and his mob partners."
-                },
-                "titanic": {
-                    "title": "Titanic",
-                    "year": 1997,
-                    "director": "James Cameron",
-                    "cast": ["Leonardo DiCaprio", "Kate Winslet", "Billy Zane", "Gloria Stuart", "Frances Fisher"],
-                    "genre": "Drama, Romance",
-                    "rating": "7.8/10",
-                    "plot": "A seventeen-year-old aristocrat falls in love with a kind but poor artist aboard the luxurious, ill-fated R.M.S. Titanic."
-                },
-                "casablanca": {
-                    "title": "Casablanca",
-                    "year": 1942,
-                    "director": "Michael Curtiz",
-                    "cast": ["Humphrey Bogart", "Ingrid Bergman", "Paul Henreid", "Claude Rains", "Conrad Veidt"],
-                    "genre": "Drama, Romance, War",
-                    "rating": "8.5/10",
-                    "plot": "A cynical expatriate American cafe owner struggles to decide whether to help his former lover and her fugitive husband escape the Nazis in French Morocco."
-                },
-                "star wars": {
-                    "title": "Star Wars: Episode IV - A New Hope",
-                    "year": 1977,
-                    "director": "George Lucas",
-                    "cast": ["Mark Hamill", "Harrison Ford", "Carrie Fisher", "Peter Cushing", "Alec Guinness"],
-                    "genre": "Action, Adventure, Fantasy, Sci-Fi",
-                    "rating": "8.6/10",
-                    "plot": "Luke Skywalker joins forces with a Jedi Knight, a cocky pilot, a Wookiee and two droids to save the galaxy from the Empire's world-destroying battle station."
-                },
-                "the matrix": {
-                    "title": "The Matrix",
-                    "year": 1999,
-                    "director": "The Wachowski Sisters",
-                    "cast": ["Keanu Reeves", "Laurence Fishburne", "Carrie-Anne Moss", "Hugo Weaving", "Gloria Foster"],
-                    "genre": "Action, Sci-Fi",
-                    "rating": "8.7/10",
-                    "plot": "A computer programmer is led to fight an underground war against powerful computers who have constructed his entire reality with a system called the Matrix."
-                },
-                "schindler's list": {
-                    "title": "Schindler's List",
-                    "year": 1993,
-                    "director": "Steven Spielberg",
-                    "cast": ["Liam Neeson", "Ralph Fiennes", "Ben Kingsley", "Caroline Goodall", "Jonathan Sagall"],
-                    "genre": "Biography, Drama, History",
-                    "rating": "9.0/10",
-                    "plot": "In German-occupied Poland during World War II, industrialist Oskar Schindler gradually becomes concerned for his Jewish workforce after witnessing their persecution by the Nazis."
-                },
-                "citizen kane": {
-                    "title": "Citizen Kane",
-                    "year": 1941,
-                    "director": "Orson Welles",
-                    "cast": ["Orson Welles", "Joseph Cotten", "Dorothy Comingore", "Agnes Moorehead", "Ruth Warrick"],
-                    "genre": "Drama, Mystery",
-                    "rating": "8.3/10",
-                    "plot": "Following the death of publishing tycoon Charles Foster Kane, reporters scramble to uncover the meaning of his final utterance: 'Rosebud'."
-                },
-                "vertigo": {
-                    "title": "Vertigo",
-                    "year": 1958,
-                    "director": "Alfred Hitchcock",
-                    "cast": ["James Stewart", "Kim Novak", "Barbara Bel Geddes", "Tom Helmore", "Henry Jones"],
-                    "genre": "Mystery, Romance, Thriller",
-                    "rating": "8.3/10",
-                    "plot": "A former police detective juggles wrestling with his personal demons and becoming obsessed with a beautiful woman."
-                },
-                "apocalypse now": {
-                    "title": "Apocalypse Now",
-                    "year": 1979,
-                    "director": "Francis Ford Coppola",
-                    "cast": ["Martin Sheen", "Marlon Brando", "Robert Duvall", "Dennis Hopper", "Frederic Forrest"],
-                    "genre": "Drama, Mystery, War",
-                    "rating": "8.4/10",
-                    "plot": "A U.S. Army officer serving in Vietnam is tasked with assassinating a renegade Special Forces Colonel who sees himself as a god."
-                }
-            }
-            
-            # Search for the movie (case-insensitive)
-            movie_key = movie_title.lower().strip()
+            # Search for the movie (exact, then normalized title)
+            movie = self.movie_catalog.get(movie_title)
             
-            if movie_key in movies_db:
-                movie = movies_db[movie_key]
+            if movie:
                 return f"""🎬 **{movie['title']}** ({movie['year']})
                 
 **Director:** {movie['director']}
 **Cast:** {', '.join(movie['cast'])}
 **Genre:** {movie['genre']}
-**Rating:** {movie['rating']}
+**Rating:** {_format_rating(movie['rating'])}
 **Plot:** {movie['plot']}
                 
 This is sample data. In a real implementation, this would connect to movie databases like TMDB or OMDB API."""
             else:
                 # Provide suggestions for partial matches
-                suggestions = [title for title in movies_db.keys() if movie_key in title]
+                suggestions = self.movie_catalog.suggest(movie_title)
                 if suggestions:
                     return f"Movie '{movie_title}' not found in database. Did you mean: {', '.join(suggestions)}?"
                 else:
-                    return f"Movie '{movie_title}' not found in database. Available movies include: The Godfather, Inception, Pulp Fiction, The Dark Knight, Forrest Gump, The Shawshank Redemption, Goodfellas, Titanic, Casablanca, Star Wars, The Matrix, Schindler's List, Citizen Kane, Vertigo, and Apocalypse Now."
+                    return f"Movie '{movie_title}' not found in database. Available movies include: {', '.join(self.movie_catalog.top_titles(15))}."
         
         movie_tool = FunctionTool.from_defaults(
-            fn=get_movie_info,
+            fn=self._cached_tool("movie_info", get_movie_info),
             name="movie_info",
             description="Get detailed information about movies including plot, cast, director, rating, and genre. Provide the movie title to search for."
         )
         self.tools.append(movie_tool)
         
-        # Knowledge base query tool
-        if self.query_engine:
-            kb_tool = QueryEngineTool.from_defaults(
-                query_engine=self.query_engine,
-                name="knowledge_base",
-                description="Query the knowledge base for information from documents"
+        # Structured movie search tool
+        def search_movies(
+            director: str = "",
+            cast: str = "",
+            genre: str = "",
+            year_from: int = 0,
+            year_to: int = 0,
+            min_rating: float = 0.0,
+            sort_by: str = "rating",
+            limit: int = 10,
+            page: int = 1
+        ) -> str:
+            """Search movies by director, cast, genre, release year range and minimum rating."""
+            if self.movie_catalog is None:
+                return "🎬 Movie database is not available."
+            
+            cast_members = [name.strip() for name in cast.split(",") if name.strip()]
+            genres = [name.strip() for name in genre.split(",") if name.strip()]
+            limit = max(1, min(int(limit or 10), MAX_SEARCH_LIMIT))
+            page = max(1, int(page or 1))
+            try:
+                total, movies = self.movie_catalog.search(
+                    director=director.strip() or None,
+                    cast=cast_members,
+                    genres=genres,
+                    year_from=year_from or None,
+                    year_to=year_to or None,
+                    min_rating=min_rating or None,
+                    sort_by=sort_by,
+                    limit=limit,
+                    offset=(page - 1) * limit
+                )
+            except Exception as e:
+                logger.error(f"Movie search error: {e}")
+                return f"❌ Movie search error: {str(e)}"
+            
+            if not movies:
+                return "🔍 No movies match those criteria." if total == 0 else f"🔍 No more results (page {page})."
+            
+            first = (page - 1) * limit + 1
+            lines = [
+                f"{first + i}. **{movie['title']}** ({movie['year']}) - {movie['director']} - "
+                f"{_format_rating(movie['rating'])} - {movie['genre']}"
+                for i, movie in enumerate(movies)
+            ]
+            total_text = f"{MAX_COUNT}+" if total > MAX_COUNT else str(total)
+            footer = f"Showing {first}-{first + len(movies) - 1} of {total_text} matches."
+            if first + len(movies) - 1 < total:
+                footer += f" Use page={page + 1} for more."
+            return "🎬 **Movie Search Results:**\n" + "\n".join(lines) + "\n" + footer
+        
+        search_tool = FunctionTool.from_defaults(
+            fn=search_movies,
+            name="movie_search",
+            description=(
+                "Find movies matching several criteria in one call. All arguments are optional: "
+                "director (name or surname), cast (comma-separated actors who must all appear), "
+                "genre (comma-separated genres that must all apply), year_from and year_to (inclusive), "
+                "min_rating (out of 10), sort_by ('rating' or 'year'), limit (results per page, max 50) "
+                "and page. Example: director='Nolan', year_from=2005, min_rating=8.5."
             )
+        )
+        self.tools.append(search_tool)
+        
+        # Semantic movie recommendation tool
+        def recommend_movies(
+            movie_title: str = "",
+            description: str = "",
+            genre: str = "",
+            year_from: int = 0,
+            year_to: int = 0,
+            min_rating: float = 0.0,
+            top_k: int = 5
+        ) -> str:
+            """Recommend movies similar to a given movie or matching a description."""
+            self._ensure_recommender()
+            if self.recommender is None:
+                return "🎬 Movie recommendations are not available."
+            if not movie_title.strip() and not description.strip():
+                return "Please provide a movie title or a description to base recommendations on."
+            
+            try:
+                seed, results = self.recommender.recommend(
+                    title=movie_title.strip() or None,
+                    query=description.strip() or None,
+                    top_k=max(1, min(int(top_k or 5), MAX_SEARCH_LIMIT)),
+                    genres=[name.strip() for name in genre.split(",") if name.strip()],
+                    year_from=year_from or None,
+                    year_to=year_to or None,
+                    min_rating=min_rating or None
+                )
+            except Exception as e:
+                logger.error(f"Movie recommendation error: {e}")
+                return f"❌ Movie recommendation error: {str(e)}"
+            
+            if movie_title.strip() and seed is None:
+                return f"Movie '{movie_title}' not found in database, so no recommendations could be made."
+            if not results:
+                return "🔍 No recommendations match those criteria."
+            
+            basis = f"**{seed['title']}**" if seed else f"'{description.strip()}'"
+            lines = [
+                f"{i}. **{movie['title']}** ({movie['year']}) - {movie['genre']} - {_format_rating(movie['rating'])}"
+                for i, (movie, _) in enumerate(results, 1)
+            ]
+            return f"🎬 **Movies like {basis}:**\n" + "\n".join(lines)
+        
+        recommend_tool = FunctionTool.from_defaults(
+            fn=recommend_movies,
+            name="movie_recommend",
+            description=(
+                "Recommend movies similar to a given movie (movie_title) or matching a free-text "
+                "description, in one call. Optional filters: genre (comma-separated), year_from, "
+                "year_to, min_rating, and top_k (number of results)."
+            )
+        )
+        self.tools.append(recommend_tool)
+        
+        # Knowledge base query tool (the index is built on first use in lazy mode)
+        if self.has_knowledge_base:
+            def query_knowledge_base(input: str) -> str:
+                """Query the knowledge base for information from documents."""
+                query_engine = self._get_query_engine()
+                if query_engine is None:
+                    return "📚 Knowledge base is not available."
+                return str(query_engine.query(input))
+            
+            def retrieve_knowledge_base(input: str) -> str:
+                """Return the most relevant knowledge base passages, without an extra LLM call."""
+                from knowledge_index import format_passages
+                
+                retriever = self._get_kb_retriever()
+                if retriever is None:
+                    return "📚 Knowledge base is not available."
+                passages = format_passages(retriever.retrieve(input), max_tokens=self.kb_context_tokens)
+                if not passages:
+                    return f"📚 No passages in the knowledge base match '{input}'."
+                return f"📚 Knowledge base passages:\n\n{passages}"
+            
+            if self.kb_mode == "retrieve":
+                kb_tool = FunctionTool.from_defaults(
+                    fn=self._cached_tool("knowledge_base", retrieve_knowledge_base),
+                    name="knowledge_base",
+                    description=(
+                        "Search the knowledge base documents. Returns the most relevant passages "
+                        "with their source file names; answer from them directly."
+                    )
+                )
+            else:
+                kb_tool = FunctionTool.from_defaults(
+                    fn=self._cached_tool("knowledge_base", query_knowledge_base),
+                    name="knowledge_base",
+                    description="Query the knowledge base for information from documents"
+                )
             self.tools.append(kb_tool)
         
         # Enhanced Memory search tool
         def search_memory(query: str) -> str:
             """Search through conversation memory and retrieve relevant past interactions."""
-            if self.memory:
+            memory = self._get_memory()
+            if memory is not None:
                 try:
-                    results = self.memory.search(query)
+                    scope = self._memory_session(_current_session.get())
+                    with self._trace_span("memory.search", query_chars=len(query)) as span:
+                        if isinstance(memory, LocalMemory):
+                            results = memory.search(query, session_id=scope)
+                        else:
+                            results = self._session_results(memory.search(query), scope)
+                        span["results"] = len(results) if isinstance(results, list) else int(bool(results))
                     if results:
                         # Format the results for better readability
                         if isinstance(results, list):
@@ -386,7 +895,7 @@ This is sample data. In a real implementation, this would connect to movie datab
                 except Exception as e:
                     logger.error(f"Memory search error: {e}")
                     return f"❌ Memory search error: {str(e)}"
-            return "💭 Memory system not available. For persistent memory across sessions, configure your Mem0 API key."
+            return "💭 Memory system not available. For persistent memory across sessions, set MEMORY_BACKEND to local or configure your Mem0 API key."
         
         memory_tool = FunctionTool.from_defaults(
             fn=search_memory,
@@ -398,10 +907,22 @@ This is sample data. In a real implementation, this would connect to movie datab
         # Add a memory summary tool
         def get_memory_summary() -> str:
             """Get a summary of recent conversations and key topics."""
-            if self.memory:
+            memory = self._get_memory()
+            if memory is not None:
                 try:
                     # Try to get recent memories
-                    recent_search = self.memory.search("conversation summary recent topics")
+                    scope = self._memory_session(_current_session.get())
+                    with self._trace_span("memory.search", purpose="summary"):
+                        if isinstance(memory, LocalMemory):
+                            # The local store keeps turns in order, so the latest ones are the summary
+                            recent_search = memory.recent(5, session_id=scope)
+                        else:
+                            recent_search = self._session_results(
+                                memory.search("conversation summary recent topics"), scope
+                            )
+                    if recent_search and isinstance(recent_search, list):
+                        lines = [f"- {r.get('content', str(r)) if isinstance(r, dict) else r}" for r in recent_search]
+                        return f"📋 **Recent Memory Summary:**\n" + "\n".join(lines)
                     if recent_search:
                         return f"📋 **Recent Memory Summary:**\n{recent_search}"
                     else:
@@ -420,14 +941,169 @@ This is sample data. In a real implementation, this would connect to movie datab
         logger.info(f"Initialized {len(self.tools)} tools")
     
     def _setup_agent(self):
-        """Set up the ReAct agent."""
-        self.agent = ReActAgent.from_tools(
+        """Set up the agent for the default session."""
+        # In lazy mode Mem0 is not connected yet, so the agent keeps its own chat buffer;
+        # the local store only holds long-term memory and is not a chat buffer either
+        memory = None if isinstance(self.memory, LocalMemory) else self.memory
+        self.agent = self._create_agent(memory=memory, verbose=True)
+        logger.info(f"{'Parallel function-calling' if self.agent_mode == 'parallel' else 'ReAct'} agent initialized successfully")
+    
+    def _create_agent(self, memory: Any, verbose: bool):
+        """
+        Create an agent over the shared tools and LLM in the configured AGENT_MODE.
+        
+        Falls back to ReAct when the LLM does not support function calling.
+        """
+        memory = self._with_compaction(memory)
+        if self.agent_mode == "parallel":
+            from parallel_agent import build_parallel_agent, parse_tool_timeouts
+            
+            try:
+                return self._reserve_prompt_tokens(build_parallel_agent(
+                    tools=self.tools,
+                    llm=self.llm,
+                    memory=memory,
+                    callback_manager=self.callback_manager,
+                    executor=self.tool_executor,
+                    tool_timeout=float(os.getenv("PARALLEL_TOOL_TIMEOUT", "30")),
+                    tool_timeouts=parse_tool_timeouts(os.getenv("PARALLEL_TOOL_TIMEOUTS", "")),
+                    verbose=verbose
+                ))
+            except ValueError as e:
+                logger.warning(f"Parallel agent unavailable, using ReAct: {e}")
+                self.agent_mode = "react"
+        return self._reserve_prompt_tokens(ReActAgent.from_tools(
             tools=self.tools,
             llm=self.llm,
-            verbose=True,
-            memory=self.memory
+            verbose=verbose,
+            memory=memory,
+            callback_manager=self.callback_manager
+        ))
+    
+    def _with_compaction(self, memory: Any) -> Any:
+        """
+        Give a session's agent a compacting chat memory (unless CONTEXT_COMPACTION is off).
+        
+        ``None`` becomes a new compacting buffer and Mem0's wrapper gets one as its
+        primary chat buffer; other pre-built memories are used as they are.
+        """
+        if not self.context_compaction:
+            return memory if memory is not None else ChatMemoryBuffer.from_defaults(llm=self.llm)
+        compacting = CompactingChatMemory(
+            token_limit=self.context_token_budget,
+            keep_turns=self.context_keep_turns,
+            summary_token_limit=self.context_summary_tokens,
+            summarizer=LLMSummarizer(self.llm) if self.context_summary_mode == "llm" else None,
+            executor=self.summary_executor
         )
-        logger.info("ReAct agent initialized successfully")
+        if memory is None:
+            return compacting
+        if hasattr(memory, "primary_memory"):
+            try:
+                memory.primary_memory = compacting
+            except Exception as e:
+                logger.warning(f"Could not enable context compaction for {type(memory).__name__}: {e}")
+        return memory
+    
+    def _reserve_prompt_tokens(self, agent: Any) -> Any:
+        """Count the fixed prompt overhead (system prompt, tool descriptions) against the token budget."""
+        memory = self._compacting_memory(agent)
+        if memory is None:
+            return agent
+        if self._prompt_overhead_tokens is None:
+            worker = getattr(agent, "agent_worker", None)
+            try:
+                if hasattr(worker, "_react_chat_formatter"):
+                    prompt = worker._react_chat_formatter.format(self.tools, chat_history=[], current_reasoning=[])
+                    text = "\n".join(str(message.content) for message in prompt)
+                else:
+                    text = json.dumps([tool.metadata.to_openai_tool() for tool in self.tools])
+                self._prompt_overhead_tokens = len(memory.tokenizer_fn(text))
+            except Exception as e:
+                logger.warning(f"Could not measure the prompt overhead: {e}")
+                self._prompt_overhead_tokens = 0
+            logger.info(f"Context budget: {self.context_token_budget} tokens per request, "
+                        f"{self._prompt_overhead_tokens} for the system prompt and tools")
+        memory.reserved_tokens = self._prompt_overhead_tokens
+        return agent
+    
+    @staticmethod
+    def _compacting_memory(agent: Any) -> Optional[CompactingChatMemory]:
+        """The agent's compacting chat memory, if it has one."""
+        memory = getattr(agent, "memory", None)
+        memory = getattr(memory, "primary_memory", memory)
+        return memory if isinstance(memory, CompactingChatMemory) else None
+    
+    def _record_context(self, session_id: str, agent: Any):
+        """Record the prompt token accounting of an agent turn."""
+        memory = self._compacting_memory(agent)
+        if memory is None or not memory.last_request:
+            return
+        usage = dict(memory.last_request, session_id=session_id or self.DEFAULT_SESSION)
+        self.turn_contexts.append(usage)
+        logger.info(f"Turn context: {usage['prompt_tokens']}/{usage['budget']} prompt tokens "
+                    f"({usage['summary_tokens']} summary, {usage['history_tokens']} history in "
+                    f"{usage['verbatim_turns']} turns, {usage['dropped_turns']} turns dropped)")
+    
+    def context_stats(self) -> Dict[str, Any]:
+        """Return per-turn prompt token statistics of recent agent turns."""
+        if not self.turn_contexts:
+            return {}
+        prompt_tokens = [usage["prompt_tokens"] for usage in self.turn_contexts]
+        return {
+            "turns": len(prompt_tokens),
+            "budget": self.context_token_budget,
+            "last_prompt_tokens": prompt_tokens[-1],
+            "mean_prompt_tokens": sum(prompt_tokens) / len(prompt_tokens),
+            "max_prompt_tokens": max(prompt_tokens),
+            "dropped_turns": sum(usage["dropped_turns"] for usage in self.turn_contexts),
+        }
+    
+    def _setup_router(self):
+        """Set up the pre-dispatch router that answers trivial requests without the LLM."""
+        if not self.fast_router_enabled:
+            return
+        
+        def lookup_movie(title: str) -> Optional[str]:
+            movie = self.movie_catalog.get(title) if self.movie_catalog is not None else None
+            return movie["title"] if movie else None
+        
+        self.router = FastRouter(
+            {tool.metadata.name: tool.fn for tool in self.tools},
+            movie_lookup=lookup_movie,
+            embed_model=self._get_embed_model if _env_flag("FAST_ROUTER_EMBEDDINGS") else None,
+            rule_threshold=float(os.getenv("FAST_ROUTER_THRESHOLD", "0.9")),
+            embedding_threshold=float(os.getenv("FAST_ROUTER_EMBEDDING_THRESHOLD", "0.8"))
+        )
+    
+    def _fast_path(self, message: str, agent: ReActAgent) -> Optional[Route]:
+        """
+        Answer a trivial request with a direct tool call if the router is confident about it.
+        
+        Returns:
+            The route taken (with its ``answer``), or None when the agent should answer
+        """
+        if self.router is None:
+            return None
+        with self._trace_span("router.dispatch") as span:
+            route = self.router.dispatch(message)
+            span["routed"] = route is not None
+            if route is not None:
+                span.update(intent=route.intent, tool=route.tool, source=route.source,
+                            confidence=round(route.confidence, 3))
+        if route is not None:
+            self._record_direct_turn(agent, message, route.answer)
+        return route
+    
+    async def _afast_path(self, message: str, agent: ReActAgent) -> Optional[Route]:
+        """``_fast_path`` for the async API; embedding classification runs off the event loop."""
+        if self.router is not None and self.router.embed_model is not None:
+            return await asyncio.to_thread(self._fast_path, message, agent)
+        return self._fast_path(message, agent)
+    
+    def router_stats(self) -> Dict[str, Any]:
+        """Return fast-path versus LLM-path counts of the pre-dispatch router (empty when off)."""
+        return self.router.stats() if self.router is not None else {}
     
     def chat(self, message: str) -> str:
         """
@@ -439,38 +1115,378 @@ This is sample data. In a real implementation, this would connect to movie datab
         Returns:
             Agent's response
         """
+        with self._turn(self.DEFAULT_SESSION, message):
+            try:
+                route = self._fast_path(message, self.agent)
+                if route is not None:
+                    self._store_turn(message, route.answer)
+                    return route.answer
+                
+                cached, query_vector = self._lookup_answer(message, self.agent)
+                if cached is not None:
+                    self._record_direct_turn(self.agent, message, cached)
+                    self._store_turn(message, cached)
+                    return cached
+                
+                # Get response from agent
+                response = str(self.agent.chat(message))
+                self._record_context(self.DEFAULT_SESSION, self.agent)
+                self._store_turn(message, response)
+                self._cache_answer(query_vector, message, response)
+                return response
+            except Exception as e:
+                logger.error(f"Chat error: {e}")
+                return f"Sorry, I encountered an error: {str(e)}"
+    
+    @contextmanager
+    def _turn(self, session_id: str, message: str):
+        """Run a chat turn: mark its session as current for the tools and trace it."""
+        session_id = session_id or self.DEFAULT_SESSION
+        token = _current_session.set(session_id)
         try:
-            # Get response from agent
-            response = self.agent.chat(message)
+            with self._trace_turn(session_id, message):
+                yield
+        finally:
+            _current_session.reset(token)
+    
+    def _memory_session(self, session_id: Optional[str]) -> Optional[str]:
+        """The ``session_id`` a chat session's turns are stored under in long-term memory."""
+        if session_id is None or session_id == self.DEFAULT_SESSION:
+            return getattr(self, 'session_id', None) or 'unknown'
+        return session_id
+    
+    @staticmethod
+    def _session_results(results: Any, session_id: str) -> Any:
+        """Keep only the memory search results stored by ``session_id`` (stores without session scoping)."""
+        if not isinstance(results, list):
+            return results
+        return [
+            r for r in results
+            if isinstance(r, dict) and (r.get("metadata") or {}).get("session_id") == session_id
+        ]
+    
+    def _trace_turn(self, session_id: str, message: str):
+        """Trace a chat turn when tracing is enabled."""
+        if self.tracer is None:
+            return nullcontext()
+        return self.tracer.turn(
+            session_id,
+            message_chars=len(message),
+            message_type=self._classify_message(message)
+        )
+    
+    def _trace_span(self, name: str, **attributes: Any):
+        """Trace a block of hot-path work (e.g. a memory search) when tracing is enabled."""
+        if self.tracer is None:
+            return nullcontext(attributes)
+        return self.tracer.span(name, **attributes)
+    
+    def session_summary(self, session_id: str = None, pop: bool = False) -> Dict[str, Any]:
+        """
+        Return a session's traced totals: turns, LLM hops, tokens, tools used and time.
+        
+        Empty when tracing is off (TRACE_EXPORT) or the session has no turns yet.
+        
+        Args:
+            session_id: Session to summarize (defaults to the agent's own session)
+            pop: Also drop the summary, e.g. after closing a one-off session
+        """
+        if self.tracer is None:
+            return {}
+        return self.tracer.session_summary(session_id or self.DEFAULT_SESSION, pop=pop)
+    
+    def enable_tracing(self) -> AgentTracer:
+        """
+        Trace turns from now on, keeping per-session summaries only, when TRACE_EXPORT is off.
+        
+        Returns:
+            The agent's tracer
+        """
+        if self.tracer is None:
+            self.tracer = AgentTracer()
+            self.callback_manager.add_handler(self.tracer)
+        return self.tracer
+    
+    def stream_chat(self, message: str, session_id: str = None, isolated: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Chat with the AI agent, yielding events as the response is produced.
+        
+        The agent runs in a worker thread so tool steps are reported while they
+        happen and final-answer tokens as the LLM generates them.
+        
+        Args:
+            message: User's message
+            session_id: Conversation to continue (defaults to the agent's own session)
+            isolated: Neither write the turn to long-term memory nor read or fill the
+                semantic answer cache, e.g. for batch evaluation runs
             
-            # Enhanced memory storage with metadata
-            if self.memory:
-                try:
-                    from datetime import datetime
-                    
-                    # Create enriched memory entry
-                    memory_entry = {
-                        "messages": [
-                            {"role": "user", "content": message},
-                            {"role": "assistant", "content": str(response)}
-                        ],
-                        "metadata": {
-                            "timestamp": datetime.now().isoformat(),
-                            "session_id": getattr(self, 'session_id', 'unknown'),
-                            "message_type": self._classify_message(message)
-                        }
-                    }
-                    
-                    self.memory.add(**memory_entry)
-                    logger.debug("Successfully stored conversation in memory")
-                    
-                except Exception as e:
-                    logger.warning(f"Failed to store in memory: {e}")
+        Yields:
+            Event dicts with a ``type`` of:
+            ``tool_call`` (``tool``, ``input``), ``tool_result`` (``tool``, ``output``),
+            ``token`` (``text``), ``error`` (``message``) and finally
+            ``done`` (``response``, ``ttft`` and ``total`` in seconds)
+        """
+        session = self._get_session(session_id)
+        events: "queue.Queue" = queue.Queue()
+        finished = object()
+        
+        def run():
+            self.tool_events.attach(events.put)
+            try:
+                with self._turn(session_id, message):
+                    chunks = self._stream_turn(session, message, session_id, events, isolated)
+                events.put({"type": "done", "response": "".join(chunks)})
+            except Exception as e:
+                logger.error(f"Chat error: {e}")
+                events.put({"type": "error", "message": f"Sorry, I encountered an error: {str(e)}"})
+            finally:
+                self.tool_events.detach()
+                events.put(finished)
+        
+        start = time.perf_counter()
+        ttft = None
+        threading.Thread(target=run, name="agent-stream", daemon=True).start()
+        while True:
+            event = events.get()
+            if event is finished:
+                return
+            if event["type"] == "token" and ttft is None:
+                ttft = time.perf_counter() - start
+            if event["type"] == "done":
+                total = time.perf_counter() - start
+                self.turn_timings.append({"ttft": ttft, "total": total})
+                logger.info(f"Streamed turn: time to first token {ttft or 0:.2f}s, total {total:.2f}s")
+                event.update(ttft=ttft, total=total)
+            yield event
+    
+    def _stream_turn(self, session: _ChatSession, message: str, session_id: str,
+                     events: "queue.Queue", isolated: bool = False) -> List[str]:
+        """Run one streamed turn, putting token events on ``events``; returns the chunks."""
+        route = self._fast_path(message, session.agent)
+        if route is not None:
+            events.put({"type": "tool_call", "tool": route.tool, "input": json.dumps(route.arguments)})
+            events.put({"type": "tool_result", "tool": route.tool, "output": route.output})
+            events.put({"type": "token", "text": route.answer})
+            if not isolated:
+                self._store_turn(message, route.answer, session_id)
+            return [route.answer]
+        cached, query_vector = (None, None) if isolated else self._lookup_answer(message, session.agent)
+        if cached is not None:
+            self._record_direct_turn(session.agent, message, cached)
+            events.put({"type": "token", "text": cached})
+            chunks = [cached]
+        else:
+            chunks = []
+            response = session.agent.stream_chat(message)
+            for token in response.response_gen:
+                chunks.append(token)
+                events.put({"type": "token", "text": token})
+            self._record_context(session_id, session.agent)
+            self._cache_answer(query_vector, message, "".join(chunks))
+        if not isolated:
+            self._store_turn(message, "".join(chunks), session_id)
+        return chunks
+    
+    def _depends_on_context(self, message: str, agent: ReActAgent) -> bool:
+        """Whether the answer to ``message`` depends on memory, the user or on earlier turns."""
+        if self._classify_message(message) == 'memory_search' or refers_to_user(message):
+            return True
+        return bool(agent.chat_history) and refers_to_context(message)
+    
+    def _lookup_answer(self, message: str, agent: ReActAgent) -> Tuple[Optional[str], Optional[List[float]]]:
+        """
+        Look up a cached final answer for a semantically equivalent query.
+        
+        Returns:
+            Tuple of (cached answer or None, query embedding to store the new answer under
+            or None when the answer must not be cached)
+        """
+        if self.answer_cache is None:
+            return None, None
+        if self._depends_on_context(message, agent):
+            self.answer_cache.record_bypass()
+            return None, None
+        try:
+            self._ensure_embeddings()
+            query_vector = self.embed_model.get_query_embedding(message)
+        except Exception as e:
+            logger.warning(f"Answer cache lookup failed: {e}")
+            return None, None
+        return self.answer_cache.lookup(query_vector), query_vector
+    
+    def _cache_answer(self, query_vector: Optional[List[float]], message: str, response: str):
+        """Store a final answer in the semantic cache."""
+        if self.answer_cache is not None and query_vector is not None and response:
+            self.answer_cache.store(query_vector, message, response)
+    
+    @staticmethod
+    def _record_direct_turn(agent: ReActAgent, message: str, response: str):
+        """Add a turn answered without the agent (cache or fast path) to its history so follow-ups have context."""
+        agent.memory.put(ChatMessage(role=MessageRole.USER, content=message))
+        agent.memory.put(ChatMessage(role=MessageRole.ASSISTANT, content=response))
+    
+    def llm_stats(self) -> Dict[str, Any]:
+        """Return LLM gateway counters (retries, hedges, fallbacks, throttling) and per-model latency."""
+        return self.llm_gateway.stats() if self.llm_gateway is not None else {}
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Return hit rates for the tool result caches and the semantic answer cache."""
+        return {
+            "tools": {name: cache.stats() for name, cache in self.tool_caches.items()},
+            "answers": self.answer_cache.stats() if self.answer_cache is not None else {}
+        }
+    
+    def _store_turn(self, message: str, response: str, session_id: str = None):
+        """Queue a conversation turn, with metadata, for the background memory writer."""
+        # In lazy mode Mem0 may not be connected yet; the writer connects off the response path
+        if "memory" in self._ready and self.memory is None:
+            return
+        try:
+            from datetime import datetime
+            
+            # Create enriched memory entry
+            memory_entry = {
+                "messages": [
+                    {"role": "user", "content": message},
+                    {"role": "assistant", "content": response}
+                ],
+                "metadata": {
+                    "timestamp": datetime.now().isoformat(),
+                    "session_id": self._memory_session(session_id),
+                    "message_type": self._classify_message(message)
+                }
+            }
+            
+            if self.memory_writer.submit(**memory_entry):
+                logger.debug("Queued conversation turn for memory")
             
-            return str(response)
         except Exception as e:
-            logger.error(f"Chat error: {e}")
-            return f"Sorry, I encountered an error: {str(e)}"
+            logger.warning(f"Failed to store in memory: {e}")
+    
+    def _get_session(self, session_id: str = None) -> _ChatSession:
+        """
+        Return the chat session for ``session_id``, creating it on first use.
+        
+        Sessions share the LLM client, embedding model, index and tools but each
+        has its own agent and chat history. The least recently used idle
+        session is dropped once ``max_sessions`` is exceeded.
+        """
+        session_id = session_id or self.DEFAULT_SESSION
+        with self._sessions_lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                return session
+            
+            if session_id == self.DEFAULT_SESSION:
+                agent = self.agent
+            else:
+                agent = self._create_agent(memory=None, verbose=False)
+            session = _ChatSession(agent)
+            self._sessions[session_id] = session
+            
+            if len(self._sessions) > self.max_sessions:
+                for idle_id, idle in list(self._sessions.items()):
+                    if idle_id != session_id and idle_id != self.DEFAULT_SESSION and not idle.lock.locked():
+                        del self._sessions[idle_id]
+                        logger.debug(f"Evicted idle session {idle_id}")
+                        break
+            return session
+    
+    def close_session(self, session_id: str):
+        """Drop a session and its chat history."""
+        with self._sessions_lock:
+            self._sessions.pop(session_id, None)
+    
+    @property
+    def session_count(self) -> int:
+        """Number of live chat sessions."""
+        return len(self._sessions)
+    
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Return the concurrency limiter for the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+    
+    async def achat(self, message: str, session_id: str = None) -> str:
+        """
+        Chat asynchronously within a session.
+        
+        Many sessions can be served concurrently from one process; turns within a
+        session are serialized and at most ``max_concurrency`` turns run at once.
+        
+        Args:
+            message: User's message
+            session_id: Conversation to continue (defaults to the agent's own session)
+            
+        Returns:
+            Agent's response
+        """
+        session = self._get_session(session_id)
+        async with self._get_semaphore():
+            async with session.lock:
+                with self._turn(session_id, message):
+                    try:
+                        route = await self._afast_path(message, session.agent)
+                        if route is not None:
+                            self._store_turn(message, route.answer, session_id)
+                            return route.answer
+                        cached, query_vector = await asyncio.to_thread(self._lookup_answer, message, session.agent)
+                        if cached is not None:
+                            self._record_direct_turn(session.agent, message, cached)
+                            self._store_turn(message, cached, session_id)
+                            return cached
+                        response = str(await session.agent.achat(message))
+                        self._record_context(session_id, session.agent)
+                    except Exception as e:
+                        logger.error(f"Chat error: {e}")
+                        return f"Sorry, I encountered an error: {str(e)}"
+                    self._store_turn(message, response, session_id)
+                    self._cache_answer(query_vector, message, response)
+                    return response
+    
+    async def astream_chat(self, message: str, session_id: str = None) -> AsyncIterator[str]:
+        """
+        Chat asynchronously within a session, yielding the response as it is generated.
+        
+        Args:
+            message: User's message
+            session_id: Conversation to continue (defaults to the agent's own session)
+            
+        Yields:
+            Chunks of the agent's response
+        """
+        session = self._get_session(session_id)
+        async with self._get_semaphore():
+            async with session.lock:
+                with self._turn(session_id, message):
+                    chunks = []
+                    try:
+                        route = await self._afast_path(message, session.agent)
+                        if route is not None:
+                            self._store_turn(message, route.answer, session_id)
+                            yield route.answer
+                            return
+                        cached, query_vector = await asyncio.to_thread(self._lookup_answer, message, session.agent)
+                        if cached is not None:
+                            self._record_direct_turn(session.agent, message, cached)
+                            self._store_turn(message, cached, session_id)
+                            yield cached
+                            return
+                        response = await session.agent.astream_chat(message)
+                        async for chunk in response.async_response_gen():
+                            chunks.append(chunk)
+                            yield chunk
+                        self._record_context(session_id, session.agent)
+                    except Exception as e:
+                        logger.error(f"Chat error: {e}")
+                        yield f"Sorry, I encountered an error: {str(e)}"
+                        return
+                    self._store_turn(message, "".join(chunks), session_id)
+                    self._cache_answer(query_vector, message, "".join(chunks))
     
     def _classify_message(self, message: str) -> str:
         """Classify the type of message for better memory organization."""
@@ -489,14 +1505,39 @@ This is sample data. In a real implementation, this would connect to movie datab
         else:
             return 'general_conversation'
     
-    def reset_conversation(self):
-        """Reset the conversation history."""
+    def reset_conversation(self, session_id: str = None):
+        """Reset the conversation history of a session (the agent's own by default)."""
         try:
-            if hasattr(self.agent, 'reset'):
-                self.agent.reset()
+            # Make sure the finished conversation is in memory before starting over
+            self.memory_writer.flush()
+            agent = self._get_session(session_id).agent
+            if hasattr(agent, 'reset'):
+                agent.reset()
             logger.info("Conversation reset successfully")
         except Exception as e:
             logger.warning(f"Failed to reset conversation: {e}")
+    
+    def memory_write_metrics(self) -> Dict[str, Any]:
+        """Return background memory writer metrics (queue depth, batch sizes, write latency)."""
+        return self.memory_writer.metrics()
+    
+    def close(self):
+        """Flush pending memory writes and stop background workers."""
+        self.memory_writer.close()
+        if self.tool_executor is not None:
+            self.tool_executor.shutdown(wait=False, cancel_futures=True)
+        if self.summary_executor is not None:
+            self.summary_executor.shutdown(wait=False, cancel_futures=True)
+        # FastEmbedding runs a micro-batching worker (possibly behind the cache wrapper)
+        embed_model = getattr(self.embed_model, "inner", self.embed_model)
+        if hasattr(embed_model, "close"):
+            embed_model.close()
+        if self.tracer is not None:
+            self.tracer.close()
+        if self.llm_gateway is not None:
+            self.llm_gateway.close()
+        if self.kb_watcher is not None:
+            self.kb_watcher.stop()
 
 
 def main():
@@ -517,22 +1558,29 @@ def main():
         print("🤖 AI Agent initialized successfully!")
         print("\n📋 Available Features:")
         print("  • 🎬 Enhanced Movie Database: 15+ classic and modern films")
+        print("  • 🔎 Movie Search: Filter by director, cast, genre, year and rating")
+        print("  • 🍿 Movie Recommendations: 'Movies like Inception'")
         print("  • 🧮 Mathematical Calculator: Perform calculations")
         print("  • 🌤️  Weather Information: Get weather data (mock)")
         print("  • 📚 Knowledge Base: AI, Programming, Technology, Science, Space")
-        print("  • 🧠 Persistent Memory: Mem0 integration for session memory")
+        print("  • 🧠 Persistent Memory: Mem0 cloud or a local on-disk store")
         print("  • 🔍 Memory Search: Search past conversations and topics")
         
         # Display memory status
-        if hasattr(agent, 'memory') and agent.memory:
+        if isinstance(getattr(agent, 'memory', None), LocalMemory):
+            print(f"  • ✅ Local Memory: Active ({len(agent.memory)} turns in {agent.memory.path}, user: {agent.session_id})")
+        elif hasattr(agent, 'memory') and agent.memory is not None:
             session_info = f" (Session: {getattr(agent, 'session_id', 'unknown')})" if hasattr(agent, 'session_id') else ""
             print(f"  • ✅ Mem0 Memory: Active{session_info}")
+        elif agent.lazy and "memory" not in agent._ready and agent.memory_backend != "none":
+            print("  • ⏳ Memory: Connects on first use (lazy mode)")
         else:
-            print("  • ⚠️  Mem0 Memory: Not configured (add MEM0_API_KEY for persistence)")
+            print("  • ⚠️  Memory: Not configured (set MEMORY_BACKEND=local or add MEM0_API_KEY for persistence)")
         
         print("\n💬 Commands:")
         print("  • Type 'quit' or 'exit' to end the conversation")
         print("  • Type 'reset' to reset the conversation history")
+        print("  • Type 'stats' to show cache hit rates and response timings")
         print("  • Type 'help' for feature examples")
         print("  • Ask about movies, calculations, AI, programming, science, or anything!")
         print("-" * 70)
@@ -542,15 +1590,42 @@ def main():
             user_input = input("\nYou: ").strip()
             
             if user_input.lower() in ['quit', 'exit']:
+                agent.close()
                 print("Goodbye! 👋")
                 break
             elif user_input.lower() == 'reset':
                 agent.reset_conversation()
                 print("🔄 Conversation reset!")
                 continue
+            elif user_input.lower() == 'stats':
+                stats = agent.cache_stats()
+                print("\n📊 Cache Hit Rates:")
+                for name, tool_stats in stats["tools"].items():
+                    print(f"  • {name}: {tool_stats['hit_rate']:.0%} ({tool_stats['hits']}/{tool_stats['hits'] + tool_stats['misses']})")
+                if stats["answers"]:
+                    answers = stats["answers"]
+                    print(f"  • answers: {answers['hit_rate']:.0%} ({answers['hits']}/{answers['hits'] + answers['misses']}, {answers['bypassed']} bypassed)")
+                routing = agent.router_stats()
+                if routing:
+                    print(f"  • fast path: {routing['fast_path_share']:.0%} ({routing['fast_path']}/{routing['fast_path'] + routing['llm_path']} turns answered without the LLM)")
+                context = agent.context_stats()
+                if context:
+                    print(f"  • prompt tokens: last {context['last_prompt_tokens']}, mean {context['mean_prompt_tokens']:.0f}, max {context['max_prompt_tokens']} (budget {context['budget']})")
+                llm = agent.llm_stats()
+                if llm:
+                    print(f"  • LLM requests: {llm['requests']} ({llm['retries']} retries, {llm['hedges']} hedged, {llm['fallbacks']} on the fallback model, {llm['throttle_wait']:.1f}s waiting for rate limits)")
+                if agent.kb_update_timings:
+                    update = agent.kb_update_timings[-1]
+                    print(f"  • knowledge base: last update of {update['files']} file(s) queryable {update['latency']:.2f}s after the change (re-indexed in {update['index']:.2f}s)")
+                if agent.turn_timings:
+                    last = agent.turn_timings[-1]
+                    print(f"⏱️  Last turn: first token after {last['ttft'] or 0:.2f}s, done after {last['total']:.2f}s")
+                continue
             elif user_input.lower() == 'help':
                 print("\n📋 Feature Examples:")
                 print("  🎬 Movies: 'Tell me about The Matrix' or 'What's Inception about?'")
+                print("  🔎 Movie Search: 'Nolan films after 2005 rated above 8.5'")
+                print("  🍿 Recommendations: 'Recommend movies like Inception from the 90s'")
                 print("  🧮 Math: 'Calculate 15 * 24 + 10' or 'What's 25% of 80?'")
                 print("  🌤️  Weather: 'What's the weather in London?'")
                 print("  🤖 AI: 'What is machine learning?' or 'Explain neural networks'")
@@ -562,9 +1637,19 @@ def main():
             elif not user_input:
                 continue
             
-            print("\n🤖 Agent:", end=" ")
-            response = agent.chat(user_input)
-            print(response)
+            # Render tool steps and answer tokens as they arrive
+            answering = False
+            for event in agent.stream_chat(user_input):
+                if event["type"] == "tool_call":
+                    print(f"\n  🔧 Using {event['tool']}...", flush=True)
+                elif event["type"] == "token":
+                    if not answering:
+                        print("\n🤖 Agent:", end=" ")
+                        answering = True
+                    print(event["text"], end="", flush=True)
+                elif event["type"] == "error":
+                    print(f"\n🤖 Agent: {event['message']}", end="")
+            print()
             
     except Exception as e:
         print(f"Failed to initialize AI agent: {e}")
@@ -0,0 +1,445 @@
+"""
+Structured per-turn tracing for the AI Agent.
+
+``AgentTracer`` is a LlamaIndex callback handler that turns LLM calls, tool
+invocations, retriever calls and embedding batches into spans under one trace
+per chat turn; memory operations and other hot-path work are added with
+``tracer.span(...)``. Spans carry durations and, for LLM calls, token counts
+(from the API's usage data, or estimated from text length when a response
+does not include it).
+
+Traces are exported as JSON lines, either one flat record per span
+(``jsonl``) or one OTLP/JSON ``resourceSpans`` record per trace (``otlp``,
+readable by the OpenTelemetry collector's file receiver). Head sampling keeps
+the overhead low in production: unsampled turns record no spans, only the
+cheap counters behind the per-session summaries.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from llama_index.core.callbacks import CBEventType, EventPayload
+from llama_index.core.callbacks.base_handler import BaseCallbackHandler
+
+logger = logging.getLogger(__name__)
+
+# Span names for the LlamaIndex events that are traced; others are ignored
+_SPAN_NAMES = {
+    CBEventType.LLM: "llm",
+    CBEventType.FUNCTION_CALL: "tool",
+    CBEventType.RETRIEVE: "retrieve",
+    CBEventType.EMBEDDING: "embedding",
+    CBEventType.QUERY: "query",
+    CBEventType.SYNTHESIZE: "synthesize",
+    CBEventType.AGENT_STEP: "agent_step",
+}
+_IGNORED = [event for event in CBEventType if event not in _SPAN_NAMES]
+
+EXPORT_FORMATS = ("jsonl", "otlp")
+
+
+def _span_id() -> str:
+    return os.urandom(8).hex()
+
+
+def _estimate_tokens(chars: int) -> int:
+    """Rough token count (about four characters per token) for responses without usage data."""
+    return max(1, chars // 4) if chars else 0
+
+
+def _token_counts(response: Any) -> Optional[Dict[str, int]]:
+    """Prompt/completion token counts reported by the API, if the response carries them."""
+    counts = getattr(response, "additional_kwargs", None) or {}
+    if "prompt_tokens" in counts or "completion_tokens" in counts:
+        return {
+            "prompt_tokens": int(counts.get("prompt_tokens") or 0),
+            "completion_tokens": int(counts.get("completion_tokens") or 0),
+        }
+    usage = getattr(getattr(response, "raw", None), "usage", None)
+    if usage is not None and getattr(usage, "prompt_tokens", None) is not None:
+        return {
+            "prompt_tokens": int(usage.prompt_tokens or 0),
+            "completion_tokens": int(getattr(usage, "completion_tokens", 0) or 0),
+        }
+    return None
+
+
+class _Turn:
+    """State of one traced chat turn: its spans (when sampled) and counters."""
+
+    __slots__ = ("trace_id", "session_id", "sampled", "root", "spans", "open", "counters", "tools")
+
+    def __init__(self, session_id: str, sampled: bool):
+        self.trace_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.sampled = sampled
+        self.root = _span_id()
+        self.spans: List[Dict[str, Any]] = []
+        self.open: Dict[str, Dict[str, Any]] = {}
+        self.counters = Counter()
+        self.tools = Counter()
+
+
+_current_turn: ContextVar[Optional[_Turn]] = ContextVar("agent_trace_turn", default=None)
+
+
+class AgentTracer(BaseCallbackHandler):
+    """Records spans for each chat turn and keeps per-session summaries."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        export_format: str = "jsonl",
+        sample_rate: float = 1.0,
+        service_name: str = "ai-agent",
+        max_sessions: int = 10000,
+    ):
+        """
+        Initialize the tracer.
+
+        Args:
+            path: JSON lines file traces are appended to (None keeps only the summaries)
+            export_format: ``jsonl`` (one record per span) or ``otlp`` (one OTLP/JSON record per trace)
+            sample_rate: Fraction of turns whose spans are recorded and exported
+            service_name: ``service.name`` resource attribute for OTLP records
+            max_sessions: Maximum number of session summaries kept (least recently used are dropped)
+        """
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown trace export format '{export_format}', expected one of {EXPORT_FORMATS}")
+        super().__init__(event_starts_to_ignore=_IGNORED, event_ends_to_ignore=_IGNORED)
+        self.path = path
+        self.export_format = export_format
+        self.sample_rate = sample_rate
+        self.service_name = service_name
+        self.max_sessions = max_sessions
+        self._summaries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._file = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8")
+
+    @classmethod
+    def from_env(cls, default_dir: str) -> Optional["AgentTracer"]:
+        """
+        Build a tracer from TRACE_EXPORT, TRACE_PATH and TRACE_SAMPLE_RATE.
+
+        Returns:
+            The tracer, or None when TRACE_EXPORT is unset or ``off``
+        """
+        export_format = os.getenv("TRACE_EXPORT", "").strip().lower()
+        if not export_format or export_format == "off":
+            return None
+        return cls(
+            path=os.getenv("TRACE_PATH", os.path.join(default_dir, "traces.jsonl")),
+            export_format=export_format,
+            sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "1.0")),
+        )
+
+    # -- turns and manual spans -------------------------------------------------
+
+    @contextmanager
+    def turn(self, session_id: str, **attributes: Any) -> Iterator[None]:
+        """Trace one chat turn; LlamaIndex events and ``span`` calls inside it become its spans."""
+        turn = _Turn(session_id, random.random() < self.sample_rate)
+        token = _current_turn.set(turn)
+        start = time.time_ns()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            try:
+                _current_turn.reset(token)
+            except ValueError:
+                # An async generator closed from another context; the turn is finished anyway
+                _current_turn.set(None)
+            end = time.time_ns()
+            self._finish_turn(turn, start, end, status, attributes)
+
+    @contextmanager
+    def span(self, name: str, session_id: Optional[str] = None, **attributes: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Trace a block of work, e.g. a memory operation.
+
+        Inside a turn the span joins that turn's trace; elsewhere (such as the
+        background memory writer) it is exported as a trace of its own.
+
+        Yields:
+            The span's attribute dict, to which results can be added
+        """
+        turn = _current_turn.get()
+        start = time.time_ns()
+        status = "ok"
+        try:
+            yield attributes
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            end = time.time_ns()
+            kind = name.split(".", 1)[0]
+            if turn is not None:
+                turn.counters[f"{kind}_ops"] += 1
+                if turn.sampled:
+                    turn.spans.append(self._record(name, turn.root, start, end, attributes, status))
+            else:
+                session = session_id or attributes.get("session_id") or "background"
+                self._update_summary(session, Counter({f"{kind}_ops": 1}), Counter(), end - start, turns=0)
+                if random.random() < self.sample_rate:
+                    root = self._record(name, None, start, end, dict(attributes, session_id=session), status)
+                    self._export(uuid.uuid4().hex, [root])
+
+    # -- LlamaIndex callbacks ---------------------------------------------------
+
+    def on_event_start(
+        self,
+        event_type: CBEventType,
+        payload: Optional[Dict[str, Any]] = None,
+        event_id: str = "",
+        parent_id: str = "",
+        **kwargs: Any,
+    ) -> str:
+        turn = _current_turn.get()
+        if turn is None:
+            return event_id
+        name = _SPAN_NAMES.get(event_type)
+        payload = payload or {}
+        attributes: Dict[str, Any] = {}
+        if event_type == CBEventType.FUNCTION_CALL:
+            tool = payload.get(EventPayload.TOOL)
+            tool_name = getattr(tool, "name", None) or "unknown"
+            turn.tools[tool_name] += 1
+            name = f"tool.{tool_name}"
+            attributes["tool.name"] = tool_name
+        elif event_type == CBEventType.LLM:
+            messages = payload.get(EventPayload.MESSAGES)
+            prompt = payload.get(EventPayload.PROMPT)
+            if messages is not None:
+                attributes["_prompt_chars"] = sum(len(str(m.content or "")) for m in messages)
+            elif prompt is not None:
+                attributes["_prompt_chars"] = len(str(prompt))
+        turn.open[event_id] = {
+            "name": name,
+            "parent": parent_id,
+            "start": time.time_ns(),
+            "attributes": attributes,
+        }
+        return event_id
+
+    def on_event_end(
+        self,
+        event_type: CBEventType,
+        payload: Optional[Dict[str, Any]] = None,
+        event_id: str = "",
+        **kwargs: Any,
+    ) -> None:
+        turn = _current_turn.get()
+        if turn is None:
+            return
+        opened = turn.open.pop(event_id, None)
+        if opened is None:
+            return
+        end = time.time_ns()
+        payload = payload or {}
+        attributes = opened["attributes"]
+        status = "error" if EventPayload.EXCEPTION in payload else "ok"
+
+        if event_type == CBEventType.LLM:
+            turn.counters["llm_calls"] += 1
+            response = payload.get(EventPayload.RESPONSE) or payload.get(EventPayload.COMPLETION)
+            counts = _token_counts(response)
+            if counts is None:
+                text = str(getattr(getattr(response, "message", None), "content", None) or getattr(response, "text", "") or "")
+                counts = {
+                    "prompt_tokens": _estimate_tokens(attributes.get("_prompt_chars", 0)),
+                    "completion_tokens": _estimate_tokens(len(text)),
+                }
+                attributes["llm.tokens_estimated"] = True
+            turn.counters["prompt_tokens"] += counts["prompt_tokens"]
+            turn.counters["completion_tokens"] += counts["completion_tokens"]
+            attributes["llm.prompt_tokens"] = counts["prompt_tokens"]
+            attributes["llm.completion_tokens"] = counts["completion_tokens"]
+        elif event_type == CBEventType.EMBEDDING:
+            chunks = payload.get(EventPayload.CHUNKS) or []
+            turn.counters["embedding_calls"] += 1
+            turn.counters["embedded_texts"] += len(chunks)
+            attributes["embedding.texts"] = len(chunks)
+        elif event_type == CBEventType.RETRIEVE:
+            nodes = payload.get(EventPayload.NODES) or []
+            turn.counters["retrievals"] += 1
+            attributes["retrieve.nodes"] = len(nodes)
+            scores = [n.score for n in nodes if getattr(n, "score", None) is not None]
+            if scores:
+                attributes["retrieve.top_score"] = float(max(scores))
+        elif event_type == CBEventType.FUNCTION_CALL:
+            output = payload.get(EventPayload.FUNCTION_OUTPUT)
+            attributes["tool.output_chars"] = len(str(output or ""))
+
+        if turn.sampled:
+            attributes.pop("_prompt_chars", None)
+            # Parents end after their children, so a traced parent is still open here
+            parent = opened["parent"] if opened["parent"] in turn.open else turn.root
+            span = self._record(opened["name"], parent, opened["start"], end, attributes, status)
+            span["span_id"] = event_id
+            turn.spans.append(span)
+
+    def start_trace(self, trace_id: Optional[str] = None) -> None:
+        pass
+
+    def end_trace(self, trace_id: Optional[str] = None, trace_map: Optional[Dict[str, List[str]]] = None) -> None:
+        pass
+
+    # -- summaries and export ---------------------------------------------------
+
+    @staticmethod
+    def _record(name: str, parent: Optional[str], start: int, end: int,
+                attributes: Dict[str, Any], status: str) -> Dict[str, Any]:
+        return {
+            "span_id": _span_id(),
+            "parent_id": parent,
+            "name": name,
+            "start_ns": start,
+            "end_ns": end,
+            "status": status,
+            "attributes": {k: v for k, v in attributes.items() if not k.startswith("_")},
+        }
+
+    def _finish_turn(self, turn: _Turn, start: int, end: int, status: str, attributes: Dict[str, Any]):
+        counters = turn.counters
+        self._update_summary(turn.session_id, counters, turn.tools, end - start, turns=1)
+        if not turn.sampled:
+            return
+        root = self._record("agent.turn", None, start, end, dict(
+            attributes,
+            session_id=turn.session_id,
+            **{"llm.calls": counters["llm_calls"],
+               "llm.prompt_tokens": counters["prompt_tokens"],
+               "llm.completion_tokens": counters["completion_tokens"],
+               "tools": ",".join(turn.tools.elements())}
+        ), status)
+        root["span_id"] = turn.root
+        # Span ids from LlamaIndex are UUIDs; OTLP wants 8-byte ids
+        ids = {turn.root: turn.root}
+        for span in turn.spans:
+            ids.setdefault(span["span_id"], _span_id())
+        for span in turn.spans:
+            span["span_id"] = ids[span["span_id"]]
+            span["parent_id"] = ids.get(span["parent_id"], turn.root)
+        self._export(turn.trace_id, [root] + turn.spans)
+
+    def _update_summary(self, session_id: str, counters: Counter, tools: Counter, duration_ns: int, turns: int):
+        with self._lock:
+            summary = self._summaries.get(session_id)
+            if summary is None:
+                summary = self._summaries[session_id] = {
+                    "turns": 0, "llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                    "total_tokens": 0, "tools": Counter(), "embedding_calls": 0, "retrievals": 0,
+                    "memory_ops": 0, "duration_s": 0.0,
+                }
+                while len(self._summaries) > self.max_sessions:
+                    self._summaries.popitem(last=False)
+            self._summaries.move_to_end(session_id)
+            summary["turns"] += turns
+            for key in ("llm_calls", "prompt_tokens", "completion_tokens", "embedding_calls", "retrievals", "memory_ops"):
+                summary[key] += counters[key]
+            summary["total_tokens"] = summary["prompt_tokens"] + summary["completion_tokens"]
+            summary["tools"].update(tools)
+            if turns:
+                summary["duration_s"] += duration_ns / 1e9
+
+    def session_summary(self, session_id: str, pop: bool = False) -> Dict[str, Any]:
+        """
+        Tools used, LLM hops, token totals and time spent for a session (empty if unknown).
+
+        With ``pop`` the summary is also dropped, e.g. once a one-off session is finished.
+        """
+        with self._lock:
+            summary = self._summaries.pop(session_id, None) if pop else self._summaries.get(session_id)
+            if summary is None:
+                return {}
+            return dict(summary, tools=dict(summary["tools"]))
+
+    def session_summaries(self) -> Dict[str, Dict[str, Any]]:
+        """Summaries of every tracked session."""
+        with self._lock:
+            session_ids = list(self._summaries)
+        return {session_id: self.session_summary(session_id) for session_id in session_ids}
+
+    def _export(self, trace_id: str, spans: List[Dict[str, Any]]):
+        if self._file is None:
+            return
+        if self.export_format == "otlp":
+            lines = [json.dumps(self._otlp(trace_id, spans))]
+        else:
+            lines = [
+                json.dumps({
+                    "trace_id": trace_id,
+                    "span_id": span["span_id"],
+                    "parent_id": span["parent_id"],
+                    "name": span["name"],
+                    "start_time": span["start_ns"] / 1e9,
+                    "end_time": span["end_ns"] / 1e9,
+                    "duration_ms": (span["end_ns"] - span["start_ns"]) / 1e6,
+                    "status": span["status"],
+                    "attributes": span["attributes"],
+                }, default=str)
+                for span in spans
+            ]
+        try:
+            with self._lock:
+                self._file.write("\n".join(lines) + "\n")
+                self._file.flush()
+        except Exception as e:
+            logger.warning(f"Failed to export trace: {e}")
+
+    @staticmethod
+    def _otlp_value(value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def _otlp(self, trace_id: str, spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """One trace as an OTLP/JSON ``resourceSpans`` record."""
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{
+                "scope": {"name": "agent_tracing"},
+                "spans": [{
+                    "traceId": trace_id,
+                    "spanId": span["span_id"],
+                    **({"parentSpanId": span["parent_id"]} if span["parent_id"] else {}),
+                    "name": span["name"],
+                    "kind": 1,
+                    "startTimeUnixNano": str(span["start_ns"]),
+                    "endTimeUnixNano": str(span["end_ns"]),
+                    "attributes": [
+                        {"key": key, "value": self._otlp_value(value)}
+                        for key, value in span["attributes"].items()
+                    ],
+                    "status": {"code": 2 if span["status"] == "error" else 1},
+                } for span in spans],
+            }],
+        }]}
+
+    def close(self):
+        """Close the export file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
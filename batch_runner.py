@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Run many prompts through the AI Agent offline, e.g. regression and eval sets.
+
+Prompts are read lazily from a JSON lines file, one item per line: an object
+with a ``prompt`` (or ``message``) and optionally an ``id``; any other fields
+(such as ``expected``) are copied to the item's result. A plain JSON string
+is also accepted as a prompt. Each item runs as one turn of its own agent
+session, several at a time, and its result is appended to the output JSON
+lines file as soon as it finishes, with the response, latency, token usage
+and the tool calls made. Items run isolated: they neither write to long-term
+memory nor use the semantic answer cache, so no item sees another's answers.
+
+Results are written in completion order and carry the item's ``index`` (its
+position among the non-blank input lines). Running again with the same input
+and output resumes: items already in the output are skipped and a line cut
+short by a crash is discarded. Memory use does not grow with the input: the
+input is streamed, sessions are closed once their item is written, and the
+pool never runs more than ``window`` items ahead of the oldest unfinished
+one, which also bounds what resuming has to remember.
+
+Usage:
+    python batch_runner.py prompts.jsonl results.jsonl --concurrency 8
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Fields holding the prompt of an input item, in order of preference
+PROMPT_FIELDS = ("prompt", "message")
+
+
+def read_items(path: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Stream the items of a JSON lines prompts file.
+
+    Yields:
+        Tuples of (index among non-blank lines, item); an item that cannot be
+        parsed carries an ``error`` instead of a ``prompt``
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        index = 0
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                item = {"error": f"Line {line_number} is not valid JSON: {e}"}
+            else:
+                if isinstance(item, str):
+                    item = {"prompt": item}
+                elif not isinstance(item, dict):
+                    item = {"error": f"Line {line_number} is neither an object nor a string"}
+                else:
+                    prompt = next((item.pop(key) for key in PROMPT_FIELDS if key in item), None)
+                    if not isinstance(prompt, str) or not prompt.strip():
+                        item = dict(item, error=f"Line {line_number} has no prompt")
+                    else:
+                        item["prompt"] = prompt
+            yield index, item
+            index += 1
+
+
+class Progress:
+    """Which item indexes are finished: every index below ``watermark`` plus a few later ones."""
+
+    __slots__ = ("watermark", "done")
+
+    def __init__(self):
+        self.watermark = 0
+        self.done: Set[int] = set()
+
+    def add(self, index: int):
+        """Mark an item finished."""
+        if index < self.watermark:
+            return
+        self.done.add(index)
+        while self.watermark in self.done:
+            self.done.remove(self.watermark)
+            self.watermark += 1
+
+    def __contains__(self, index: int) -> bool:
+        return index < self.watermark or index in self.done
+
+    def __len__(self) -> int:
+        return self.watermark + len(self.done)
+
+
+def load_progress(path: str) -> Progress:
+    """
+    Read the items already finished in a results file, for resuming.
+
+    A last line without a newline (cut short by a crash) is truncated away so
+    new results are appended after the last complete one.
+    """
+    progress = Progress()
+    if not os.path.exists(path):
+        return progress
+    complete = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            complete += len(line)
+            try:
+                progress.add(int(json.loads(line)["index"]))
+            except (ValueError, KeyError, TypeError):
+                logger.warning(f"Ignoring unreadable result line in {path}")
+    if complete < os.path.getsize(path):
+        logger.warning(f"Discarding an incomplete last result in {path}")
+        with open(path, "r+b") as f:
+            f.truncate(complete)
+    return progress
+
+
+class BatchRunner:
+    """Runs prompts through an agent concurrently, one session per prompt, and records the results."""
+
+    def __init__(
+        self,
+        agent: Any,
+        concurrency: int = 4,
+        window: Optional[int] = None,
+        max_tool_output: int = 1000,
+        fsync: bool = False,
+    ):
+        """
+        Initialize the runner.
+
+        Args:
+            agent: ``AIAgent`` to run the prompts through
+            concurrency: Items running at once
+            window: How far past the oldest unfinished item new items may start
+                (defaults to four times ``concurrency``)
+            max_tool_output: Characters of each tool output kept in the results (0 keeps all)
+            fsync: Sync the results file to disk after every item, not only flush it
+        """
+        self.agent = agent
+        self.concurrency = max(1, concurrency)
+        self.window = max(self.concurrency, window or 4 * self.concurrency)
+        self.max_tool_output = max_tool_output
+        self.fsync = fsync
+        # Token usage comes from the per-session trace summaries
+        agent.enable_tracing()
+
+    def run_item(self, index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run one item in a fresh session.
+
+        Returns:
+            The item's result record
+        """
+        result = {key: value for key, value in item.items() if key not in ("prompt", "error")}
+        result["index"] = index
+        if "error" in item:
+            result.update(status="invalid", error=item["error"])
+            return result
+
+        session_id = f"batch-{index}"
+        tools = []
+        response = error = ttft = None
+        start = time.perf_counter()
+        try:
+            # Isolated: eval prompts must not reach the user's memory or share cached answers
+            for event in self.agent.stream_chat(item["prompt"], session_id=session_id, isolated=True):
+                if event["type"] == "tool_call":
+                    arguments = event["input"]
+                    if isinstance(arguments, str):
+                        # Pre-routed calls report their arguments as JSON text
+                        try:
+                            arguments = json.loads(arguments)
+                        except ValueError:
+                            pass
+                    tools.append({"tool": event["tool"], "input": arguments})
+                elif event["type"] == "tool_result":
+                    call = next((c for c in reversed(tools) if c["tool"] == event["tool"] and "output" not in c), None)
+                    if call is None:
+                        call = {"tool": event["tool"]}
+                        tools.append(call)
+                    output = event["output"]
+                    if self.max_tool_output and len(output) > self.max_tool_output:
+                        output = output[:self.max_tool_output] + "…"
+                    call["output"] = output
+                elif event["type"] == "done":
+                    response, ttft = event["response"], event["ttft"]
+                elif event["type"] == "error":
+                    error = event["message"]
+        except Exception as e:
+            error = str(e)
+        finally:
+            latency = time.perf_counter() - start
+            self.agent.close_session(session_id)
+            summary = self.agent.session_summary(session_id, pop=True)
+
+        result.update(
+            status="error" if error is not None else "ok",
+            response=response,
+            latency_s=round(latency, 4),
+            ttft_s=round(ttft, 4) if ttft is not None else None,
+            usage={key: summary.get(key, 0) for key in ("llm_calls", "prompt_tokens", "completion_tokens", "total_tokens")},
+            tools=tools,
+        )
+        if error is not None:
+            result["error"] = error
+        return result
+
+    def run(self, input_path: str, output_path: str, resume: bool = True) -> Dict[str, Any]:
+        """
+        Run every item of ``input_path`` not yet in ``output_path``, appending the results.
+
+        Args:
+            input_path: JSON lines prompts file
+            output_path: JSON lines results file
+            resume: Skip items already in ``output_path``; otherwise start it over
+
+        Returns:
+            Totals of this run: items run and skipped, statuses, tokens, mean and max latency, wall time
+        """
+        progress = load_progress(output_path) if resume else Progress()
+        if len(progress):
+            logger.info(f"Resuming: {len(progress)} items already in {output_path}")
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+        totals = {"items": 0, "skipped": 0, "ok": 0, "error": 0, "invalid": 0, "total_tokens": 0,
+                  "latency_mean_s": 0.0, "latency_max_s": 0.0}
+        items = read_items(input_path)
+        pending: Dict[Future, int] = {}
+        start = time.perf_counter()
+        pool = ThreadPoolExecutor(self.concurrency, thread_name_prefix="batch")
+        with open(output_path, "a" if resume else "w", encoding="utf-8") as out:
+            upcoming = next(items, None)
+            try:
+                while upcoming is not None or pending:
+                    # Start items while there is room, without running too far ahead of the oldest one
+                    while upcoming is not None and len(pending) < self.concurrency and \
+                            (not pending or upcoming[0] < min(pending.values()) + self.window):
+                        index, item = upcoming
+                        if index in progress:
+                            totals["skipped"] += 1
+                        else:
+                            pending[pool.submit(self.run_item, index, item)] = index
+                        upcoming = next(items, None)
+                    if not pending:
+                        continue
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        del pending[future]
+                        result = future.result()
+                        out.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+                        out.flush()
+                        if self.fsync:
+                            os.fsync(out.fileno())
+                        self._count(totals, result)
+            finally:
+                # On an interrupt, items not written yet are run again on resume
+                pool.shutdown(wait=not pending, cancel_futures=True)
+
+        totals["wall_s"] = time.perf_counter() - start
+        totals["items_per_s"] = totals["items"] / totals["wall_s"] if totals["wall_s"] else 0.0
+        return totals
+
+    @staticmethod
+    def _count(totals: Dict[str, Any], result: Dict[str, Any]):
+        totals["items"] += 1
+        totals[result["status"]] += 1
+        if result["status"] == "invalid":
+            return
+        totals["total_tokens"] += result["usage"]["total_tokens"]
+        run = totals["ok"] + totals["error"]
+        totals["latency_mean_s"] += (result["latency_s"] - totals["latency_mean_s"]) / run
+        totals["latency_max_s"] = max(totals["latency_max_s"], result["latency_s"])
+
+
+def main(argv: Optional[list] = None) -> int:
+    """Command-line entry point."""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Run a JSON lines file of prompts through the AI Agent")
+    parser.add_argument("input", help="Prompts, one JSON object (or string) per line")
+    parser.add_argument("output", help="Results file; appended to, so an interrupted run resumes")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("BATCH_CONCURRENCY", "4")),
+                        help="Prompts running at once")
+    parser.add_argument("--window", type=int, default=int(os.getenv("BATCH_WINDOW", "0")) or None,
+                        help="How far past the oldest unfinished prompt new ones may start (default: 4x concurrency)")
+    parser.add_argument("--max-tool-output", type=int, default=int(os.getenv("BATCH_MAX_TOOL_OUTPUT", "1000")),
+                        help="Characters of each tool output kept in the results (0 keeps all)")
+    parser.add_argument("--fsync", action="store_true", help="Sync the results to disk after every prompt")
+    parser.add_argument("--restart", action="store_true", help="Overwrite the results file instead of resuming")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    logger.setLevel(logging.INFO)
+    groq_api_key = os.getenv("GROQ_API_KEY")
+    if not groq_api_key:
+        print("Please set the GROQ_API_KEY environment variable")
+        return 2
+
+    from agent_ import AIAgent
+
+    agent = AIAgent(groq_api_key, os.getenv("DOCUMENTS_PATH", "./documents"), index_dir=os.getenv("INDEX_DIR", "./storage"),
+                    lazy=False, warmup=False)
+    runner = BatchRunner(agent, concurrency=args.concurrency, window=args.window,
+                         max_tool_output=args.max_tool_output, fsync=args.fsync)
+    try:
+        totals = runner.run(args.input, args.output, resume=not args.restart)
+    except KeyboardInterrupt:
+        print(f"\n⏹️  Interrupted; run again to resume from {args.output}")
+        return 130
+    finally:
+        agent.close()
+
+    print(f"✅ {totals['items']} prompts in {totals['wall_s']:.1f}s ({totals['items_per_s']:.2f}/s), "
+          f"{totals['skipped']} already done; {totals['ok']} ok, {totals['error']} errors, {totals['invalid']} invalid")
+    print(f"📊 Latency mean {totals['latency_mean_s']:.2f}s, max {totals['latency_max_s']:.2f}s; "
+          f"{totals['total_tokens']} tokens")
+    return 0 if totals["error"] == 0 and totals["invalid"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1158 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for the AI Agent.
+
+Runs ``AIAgent`` against a deterministic local stand-in LLM (scripted ReAct
+outputs with configurable latency), a hashing embedding model and an
+in-process fake Mem0, so no API keys or network access are needed and results
+only move when this code does. Covers cold and warm start, knowledge base
+index builds, live re-indexing of a changed documents directory, dense versus
+hybrid retrieval (latency and recall@k), query embedding, every tool
+registered in ``_setup_tools``, end-to-end ``chat``/``achat`` latency and
+throughput at several concurrency levels, prompt tokens per turn over a long
+session, the calculator one expression at a time and in batch mode, trivial
+requests with and without the pre-dispatch router, a multi-tool question under
+the ReAct and parallel function-calling agents, local memory search over a
+user's history, concurrent query embedding with and without micro-batching,
+and Groq calls through the LLM gateway versus a plain client against the local
+mock API (tail latency, transient errors, rate limits). ``--embedding-backends
+int8,onnx`` also measures the real CPU embedding backends (throughput and
+drift from fp32 vectors); that section needs the model weights and is off by
+default.
+
+Results are written as JSON; every duration key ends in ``_s`` (lower is
+better) and throughput keys end in ``_per_s`` (higher is better), which is
+what ``--baseline`` uses to flag regressions.
+
+Usage:
+    python benchmark.py --output results.json
+    python benchmark.py --output new.json --baseline results.json --tolerance 0.25
+"""
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import platform
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, AsyncGenerator, Dict, Generator, List, Optional, Sequence
+from unittest import mock
+
+import numpy as np
+from llama_index.core.bridge.pydantic import Field
+from llama_index.core.embeddings import BaseEmbedding
+from llama_index.core.llms import (
+    ChatMessage,
+    ChatResponse,
+    CompletionResponse,
+    CustomLLM,
+    LLMMetadata,
+    MessageRole,
+)
+from llama_index.core.llms.callbacks import llm_chat_callback, llm_completion_callback
+from llama_index.core.llms.function_calling import FunctionCallingLLM
+from llama_index.core.llms.llm import ToolSelection
+from llama_index.core.memory import ChatMemoryBuffer
+
+logger = logging.getLogger(__name__)
+
+# Question patterns the stand-in LLM answers with a tool call: (pattern, tool, arguments)
+SCRIPT = [
+    (r"calculate (.+)", "calculator", lambda m, q: {"expression": m.group(1).strip(" ?")}),
+    (r"weather in ([\w ]+)", "weather", lambda m, q: {"location": m.group(1).strip()}),
+    (r"movies like (.+)", "movie_recommend", lambda m, q: {"movie_title": m.group(1).strip(" ?")}),
+    (r"films by (.+)", "movie_search", lambda m, q: {"director": m.group(1).strip(" ?")}),
+    (r"tell me about (.+)", "movie_info", lambda m, q: {"movie_title": m.group(1).strip(" ?")}),
+    (r"\b(remember|earlier)\b", "memory_search", lambda m, q: {"query": q}),
+    (r"what is (.+)", "knowledge_base", lambda m, q: {"input": q}),
+]
+
+# A question needing several independent tool calls (one per clause)
+MULTI_TOOL_PROMPT = "Tell me about The Matrix, tell me about Inception and what's the weather in London?"
+
+# Chat workload: a mix of tool calls and a direct answer
+PROMPTS = [
+    "Tell me about Inception",
+    "Calculate 25 * 4 + 10",
+    "What's the weather in London?",
+    "Recommend movies like The Matrix",
+    "Show me films by Christopher Nolan",
+    "What is machine learning?",
+    "What did we talk about earlier?",
+    "Hello! Can you introduce yourself?",
+]
+
+# Requests the pre-dispatch router answers without the LLM
+FAST_PATH_PROMPTS = [
+    "Calculate 25 * 4 + 10",
+    "What's the weather in London?",
+    "Tell me about Inception",
+]
+
+# Representative arguments for each tool benchmark
+TOOL_INPUTS = {
+    "calculator": {"expression": "25 * 4 + 10"},
+    "weather": {"location": "London"},
+    "movie_info": {"movie_title": "Inception"},
+    "movie_search": {"director": "Nolan", "min_rating": 8.0},
+    "movie_recommend": {"movie_title": "Inception"},
+    "knowledge_base": {"input": "What is machine learning?"},
+    "memory_search": {"query": "movies"},
+    "memory_summary": {},
+}
+
+# Knowledge base questions with exact terms, and text the relevant chunk contains
+RETRIEVAL_QUERIES = [
+    ("Which film did Coppola release in 1972, The Godfather?", "The Godfather"),
+    ("Tell me about Blade Runner", "Blade Runner"),
+    ("What is Monty Python and the Holy Grail?", "Holy Grail"),
+    ("When was Parasite released?", "Parasite"),
+    ("What are the goals of the Artemis program?", "Artemis"),
+    ("What has the James Webb telescope found?", "James Webb"),
+    ("How is CRISPR used?", "CRISPR"),
+    ("What is Go (Golang) good at?", "Go (Golang)"),
+    ("What are TypeScript's benefits?", "TypeScript"),
+    ("How do qubits work?", "qubit"),
+    ("What does 5G change?", "5G"),
+    ("What are smart contracts on a blockchain?", "mart contract"),
+]
+RECALL_K = (1, 2, 5)
+
+
+def scripted_tool_calls(question: str, available: Sequence[str]) -> List[Dict[str, Any]]:
+    """Tool calls ``SCRIPT`` makes for a question: one per matching clause, in order."""
+    calls = []
+    for clause in re.split(r",|\band\b", question):
+        for pattern, tool, arguments in SCRIPT:
+            match = re.search(pattern, clause, re.IGNORECASE)
+            if match and tool in available:
+                calls.append({"tool": tool, "arguments": arguments(match, question)})
+                break
+    return calls
+
+
+class ScriptedReActLLM(CustomLLM):
+    """Deterministic stand-in LLM that answers ReAct prompts from ``SCRIPT``."""
+
+    latency: float = Field(default=0.05, description="Seconds before the first token of each call")
+    token_latency: float = Field(default=0.0, description="Seconds between streamed tokens")
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(model_name="scripted-react", is_chat_model=True, context_window=8192)
+
+    def _reply(self, messages: Sequence[ChatMessage]) -> str:
+        system = messages[0].content if messages and messages[0].role == MessageRole.SYSTEM else ""
+        if "Action Input" not in (system or ""):
+            # Not a ReAct prompt, e.g. the knowledge base response synthesizer
+            return "Based on the provided context, here is a concise answer."
+        # The question is the last user message that is not a tool observation
+        observations = []
+        question = ""
+        for message in reversed(messages):
+            content = message.content or ""
+            if message.role == MessageRole.USER and content.startswith("Observation:"):
+                observations.insert(0, content[len("Observation:"):].strip())
+            elif message.role == MessageRole.USER:
+                question = content
+                break
+        available = re.findall(r"> Tool Name: (\S+)\n", system)
+        calls = scripted_tool_calls(question, available)
+        # One tool per step: call the next one, or answer once every call has been observed
+        if len(observations) < len(calls):
+            call = calls[len(observations)]
+            return (
+                "Thought: I need to use a tool to help me answer the question.\n"
+                f"Action: {call['tool']}\nAction Input: {json.dumps(call['arguments'])}"
+            )
+        if observations:
+            answer = " ".join((o.splitlines() or [""])[0].strip() for o in observations)
+            return f"Thought: I can answer without using any more tools.\nAnswer: {answer}"
+        return "Thought: I can answer without using any tools.\nAnswer: Hello! I am an offline benchmark assistant."
+
+    @staticmethod
+    def _message(text: str) -> ChatMessage:
+        return ChatMessage(role=MessageRole.ASSISTANT, content=text)
+
+    @staticmethod
+    def _tokens(text: str) -> List[str]:
+        return re.findall(r"\S+\s*|\s+", text)
+
+    @llm_chat_callback()
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        time.sleep(self.latency)
+        return ChatResponse(message=self._message(self._reply(messages)))
+
+    @llm_chat_callback()
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> Generator[ChatResponse, None, None]:
+        text = self._reply(messages)
+
+        def gen() -> Generator[ChatResponse, None, None]:
+            time.sleep(self.latency)
+            content = ""
+            for token in self._tokens(text):
+                time.sleep(self.token_latency)
+                content += token
+                yield ChatResponse(message=self._message(content), delta=token)
+        return gen()
+
+    @llm_chat_callback()
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        await asyncio.sleep(self.latency)
+        return ChatResponse(message=self._message(self._reply(messages)))
+
+    @llm_chat_callback()
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> AsyncGenerator[ChatResponse, None]:
+        text = self._reply(messages)
+
+        async def gen() -> AsyncGenerator[ChatResponse, None]:
+            await asyncio.sleep(self.latency)
+            content = ""
+            for token in self._tokens(text):
+                await asyncio.sleep(self.token_latency)
+                content += token
+                yield ChatResponse(message=self._message(content), delta=token)
+        return gen()
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return CompletionResponse(text=self.chat([ChatMessage(role=MessageRole.USER, content=prompt)]).message.content)
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> Generator[CompletionResponse, None, None]:
+        def gen() -> Generator[CompletionResponse, None, None]:
+            for response in self.stream_chat([ChatMessage(role=MessageRole.USER, content=prompt)]):
+                yield CompletionResponse(text=response.message.content, delta=response.delta)
+        return gen()
+
+
+class ScriptedFunctionCallingLLM(FunctionCallingLLM):
+    """Deterministic stand-in for a function-calling LLM: requests every ``SCRIPT`` call in one step."""
+
+    latency: float = Field(default=0.05, description="Seconds before the first token of each call")
+    token_latency: float = Field(default=0.0, description="Seconds between streamed tokens")
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(
+            model_name="scripted-function-calling", is_chat_model=True,
+            is_function_calling_model=True, context_window=8192,
+        )
+
+    def _prepare_chat_with_tools(
+        self,
+        tools: Sequence[Any],
+        user_msg: Optional[Any] = None,
+        chat_history: Optional[List[ChatMessage]] = None,
+        verbose: bool = False,
+        allow_parallel_tool_calls: bool = False,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        messages = list(chat_history or [])
+        if user_msg is not None:
+            messages.append(user_msg if isinstance(user_msg, ChatMessage) else ChatMessage(role=MessageRole.USER, content=user_msg))
+        return {"messages": messages, "tools": [tool.metadata.name for tool in tools],
+                "allow_parallel_tool_calls": allow_parallel_tool_calls}
+
+    def get_tool_calls_from_response(self, response: ChatResponse, error_on_no_tool_call: bool = True, **kwargs: Any) -> List[ToolSelection]:
+        calls = response.message.additional_kwargs.get("tool_calls", [])
+        if not calls and error_on_no_tool_call:
+            raise ValueError("Expected at least one tool call")
+        return [ToolSelection(tool_id=call["id"], tool_name=call["name"], tool_kwargs=call["arguments"]) for call in calls]
+
+    def _reply(self, messages: Sequence[ChatMessage], tools: Sequence[str], parallel: bool) -> ChatMessage:
+        if messages and messages[-1].role == MessageRole.TOOL:
+            results = []
+            for message in reversed(messages):
+                if message.role != MessageRole.TOOL:
+                    break
+                results.insert(0, (message.content or "").splitlines()[0].strip() if message.content else "")
+            return ChatMessage(role=MessageRole.ASSISTANT, content=" ".join(results))
+        question = messages[-1].content if messages else ""
+        calls = scripted_tool_calls(question or "", tools)
+        if not calls:
+            return ChatMessage(role=MessageRole.ASSISTANT, content="Hello! I am an offline benchmark assistant.")
+        calls = calls if parallel else calls[:1]
+        tool_calls = [{"id": f"call_{i}", "name": c["tool"], "arguments": c["arguments"]} for i, c in enumerate(calls)]
+        return ChatMessage(role=MessageRole.ASSISTANT, content="", additional_kwargs={"tool_calls": tool_calls})
+
+    def _chunks(self, message: ChatMessage) -> Generator[ChatResponse, None, None]:
+        if message.additional_kwargs.get("tool_calls"):
+            yield ChatResponse(message=message, delta="")
+            return
+        content = ""
+        for token in ScriptedReActLLM._tokens(message.content or ""):
+            content += token
+            yield ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=content), delta=token)
+
+    @llm_chat_callback()
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        time.sleep(self.latency)
+        return ChatResponse(message=self._reply(messages, kwargs.get("tools", []), kwargs.get("allow_parallel_tool_calls", False)))
+
+    @llm_chat_callback()
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> Generator[ChatResponse, None, None]:
+        message = self._reply(messages, kwargs.get("tools", []), kwargs.get("allow_parallel_tool_calls", False))
+
+        def gen() -> Generator[ChatResponse, None, None]:
+            time.sleep(self.latency)
+            for chunk in self._chunks(message):
+                time.sleep(self.token_latency if chunk.delta else 0)
+                yield chunk
+        return gen()
+
+    @llm_chat_callback()
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        await asyncio.sleep(self.latency)
+        return ChatResponse(message=self._reply(messages, kwargs.get("tools", []), kwargs.get("allow_parallel_tool_calls", False)))
+
+    @llm_chat_callback()
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> AsyncGenerator[ChatResponse, None]:
+        message = self._reply(messages, kwargs.get("tools", []), kwargs.get("allow_parallel_tool_calls", False))
+
+        async def gen() -> AsyncGenerator[ChatResponse, None]:
+            await asyncio.sleep(self.latency)
+            for chunk in self._chunks(message):
+                await asyncio.sleep(self.token_latency if chunk.delta else 0)
+                yield chunk
+        return gen()
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return CompletionResponse(text=self.chat([ChatMessage(role=MessageRole.USER, content=prompt)]).message.content)
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> Generator[CompletionResponse, None, None]:
+        def gen() -> Generator[CompletionResponse, None, None]:
+            for response in self.stream_chat([ChatMessage(role=MessageRole.USER, content=prompt)]):
+                yield CompletionResponse(text=response.message.content, delta=response.delta)
+        return gen()
+
+    @llm_completion_callback()
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return self.complete(prompt, formatted=formatted, **kwargs)
+
+    @llm_completion_callback()
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> AsyncGenerator[CompletionResponse, None]:
+        async def gen() -> AsyncGenerator[CompletionResponse, None]:
+            for response in self.stream_complete(prompt, formatted=formatted, **kwargs):
+                yield response
+        return gen()
+
+
+class HashEmbedding(BaseEmbedding):
+    """Deterministic bag-of-words hashing embedding with configurable per-call latency."""
+
+    dim: int = Field(default=384, description="Embedding dimension")
+    latency: float = Field(default=0.0, description="Seconds per embedding call (per batch for batches)")
+
+    def __init__(self, **kwargs: Any):
+        kwargs.setdefault("model_name", f"hash-embedding-{kwargs.get('dim', 384)}")
+        super().__init__(**kwargs)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HashEmbedding"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dim] += 1.0 if value & (1 << 63) else -1.0
+        norm = float(np.linalg.norm(vector))
+        return (vector / norm if norm else vector).tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._embed(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        await asyncio.sleep(self.latency)
+        return self._embed(query)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        await asyncio.sleep(self.latency)
+        return self._embed(text)
+
+
+class FakeMem0Memory(ChatMemoryBuffer):
+    """In-process stand-in for Mem0Memory: a chat buffer plus ``add``/``search`` over stored turns."""
+
+    latency: float = Field(default=0.0, description="Seconds per add/search call")
+    records: List[Dict[str, Any]] = Field(default_factory=list)
+
+    def add(self, messages: List[Dict[str, str]], metadata: Optional[Dict[str, Any]] = None):
+        time.sleep(self.latency)
+        for message in messages:
+            self.records.append({"content": message["content"], "metadata": dict(metadata or {})})
+
+    def search(self, query: str) -> List[Dict[str, Any]]:
+        time.sleep(self.latency)
+        words = set(re.findall(r"\w+", query.lower()))
+        scored = [
+            (len(words & set(re.findall(r"\w+", record["content"].lower()))), i, record)
+            for i, record in enumerate(self.records)
+        ]
+        return [record for score, _, record in sorted(scored, key=lambda x: (-x[0], -x[1])) if score][:5]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency summary of ``samples`` (seconds)."""
+    if not samples:
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        "count": len(samples),
+        "mean_s": float(np.mean(samples)),
+        "p50_s": float(p50),
+        "p95_s": float(p95),
+        "p99_s": float(p99),
+        "max_s": float(np.max(samples)),
+    }
+
+
+def _timed_call(fn, *args: Any, **kwargs: Any) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def prepare_documents(source: str, target: str, extra_docs: int, seed: int = 0):
+    """Copy the knowledge base documents and add ``extra_docs`` synthetic ones."""
+    os.makedirs(target, exist_ok=True)
+    if source and os.path.isdir(source):
+        for name in os.listdir(source):
+            path = os.path.join(source, name)
+            if os.path.isfile(path) and not name.startswith("."):
+                shutil.copy(path, os.path.join(target, name))
+    rng = random.Random(seed)
+    vocabulary = [
+        "agent", "index", "vector", "memory", "latency", "token", "model", "query", "movie",
+        "director", "science", "planet", "python", "network", "cache", "stream", "batch",
+    ]
+    for i in range(extra_docs):
+        paragraphs = [
+            " ".join(rng.choice(vocabulary) for _ in range(rng.randint(40, 120))).capitalize() + "."
+            for _ in range(rng.randint(3, 12))
+        ]
+        with open(os.path.join(target, f"synthetic_{i:04d}.md"), "w", encoding="utf-8") as f:
+            f.write(f"# Synthetic document {i}\n\n" + "\n\n".join(paragraphs) + "\n")
+
+
+class Benchmark:
+    """Builds agents on the offline stand-ins and runs each benchmark section."""
+
+    def __init__(self, args: argparse.Namespace, workdir: str):
+        self.args = args
+        self.workdir = workdir
+        self.documents_path = os.path.join(workdir, "documents")
+        prepare_documents(args.documents, self.documents_path, args.extra_docs)
+
+    def llm(self, agent_mode: Optional[str] = None):
+        if (agent_mode or self.args.agent_mode) == "parallel":
+            return ScriptedFunctionCallingLLM(latency=self.args.llm_latency, token_latency=self.args.token_latency)
+        return ScriptedReActLLM(latency=self.args.llm_latency, token_latency=self.args.token_latency)
+
+    def embed_model(self) -> HashEmbedding:
+        return HashEmbedding(latency=self.args.embed_latency)
+
+    def memory(self) -> FakeMem0Memory:
+        memory = FakeMem0Memory.from_defaults()
+        memory.latency = self.args.memory_latency
+        return memory
+
+    def agent(self, index_dir: str, lazy: bool = False, agent_mode: Optional[str] = None,
+              fast_router: Optional[bool] = None, documents_path: Optional[str] = None,
+              watch_documents: bool = False):
+        from agent_ import AIAgent
+
+        return AIAgent(
+            "offline-benchmark",
+            documents_path or self.documents_path,
+            index_dir=index_dir,
+            lazy=lazy,
+            warmup=False,
+            max_concurrency=max(self.args.concurrency),
+            llm=self.llm(agent_mode),
+            embed_model=self.embed_model(),
+            memory=self.memory(),
+            agent_mode=agent_mode or self.args.agent_mode,
+            fast_router=fast_router,
+            watch_documents=watch_documents,
+        )
+
+    def cold_start(self) -> Dict[str, Any]:
+        """Startup time with nothing persisted, with everything persisted, and in lazy mode."""
+        results = {}
+        index_dir = os.path.join(self.workdir, "startup")
+        for name, lazy in (("cold", False), ("warm", False), ("lazy", True)):
+            start = time.perf_counter()
+            agent = self.agent(index_dir, lazy=lazy)
+            total = time.perf_counter() - start
+            agent.close()
+            results[name] = {
+                "total_s": total,
+                "components": {f"{component}_s": seconds for component, seconds in agent.startup_timings.items()},
+            }
+        return results
+
+    def index_build(self) -> Dict[str, Any]:
+        """Full build, incremental update after one file changes, and an unchanged reload."""
+        from knowledge_index import PersistentKnowledgeIndex
+
+        persist_dir = os.path.join(self.workdir, "index_build")
+        knowledge_index = PersistentKnowledgeIndex(
+            self.documents_path, persist_dir, embed_model=self.embed_model()
+        )
+        full = _timed_call(knowledge_index.build)
+        files = sorted(knowledge_index.scan())
+        with open(os.path.join(self.documents_path, files[0]), "a", encoding="utf-8") as f:
+            f.write("\n\nAn appended paragraph so this file is re-embedded.\n")
+        incremental = _timed_call(knowledge_index.load_or_build)
+        unchanged = _timed_call(knowledge_index.load_or_build)
+        return {
+            "files": len(files),
+            "full_build_s": full,
+            "incremental_update_s": incremental,
+            "unchanged_load_s": unchanged,
+        }
+
+    def live_reindex(self) -> Dict[str, Any]:
+        """Time from a document change to queryable with the watcher, and query latency meanwhile."""
+        documents_path = os.path.join(self.workdir, "live_documents")
+        shutil.copytree(self.documents_path, documents_path)
+        settings = {"KB_MODE": "retrieve", "KB_WATCH_INTERVAL": "0.1", "KB_WATCH_DEBOUNCE": "0.1"}
+        with mock.patch.dict(os.environ, settings):
+            agent = self.agent(os.path.join(self.workdir, "live_reindex"), documents_path=documents_path,
+                               watch_documents=True)
+        try:
+            stop = threading.Event()
+            latencies: List[float] = []
+
+            def query_load():
+                while not stop.is_set():
+                    latencies.append(_timed_call(agent.kb_retriever.retrieve, "agent memory latency"))
+
+            def retrievable(term: str) -> bool:
+                return any(term in node.node.get_content() for node in agent.kb_retriever.retrieve(term))
+
+            def wait_until(condition, timeout: float = 60.0) -> float:
+                start = time.perf_counter()
+                while not condition() and time.perf_counter() - start < timeout:
+                    time.sleep(0.01)
+                return time.perf_counter() - start
+
+            loader = threading.Thread(target=query_load)
+            loader.start()
+            try:
+                path = os.path.join(documents_path, "live_update.md")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write("# Live update\n\nThe zanzibarquokka protocol was added while the agent ran.\n")
+                created = wait_until(lambda: retrievable("zanzibarquokka"))
+                os.remove(path)
+                deleted = wait_until(lambda: not retrievable("zanzibarquokka"))
+            finally:
+                stop.set()
+                loader.join()
+            return {
+                "create_to_queryable_s": created,
+                "delete_to_gone_s": deleted,
+                "reindex_max_s": max((timing["index"] for timing in agent.kb_update_timings), default=0.0),
+                "queries_during_updates": summarize(latencies),
+            }
+        finally:
+            agent.close()
+
+    def retrieval(self) -> Dict[str, Any]:
+        """Knowledge base retrieval latency and recall@k, dense-only versus hybrid (BM25 + dense)."""
+        from knowledge_index import PersistentKnowledgeIndex
+
+        knowledge_index = PersistentKnowledgeIndex(
+            self.documents_path, os.path.join(self.workdir, "retrieval"), embed_model=self.embed_model()
+        )
+        knowledge_index.load_or_build()
+        results = {}
+        for mode in ("dense", "hybrid"):
+            retriever = knowledge_index.as_retriever(mode=mode, top_k=max(RECALL_K))
+            latencies, hits = [], {k: 0 for k in RECALL_K}
+            for query, expected in RETRIEVAL_QUERIES:
+                start = time.perf_counter()
+                nodes = retriever.retrieve(query)
+                latencies.append(time.perf_counter() - start)
+                texts = [node.node.get_content() for node in nodes]
+                for k in RECALL_K:
+                    hits[k] += any(expected in text for text in texts[:k])
+            results[mode] = dict(
+                summarize(latencies),
+                **{f"recall_at_{k}": hits[k] / len(RETRIEVAL_QUERIES) for k in RECALL_K},
+            )
+        return results
+
+    def query_embedding(self, agent) -> Dict[str, Any]:
+        """Query embedding latency through the agent's (cached) embedding model."""
+        agent._ensure_embeddings()
+        queries = [f"{PROMPTS[i % len(PROMPTS)]} #{i}" for i in range(self.args.iterations)]
+        cold = [_timed_call(agent.embed_model.get_query_embedding, q) for q in queries]
+        warm = [_timed_call(agent.embed_model.get_query_embedding, q) for q in queries]
+        return {"uncached": summarize(cold), "cached": summarize(warm)}
+
+    def tools(self, agent) -> Dict[str, Any]:
+        """Latency of each registered tool, with its result cache cleared and warm."""
+        results = {}
+        for tool in agent.tools:
+            name = tool.metadata.name
+            arguments = TOOL_INPUTS.get(name, {})
+            cache = agent.tool_caches.get(name)
+            tool.call(**arguments)  # build lazily initialized components first
+            uncached = []
+            for _ in range(self.args.iterations):
+                if cache is not None:
+                    cache.clear()
+                uncached.append(_timed_call(tool.call, **arguments))
+            results[name] = {"uncached": summarize(uncached)}
+            if cache is not None:
+                results[name]["cached"] = summarize(
+                    [_timed_call(tool.call, **arguments) for _ in range(self.args.iterations)]
+                )
+        return results
+
+    def calculator(self) -> Dict[str, Any]:
+        """Per-expression cost of the calculator one at a time versus in batch mode."""
+        from safe_calculator import CalculatorError, SafeCalculator
+
+        rng = random.Random(0)
+        count = max(self.args.iterations, 1) * 100
+        expressions = [f"{rng.randint(1, 999)} * {rng.randint(1, 99)} + sqrt({rng.randint(1, 10000)}) / 3"
+                       for _ in range(count)]
+        results = {}
+        calculator = SafeCalculator(cache_size=count)
+        start = time.perf_counter()
+        for expression in expressions:
+            calculator.evaluate(expression)
+        results["single_per_expr_s"] = (time.perf_counter() - start) / count
+        for name in ("batch_cold", "batch_warm"):
+            if name == "batch_cold":
+                calculator = SafeCalculator(cache_size=count)
+            start = time.perf_counter()
+            calculator.evaluate_many(expressions)
+            results[f"{name}_per_expr_s"] = (time.perf_counter() - start) / count
+        # Inputs that once pinned a core must keep failing fast, one at a time and in a batch
+        hostile = ["9**9**9", "factorial(10**6)", "round(12345, -100000000)", "round(1.5, 10**9)"]
+        accepted = set()
+        start = time.perf_counter()
+        for expression in hostile:
+            try:
+                calculator.evaluate(expression)
+                accepted.add(expression)
+            except CalculatorError:
+                pass
+        batch = hostile * max(self.args.iterations, 1)
+        accepted.update(e for e, r in zip(batch, calculator.evaluate_many(batch)) if not isinstance(r, CalculatorError))
+        results["hostile_s"] = time.perf_counter() - start
+        if accepted:
+            raise AssertionError(f"Calculator accepted expressions it must reject: {sorted(accepted)}")
+        # Batch mode must agree with single evaluation, also when float64 intermediates lose digits
+        exact = ["3**40 + 1 - 3**40", "2**60 // 3 - 2**60 // 3 + 7", "10**17 + 1 - 10**17"] * calculator.min_batch
+        mismatched = {e for e, r in zip(exact, calculator.evaluate_many(exact)) if r != calculator.evaluate(e)}
+        if mismatched:
+            raise AssertionError(f"Batch results differ from single evaluation for: {sorted(mismatched)}")
+        return results
+
+    def local_memory(self) -> Dict[str, Any]:
+        """Write throughput and search latency of the local memory over a user's full history."""
+        from local_memory import LocalMemory
+
+        rng = random.Random(0)
+        words = [f"topic{i}" for i in range(500)]
+        path = os.path.join(self.workdir, "memory", "memory.sqlite")
+        memories = {user: LocalMemory(path, self.embed_model(), user_id=user) for user in ("user", "other")}
+        turns = self.args.memory_turns
+        start = time.perf_counter()
+        for batch in range(0, turns, 8):
+            for user, memory in memories.items():
+                messages = []
+                for _ in range(min(8, turns - batch)):
+                    messages.append({"role": "user", "content": " ".join(rng.sample(words, 6))})
+                    messages.append({"role": "assistant", "content": " ".join(rng.sample(words, 12))})
+                memory.add(messages, metadata={"session_id": f"s{batch // 400}",
+                                               "message_type": rng.choice(("movie_query", "general_conversation"))})
+        add_per_turn = (time.perf_counter() - start) / (2 * turns)
+
+        memory = memories["user"]
+        queries = [" ".join(rng.sample(words, 3)) for _ in range(max(self.args.iterations, 1) * 4)]
+        vectors = [memory.embed_model.get_query_embedding(query) for query in queries]
+        results: Dict[str, Any] = {"turns": len(memory), "add_per_turn_s": add_per_turn}
+        scopes = {
+            "history": {},
+            "session": {"session_id": "s0"},
+            "message_type": {"message_type": "movie_query"},
+        }
+        for name, scope in scopes.items():
+            results[f"search_{name}"] = summarize([_timed_call(memory.search_vector, v, **scope) for v in vectors])
+        results["search_with_query"] = summarize([_timed_call(memory.search, q) for q in queries])
+        return results
+
+    def micro_batching(self) -> Dict[str, Any]:
+        """Concurrent query embeddings with one forward pass each versus coalesced into shared passes."""
+        from fast_embedding import MicroBatcher
+
+        lock = threading.Lock()
+        per_pass = self.args.embed_pass_latency
+        per_text = per_pass / 20
+
+        def encode(texts: List[str]) -> List[List[float]]:
+            # A stand-in for a CPU-bound forward pass: one at a time, fixed overhead plus per-text cost
+            with lock:
+                time.sleep(per_pass + per_text * len(texts))
+            return [[1.0] * 8 for _ in texts]
+
+        clients, per_client = 16, max(self.args.iterations // 2, 1)
+
+        def run(embed) -> Dict[str, Any]:
+            latencies: List[float] = []
+
+            def client(c: int):
+                for i in range(per_client):
+                    latencies.append(_timed_call(embed, f"query {c}-{i}"))
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(clients) as pool:
+                list(pool.map(client, range(clients)))
+            return dict(summarize(latencies), queries_per_s=clients * per_client / (time.perf_counter() - start))
+
+        results = {"per_query": run(lambda text: encode([text])[0])}
+        batcher = MicroBatcher(encode, max_batch_size=32)
+        try:
+            results["micro_batched"] = dict(run(batcher.embed), avg_batch_size=batcher.stats()["avg_batch_size"])
+        finally:
+            batcher.close()
+        return results
+
+    def llm_gateway(self) -> Dict[str, Any]:
+        """Chat completions against the local mock Groq API with and without the gateway."""
+        import httpx
+
+        from llm_gateway import LLMGateway
+        from mock_groq_server import start_mock_server
+
+        body = {"model": "llama3-70b-8192", "messages": [{"role": "user", "content": "Explain neural networks"}],
+                "max_tokens": 64}
+        requests, clients = self.args.requests, 8
+
+        def run(client: httpx.Client, base_url: str) -> Dict[str, Any]:
+            latencies: List[float] = []
+            statuses: List[int] = []
+
+            def call(_: int):
+                start = time.perf_counter()
+                try:
+                    statuses.append(client.post(f"{base_url}/chat/completions", json=body).status_code)
+                except httpx.HTTPError:
+                    statuses.append(0)
+                latencies.append(time.perf_counter() - start)
+
+            with ThreadPoolExecutor(clients) as pool:
+                list(pool.map(call, range(requests)))
+            return dict(summarize(latencies), success_rate=statuses.count(200) / len(statuses))
+
+        results = {}
+        for name in ("direct", "gateway"):
+            # Tail latency, transient 503s and a per-model request limit below the offered load
+            limit = requests * 3 // 4
+            server = start_mock_server(latency=self.args.llm_latency, slow_rate=0.1, slow_latency=1.0,
+                                       error_rate=0.05, requests_per_minute=limit, seed=0)
+            try:
+                if name == "direct":
+                    with httpx.Client() as client:
+                        results[name] = run(client, server.base_url)
+                else:
+                    gateway = LLMGateway("llama3-70b-8192", fallback_model="llama-3.1-8b-instant",
+                                         requests_per_minute=limit, tokens_per_minute=0, slo=2.0,
+                                         hedge_after=max(self.args.llm_latency * 4, 0.1))
+                    try:
+                        results[name] = run(gateway.client(), server.base_url)
+                        stats = gateway.stats()
+                        results[name].update({key: stats[key] for key in ("retries", "hedges", "fallbacks")})
+                    finally:
+                        gateway.close()
+            finally:
+                server.shutdown()
+                server.server_close()
+        return results
+
+    def embedding_backends(self) -> Dict[str, Any]:
+        """Throughput of the CPU embedding backends and how far their vectors drift from fp32 PyTorch."""
+        from fast_embedding import FastEmbedding
+
+        texts = []
+        for name in sorted(os.listdir(self.args.documents)):
+            with open(os.path.join(self.args.documents, name), "r", encoding="utf-8", errors="ignore") as f:
+                texts.extend(p.strip() for p in f.read().split("\n\n") if len(p.strip()) > 20)
+        texts = (texts * (512 // max(len(texts), 1) + 1))[:512]
+        queries = list(PROMPTS)
+        results: Dict[str, Any] = {}
+        reference = None
+        for backend in ["torch"] + [b for b in self.args.embedding_backends if b != "torch"]:
+            try:
+                model = FastEmbedding(backend=backend, threads=self.args.embed_threads, max_batch_size=32)
+            except ImportError as e:
+                logger.warning(f"Skipping {backend} embeddings: {e}")
+                results[backend] = {"error": str(e)}
+                continue
+            try:
+                model.get_text_embedding_batch(texts[:32])
+                start = time.perf_counter()
+                vectors = np.asarray(model.get_text_embedding_batch(texts), dtype=np.float32)
+                build = time.perf_counter() - start
+                query_vectors = np.asarray([model.get_query_embedding(q) for q in queries], dtype=np.float32)
+                entry: Dict[str, Any] = {
+                    "texts_per_s": len(texts) / build,
+                    "query": summarize([_timed_call(model.get_query_embedding, q) for q in queries]),
+                }
+                burst = [f"{q} ({i})" for i in range(8) for q in queries]
+                start = time.perf_counter()
+                with ThreadPoolExecutor(16) as pool:
+                    list(pool.map(model.get_query_embedding, burst))
+                entry["concurrent_queries_per_s"] = len(burst) / (time.perf_counter() - start)
+                entry["avg_batch_size"] = model.stats()["avg_batch_size"]
+                if reference is None:
+                    reference = (vectors, query_vectors)
+                else:
+                    ref_vectors, ref_queries = reference
+                    cosine = np.sum(vectors * ref_vectors, axis=1)
+                    k = min(10, len(texts))
+                    ref_top = np.argsort(-(ref_queries @ ref_vectors.T), axis=1)[:, :k]
+                    top = np.argsort(-(query_vectors @ vectors.T), axis=1)[:, :k]
+                    overlap = [len(set(a) & set(b)) / k for a, b in zip(ref_top, top)]
+                    entry["drift"] = {
+                        "mean_cosine": float(cosine.mean()),
+                        "min_cosine": float(cosine.min()),
+                        "top10_overlap": float(np.mean(overlap)),
+                    }
+                results[backend] = entry
+            finally:
+                model.close()
+        return results
+
+    def chat(self, agent) -> Dict[str, Any]:
+        """End-to-end chat latency (sync, sequential) and achat throughput per concurrency level."""
+        requests = self.args.requests
+        agent.reset_conversation()
+        start = time.perf_counter()
+        # The default session's agent is verbose; keep its step trace out of the report
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            sequential = [_timed_call(agent.chat, PROMPTS[i % len(PROMPTS)]) for i in range(requests)]
+        results = {
+            "chat": dict(summarize(sequential), requests_per_s=requests / (time.perf_counter() - start))
+        }
+        for level in self.args.concurrency:
+            latencies, wall = asyncio.run(self._run_level(agent, level, requests))
+            results[f"achat_c{level}"] = dict(summarize(latencies), requests_per_s=requests / wall)
+        return results
+
+    def long_session(self, agent) -> Dict[str, Any]:
+        """Prompt tokens per turn over one long session: compacted context versus the full history."""
+        session_id = "bench-long-session"
+        turns = max(self.args.requests, 3 * len(PROMPTS))
+
+        async def run():
+            for i in range(turns):
+                await agent.achat(PROMPTS[i % len(PROMPTS)], session_id=session_id)
+
+        asyncio.run(run())
+        memory = agent._compacting_memory(agent._get_session(session_id).agent)
+        usage = [turn["prompt_tokens"] for turn in agent.turn_contexts if turn["session_id"] == session_id]
+        agent.close_session(session_id)
+        if memory is None or not usage:
+            return {}
+        return {
+            "turns": turns,
+            "first_prompt_tokens": usage[0],
+            "last_prompt_tokens": usage[-1],
+            "max_prompt_tokens": max(usage),
+            "full_history_prompt_tokens": memory.reserved_tokens + memory._token_count_for_messages(memory.get_all()),
+        }
+
+    def multi_tool(self) -> Dict[str, Any]:
+        """Latency of a question needing three independent tool calls: ReAct versus parallel function calling."""
+        results = {}
+        for mode in ("react", "parallel"):
+            agent = self.agent(os.path.join(self.workdir, "serving"), agent_mode=mode)
+            latencies = []
+            try:
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    for _ in range(self.args.iterations):
+                        agent.reset_conversation()
+                        latencies.append(_timed_call(agent.chat, MULTI_TOOL_PROMPT))
+            finally:
+                agent.close()
+            results[mode] = summarize(latencies)
+        return results
+
+    def fast_path(self) -> Dict[str, Any]:
+        """Latency of trivial requests through the pre-dispatch router versus the full agent."""
+        results = {}
+        for name, enabled in (("router", True), ("agent", False)):
+            agent = self.agent(os.path.join(self.workdir, "serving"), fast_router=enabled)
+            latencies = []
+            try:
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    for i in range(self.args.iterations):
+                        latencies.append(_timed_call(agent.chat, FAST_PATH_PROMPTS[i % len(FAST_PATH_PROMPTS)]))
+            finally:
+                agent.close()
+            results[name] = summarize(latencies)
+        return results
+
+    @staticmethod
+    async def _run_level(agent, level: int, requests: int):
+        latencies: List[float] = []
+        next_request = iter(range(requests))
+
+        async def worker(worker_id: int):
+            session_id = f"bench-c{level}-w{worker_id}"
+            for i in next_request:
+                start = time.perf_counter()
+                await agent.achat(PROMPTS[i % len(PROMPTS)], session_id=session_id)
+                latencies.append(time.perf_counter() - start)
+            agent.close_session(session_id)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(w) for w in range(level)))
+        return latencies, time.perf_counter() - start
+
+    def run(self) -> Dict[str, Any]:
+        """Run every benchmark section."""
+        results: Dict[str, Any] = {
+            "cold_start": self.cold_start(),
+            "index_build": self.index_build(),
+            "live_reindex": self.live_reindex(),
+            "retrieval": self.retrieval(),
+            "calculator": self.calculator(),
+            "local_memory": self.local_memory(),
+            "micro_batching": self.micro_batching(),
+            "llm_gateway": self.llm_gateway(),
+        }
+        if self.args.embedding_backends:
+            results["embedding_backends"] = self.embedding_backends()
+        agent = self.agent(os.path.join(self.workdir, "serving"))
+        try:
+            results["query_embedding"] = self.query_embedding(agent)
+            results["tools"] = self.tools(agent)
+            results["chat"] = self.chat(agent)
+            results["routing"] = agent.router_stats()
+            results["long_session"] = self.long_session(agent)
+            results["multi_tool"] = self.multi_tool()
+            results["fast_path"] = self.fast_path()
+            agent.memory_writer.flush()
+            memory_metrics = agent.memory_write_metrics()
+            results["memory_writes"] = {
+                "written_turns": memory_metrics["written_turns"],
+                "add_calls": memory_metrics["add_calls"],
+                "write_latency_p95_s": memory_metrics["write_latency_p95"],
+            }
+        finally:
+            agent.close()
+        return results
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    """Flatten nested results into ``section.metric`` keys."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)):
+            flat[name] = float(value)
+    return flat
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_delta: float) -> List[Dict[str, Any]]:
+    """
+    Compare results against a baseline run.
+
+    Args:
+        results: Benchmark results of this run
+        baseline: Benchmark results of the baseline run
+        tolerance: Relative change beyond which a metric counts as a regression
+        min_delta: Absolute change in seconds below which duration changes are ignored
+
+    Returns:
+        One entry per compared metric with its old and new value, change and regression flag
+    """
+    new, old = flatten(results), flatten(baseline)
+    comparison = []
+    for key in sorted(new.keys() & old.keys()):
+        if not old[key]:
+            continue
+        if key.endswith("_per_s"):
+            change = (old[key] - new[key]) / old[key]
+            regressed = change > tolerance
+        elif key.endswith("_s") and not key.endswith(".max_s"):
+            # Maxima are single samples and too noisy to gate on
+            change = (new[key] - old[key]) / old[key]
+            regressed = change > tolerance and new[key] - old[key] > min_delta
+        else:
+            continue
+        comparison.append({"metric": key, "baseline": old[key], "current": new[key],
+                           "change": change, "regression": regressed})
+    return comparison
+
+
+def print_summary(results: Dict[str, Any]):
+    """Print the headline numbers."""
+    print("\n📊 Benchmark results")
+    for name, startup in results["cold_start"].items():
+        print(f"  • {name} start: {startup['total_s'] * 1000:.1f} ms")
+    build = results["index_build"]
+    print(f"  • index build ({build['files']} files): full {build['full_build_s'] * 1000:.1f} ms, "
+          f"incremental {build['incremental_update_s'] * 1000:.1f} ms")
+    for mode, stats in results["retrieval"].items():
+        recall = ", ".join(f"@{k} {stats[f'recall_at_{k}']:.2f}" for k in RECALL_K)
+        print(f"  • {mode} retrieval: p50 {stats['p50_s'] * 1000:.2f} ms, recall {recall}")
+    embedding = results["query_embedding"]
+    print(f"  • query embedding p50: uncached {embedding['uncached']['p50_s'] * 1000:.2f} ms, "
+          f"cached {embedding['cached']['p50_s'] * 1000:.2f} ms")
+    for name, stats in results["tools"].items():
+        print(f"  • tool {name}: p50 {stats['uncached']['p50_s'] * 1000:.2f} ms, "
+              f"p99 {stats['uncached']['p99_s'] * 1000:.2f} ms")
+    live = results["live_reindex"]
+    print(f"  • live re-index: new document queryable after {live['create_to_queryable_s']:.2f}s, deleted one gone after "
+          f"{live['delete_to_gone_s']:.2f}s; queries meanwhile p50 {live['queries_during_updates']['p50_s'] * 1000:.1f} ms, "
+          f"max {live['queries_during_updates']['max_s'] * 1000:.1f} ms")
+    calculator = results["calculator"]
+    print(f"  • calculator per expression: single {calculator['single_per_expr_s'] * 1e6:.1f} µs, "
+          f"batch {calculator['batch_cold_per_expr_s'] * 1e6:.1f} µs (parsed: {calculator['batch_warm_per_expr_s'] * 1e6:.1f} µs)")
+    memory = results["local_memory"]
+    print(f"  • local memory search over {memory['turns']} turns: p50 {memory['search_history']['p50_s'] * 1000:.3f} ms "
+          f"(one session {memory['search_session']['p50_s'] * 1000:.3f} ms), {memory['add_per_turn_s'] * 1000:.2f} ms per stored turn")
+    batching = results["micro_batching"]
+    print(f"  • 16 concurrent query embedders: {batching['per_query']['queries_per_s']:.0f} queries/s one pass each, "
+          f"{batching['micro_batched']['queries_per_s']:.0f} queries/s micro-batched "
+          f"(avg {batching['micro_batched']['avg_batch_size']:.1f} per pass)")
+    gateway = results["llm_gateway"]
+    for name, stats in gateway.items():
+        extra = (f", {stats['retries']} retries, {stats['hedges']} hedged, {stats['fallbacks']} on the fallback model"
+                 if name == "gateway" else "")
+        print(f"  • mock Groq {name}: {stats['success_rate']:.0%} succeeded, p50 {stats['p50_s'] * 1000:.0f} ms, "
+              f"p99 {stats['p99_s'] * 1000:.0f} ms{extra}")
+    for backend, stats in results.get("embedding_backends", {}).items():
+        if "error" in stats:
+            print(f"  • {backend} embeddings: skipped ({stats['error']})")
+            continue
+        drift = stats.get("drift")
+        drift_text = (f", cosine to fp32 mean {drift['mean_cosine']:.4f} / min {drift['min_cosine']:.4f}, "
+                      f"top-10 overlap {drift['top10_overlap']:.0%}") if drift else " (fp32 reference)"
+        print(f"  • {backend} embeddings: {stats['texts_per_s']:.0f} texts/s, query p50 {stats['query']['p50_s'] * 1000:.1f} ms, "
+              f"{stats['concurrent_queries_per_s']:.0f} concurrent queries/s{drift_text}")
+    if results["long_session"]:
+        session = results["long_session"]
+        print(f"  • prompt tokens over {session['turns']} turns: first {session['first_prompt_tokens']}, "
+              f"last {session['last_prompt_tokens']} (full history would be {session['full_history_prompt_tokens']})")
+    for name, stats in results["fast_path"].items():
+        print(f"  • trivial request via {name}: p50 {stats['p50_s'] * 1000:.2f} ms")
+    if results["routing"]:
+        print(f"  • fast path share of chat workload: {results['routing']['fast_path_share']:.0%}")
+    for mode, stats in results["multi_tool"].items():
+        print(f"  • three-tool question ({mode}): p50 {stats['p50_s'] * 1000:.1f} ms")
+    for name, stats in results["chat"].items():
+        print(f"  • {name}: {stats['requests_per_s']:.1f} req/s, p50 {stats['p50_s'] * 1000:.1f} ms, "
+              f"p95 {stats['p95_s'] * 1000:.1f} ms, p99 {stats['p99_s'] * 1000:.1f} ms")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Offline benchmark suite for the AI Agent")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Relative slowdown counted as a regression")
+    parser.add_argument("--min-delta", type=float, default=0.001, help="Ignore duration changes below this many seconds")
+    parser.add_argument("--documents", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "documents"),
+                        help="Knowledge base documents to copy into the benchmark")
+    parser.add_argument("--extra-docs", type=int, default=20, help="Synthetic documents added to the knowledge base")
+    parser.add_argument("--iterations", type=int, default=50, help="Calls per embedding and tool benchmark")
+    parser.add_argument("--requests", type=int, default=64, help="Chat requests per concurrency level")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated achat concurrency levels")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Stand-in LLM seconds per call")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Stand-in LLM seconds per streamed token")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Stand-in embedding seconds per call")
+    parser.add_argument("--memory-latency", type=float, default=0.01, help="Fake Mem0 seconds per add/search")
+    parser.add_argument("--memory-turns", type=int, default=2000, help="Turns per user stored in the local memory benchmark")
+    parser.add_argument("--embed-pass-latency", type=float, default=0.004,
+                        help="Stand-in seconds per embedding forward pass in the micro-batching benchmark")
+    parser.add_argument("--embedding-backends", default="",
+                        help="Comma-separated real embedding backends to measure against fp32 (torch, int8, onnx, onnx-int8)")
+    parser.add_argument("--embed-threads", type=int, default=0, help="Threads per forward pass for --embedding-backends")
+    parser.add_argument("--agent-mode", choices=("react", "parallel"), default="react",
+                        help="Agent loop for the chat benchmarks (parallel uses a function-calling stand-in)")
+    parser.add_argument("--workdir", help="Directory for indexes and catalogs (default: a temporary directory)")
+    args = parser.parse_args(argv)
+    args.concurrency = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    args.embedding_backends = [b.strip() for b in args.embedding_backends.split(",") if b.strip()]
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    # The benchmark measures this code, not the optional answer cache
+    os.environ["SEMANTIC_CACHE"] = "false"
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="agent-benchmark-")
+    try:
+        results = Benchmark(args, workdir).run()
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        },
+        "results": results,
+    }
+    print_summary(results)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["comparison"] = compare(results, baseline["results"], args.tolerance, args.min_delta)
+        regressions = [entry for entry in report["comparison"] if entry["regression"]]
+        print(f"\n🔍 Compared {len(report['comparison'])} metrics against {args.baseline}")
+        for entry in regressions:
+            print(f"  ❌ {entry['metric']}: {entry['baseline']:.4f} → {entry['current']:.4f} ({entry['change']:+.0%})")
+        if regressions:
+            exit_code = 1
+        else:
+            print("  ✅ No regressions")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {args.output}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
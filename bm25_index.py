@@ -0,0 +1,222 @@
+"""
+BM25 keyword index and hybrid (keyword + dense) retrieval for the knowledge base.
+
+Dense retrieval alone ranks exact terms such as language names, mission names
+or movie titles poorly. ``BM25Index`` is a small in-memory inverted index over
+the same chunks as the vector index, persisted as JSON next to it, and
+``HybridRetriever`` merges both rankings with reciprocal-rank fusion.
+"""
+
+import heapq
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from llama_index.core import Settings
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.callbacks import CallbackManager
+from llama_index.core.schema import BaseNode, MetadataMode, NodeWithScore, QueryBundle
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+# Keeps "c++" and "c#" as terms; everything else is split on non-alphanumerics
+_TOKEN_RE = re.compile(r"[a-z0-9]+[+#]*")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have how i in is it its of on or that the this "
+    "to was were what when where which who why will with about does do tell me".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase ``text`` and split it into index terms, dropping stopwords."""
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+
+
+class BM25Index:
+    """An in-memory BM25 inverted index keyed by node id."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Initialize an empty index.
+
+        Args:
+            k1: Term frequency saturation
+            b: Document length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self._doc_terms: Dict[str, Dict[str, int]] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self._doc_lengths
+
+    @property
+    def node_ids(self) -> List[str]:
+        return list(self._doc_lengths)
+
+    def add(self, node_id: str, text: str):
+        """Index (or re-index) one chunk."""
+        self._add_terms(node_id, Counter(tokenize(text)))
+
+    def _add_terms(self, node_id: str, terms: Dict[str, int]):
+        if node_id in self._doc_lengths:
+            self.remove(node_id)
+        self._doc_terms[node_id] = dict(terms)
+        length = sum(terms.values())
+        self._doc_lengths[node_id] = length
+        self._total_length += length
+        for term, tf in terms.items():
+            self._postings[term][node_id] = tf
+
+    def add_nodes(self, nodes: Iterable[BaseNode]):
+        """Index a batch of chunks by their text content."""
+        for node in nodes:
+            self.add(node.node_id, node.get_content(metadata_mode=MetadataMode.NONE))
+
+    def remove(self, node_id: str):
+        """Remove one chunk; unknown ids are ignored."""
+        terms = self._doc_terms.pop(node_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._doc_lengths.pop(node_id)
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(node_id, None)
+            if not postings:
+                del self._postings[term]
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Rank chunks against a query.
+
+        Args:
+            query: Free-text query
+            top_k: Maximum number of results
+
+        Returns:
+            (node id, BM25 score) pairs, best first
+        """
+        n = len(self._doc_lengths)
+        if not n:
+            return []
+        avg_length = self._total_length / n or 1.0
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            for node_id, tf in postings.items():
+                norm = self.k1 * (1.0 - self.b + self.b * self._doc_lengths[node_id] / avg_length)
+                scores[node_id] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def persist(self, path: str):
+        """Write the index to ``path`` as JSON (atomically)."""
+        data = {"version": INDEX_VERSION, "k1": self.k1, "b": self.b, "docs": self._doc_terms}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(data))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """Load an index written by ``persist``."""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError(f"unsupported keyword index version {data.get('version')}")
+        index = cls(k1=data["k1"], b=data["b"])
+        for node_id, terms in data["docs"].items():
+            index._add_terms(node_id, terms)
+        return index
+
+    @classmethod
+    def from_nodes(cls, nodes: Iterable[BaseNode], **kwargs: Any) -> "BM25Index":
+        """Build an index over existing chunks (no embeddings needed)."""
+        index = cls(**kwargs)
+        index.add_nodes(nodes)
+        return index
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Merge several rankings of ids with reciprocal-rank fusion.
+
+    Args:
+        rankings: Id lists, each best first
+        k: Rank offset; larger values flatten the contribution of the top ranks
+
+    Returns:
+        (id, fused score) pairs, best first
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """Fuses a dense vector retriever with a BM25 keyword index using reciprocal-rank fusion."""
+
+    def __init__(
+        self,
+        vector_retriever: BaseRetriever,
+        keyword_index: BM25Index,
+        docstore: Any,
+        top_k: int = 2,
+        candidates: int = 10,
+        rrf_k: int = 60,
+        callback_manager: Optional[CallbackManager] = None,
+    ):
+        """
+        Initialize the retriever.
+
+        Args:
+            vector_retriever: Dense retriever returning ``candidates`` results
+            keyword_index: BM25 index over the same chunks
+            docstore: Document store used to resolve keyword-only hits to nodes
+            top_k: Number of fused results returned
+            candidates: Results taken from each ranking before fusion
+            rrf_k: Reciprocal-rank fusion constant
+            callback_manager: Callback manager (defaults to ``Settings.callback_manager``)
+        """
+        super().__init__(callback_manager=callback_manager or Settings.callback_manager)
+        self._vector_retriever = vector_retriever
+        self._keyword_index = keyword_index
+        self._docstore = docstore
+        self.top_k = top_k
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        dense = self._vector_retriever.retrieve(query_bundle)
+        keyword = self._keyword_index.search(query_bundle.query_str, self.candidates)
+        nodes = {result.node.node_id: result.node for result in dense}
+        fused = reciprocal_rank_fusion(
+            [[result.node.node_id for result in dense], [node_id for node_id, _ in keyword]],
+            k=self.rrf_k,
+        )
+        results = []
+        for node_id, score in fused:
+            node = nodes.get(node_id) or self._docstore.get_node(node_id, raise_error=False)
+            if node is None:
+                continue
+            results.append(NodeWithScore(node=node, score=score))
+            if len(results) >= self.top_k:
+                break
+        return results
@@ -0,0 +1,269 @@
+"""
+Chat memory that keeps each request within a fixed token budget.
+
+``ChatMemoryBuffer`` sends the whole conversation with every request until the
+model's context window is full, so prompt size, latency and cost grow with
+every turn. ``CompactingChatMemory`` keeps the last few turns verbatim and
+folds older turns into a running summary. The summary is updated incrementally,
+one batch of newly aged-out turns at a time, off the request path. The summary,
+the recent turns, the new message and the fixed prompt overhead (system prompt
+and tool descriptions) are kept within a hard token budget.
+"""
+
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.memory import ChatMemoryBuffer
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+SUMMARIZE_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an AI assistant. "
+    "Update the summary with the new messages below. Keep names, numbers, movie titles, "
+    "places, user preferences, decisions and open questions; drop small talk. Reply with "
+    "the updated summary only, at most {max_words} words.\n\n"
+    "Current summary:\n{summary}\n\nNew messages:\n{messages}"
+)
+
+# Summarizer: (current summary, newly aged-out messages, token limit) -> updated summary
+Summarizer = Callable[[str, List[ChatMessage], int], str]
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(str(text or "").split())
+    return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0] + " …"
+
+
+def _render_messages(messages: Sequence[ChatMessage]) -> str:
+    lines = []
+    for message in messages:
+        if message.role == MessageRole.TOOL:
+            name = message.additional_kwargs.get("name", "tool")
+            lines.append(f"{name} result: {_clip(message.content, 300)}")
+        elif message.content:
+            lines.append(f"{message.role.value.capitalize()}: {_clip(message.content, 600)}")
+    return "\n".join(lines)
+
+
+def extractive_summary(summary: str, messages: List[ChatMessage], max_tokens: int) -> str:
+    """Update a summary without an LLM: one line per turn with the question and the start of the answer."""
+    lines = [summary] if summary else []
+    question = None
+    for message in messages:
+        if message.role == MessageRole.USER:
+            question = _clip(message.content, 160)
+        elif message.role == MessageRole.ASSISTANT and message.content and question is not None:
+            lines.append(f"- User asked: {question} → Assistant: {_clip(message.content, 160)}")
+            question = None
+    if question is not None:
+        lines.append(f"- User asked: {question}")
+    return "\n".join(lines)
+
+
+class LLMSummarizer:
+    """Updates the running summary with one LLM call per batch of aged-out turns."""
+
+    def __init__(self, llm: Any, prompt: str = SUMMARIZE_PROMPT):
+        """
+        Initialize the summarizer.
+
+        Args:
+            llm: LLM used for summarization
+            prompt: Template with ``{summary}``, ``{messages}`` and ``{max_words}`` fields
+        """
+        self.llm = llm
+        self.prompt = prompt
+
+    def __call__(self, summary: str, messages: List[ChatMessage], max_tokens: int) -> str:
+        prompt = self.prompt.format(
+            summary=summary or "(none yet)",
+            messages=_render_messages(messages),
+            max_words=max(int(max_tokens * 0.7), 20),
+        )
+        response = self.llm.chat([ChatMessage(role=MessageRole.USER, content=prompt)])
+        return str(response.message.content or "").strip()
+
+
+class CompactingChatMemory(ChatMemoryBuffer):
+    """Chat memory with a verbatim window of recent turns, a running summary and a per-request token budget."""
+
+    keep_turns: int = Field(default=4, description="Most recent turns kept verbatim")
+    summary_token_limit: int = Field(default=400, description="Maximum size of the running summary in tokens")
+    reserved_tokens: int = Field(default=0, description="Fixed prompt overhead (system prompt, tools) counted against token_limit")
+    summarizer: Optional[Summarizer] = Field(default=None, exclude=True, description="Summary updater (None: extractive)")
+    executor: Optional[Any] = Field(default=None, exclude=True, description="Executor for summary updates (None: inline)")
+
+    _summary: str = PrivateAttr(default="")
+    _summarized: int = PrivateAttr(default=0)
+    _folding: bool = PrivateAttr(default=False)
+    _fold_future: Any = PrivateAttr(default=None)
+    _generation: int = PrivateAttr(default=0)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _last_request: Dict[str, Any] = PrivateAttr(default_factory=dict)
+
+    @classmethod
+    def class_name(cls) -> str:
+        """Get class name."""
+        return "CompactingChatMemory"
+
+    @property
+    def summary(self) -> str:
+        """The running summary of the turns older than the verbatim window."""
+        return self._summary
+
+    @property
+    def last_request(self) -> Dict[str, Any]:
+        """Token accounting of the most recent ``get``: prompt, summary and history tokens, turns kept and dropped."""
+        return dict(self._last_request)
+
+    @staticmethod
+    def _turns(messages: List[ChatMessage], offset: int = 0) -> List[List[ChatMessage]]:
+        """Split messages into turns, each starting at a user message."""
+        turns: List[List[ChatMessage]] = []
+        for message in messages[offset:]:
+            if message.role == MessageRole.USER or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        return turns
+
+    def _window_start(self, history: List[ChatMessage]) -> int:
+        """Index of the first message of the verbatim window."""
+        if self.keep_turns <= 0:
+            return len(history)
+        starts = [i for i, message in enumerate(history) if message.role == MessageRole.USER]
+        return starts[-self.keep_turns] if len(starts) >= self.keep_turns else 0
+
+    def _count(self, text: str) -> int:
+        return len(self.tokenizer_fn(text)) if text else 0
+
+    def _cap_summary(self, summary: str) -> str:
+        """Keep the summary within ``summary_token_limit``, dropping its oldest lines first."""
+        summary = summary.strip()
+        lines = summary.splitlines()
+        while len(lines) > 1 and self._count("\n".join(lines)) > self.summary_token_limit:
+            lines.pop(0)
+        summary = "\n".join(lines)
+        tokens = self._count(summary)
+        if tokens > self.summary_token_limit:
+            keep = len(summary) * self.summary_token_limit // tokens
+            summary = "… " + summary[len(summary) - keep:].split(" ", 1)[-1]
+        return summary
+
+    def _fold(self, messages: List[ChatMessage], end: int, generation: int):
+        """Fold aged-out messages into the summary (runs on the executor when one is set)."""
+        with self._lock:
+            summary = self._summary
+        try:
+            if self.summarizer is None:
+                raise RuntimeError("no summarizer configured")
+            updated = self.summarizer(summary, messages, self.summary_token_limit)
+            if not updated:
+                raise ValueError("empty summary")
+        except Exception as e:
+            if self.summarizer is not None:
+                logger.warning(f"Summarizing older turns failed, using an extractive summary: {e}")
+            updated = extractive_summary(summary, messages, self.summary_token_limit)
+        updated = self._cap_summary(updated)
+        with self._lock:
+            # A reset while folding makes this result stale
+            if generation == self._generation:
+                self._summary = updated
+                self._summarized = end
+                self._folding = False
+
+    def _schedule_fold(self, history: List[ChatMessage], start: int, end: int):
+        with self._lock:
+            if self._folding or end <= start:
+                return
+            self._folding = True
+            generation = self._generation
+        messages = list(history[start:end])
+        if self.executor is not None:
+            try:
+                self._fold_future = self.executor.submit(self._fold, messages, end, generation)
+                return
+            except RuntimeError:
+                # Executor shut down: fold inline
+                pass
+        self._fold(messages, end, generation)
+
+    def flush(self, timeout: Optional[float] = None):
+        """Wait for a pending summary update."""
+        future = self._fold_future
+        if future is not None:
+            future.result(timeout=timeout)
+
+    def _clear_summary(self):
+        self._summary, self._summarized, self._folding = "", 0, False
+        self._generation += 1
+
+    def get(self, input: Optional[str] = None, initial_token_count: int = 0, **kwargs: Any) -> List[ChatMessage]:
+        """Get the summary and as many recent turns as fit the token budget."""
+        history = self.get_all()
+        with self._lock:
+            if self._summarized > len(history):
+                # History was replaced with a shorter one
+                self._clear_summary()
+            summarized = self._summarized
+        window_start = self._window_start(history)
+        self._schedule_fold(history, summarized, window_start)
+        with self._lock:
+            summary, summarized = self._summary, self._summarized
+
+        input_tokens = self._count(input or "")
+        fixed = self.reserved_tokens + initial_token_count + input_tokens
+        remaining = self.token_limit - fixed
+        summary_message = None
+        summary_tokens = 0
+        if summary and remaining > 0:
+            summary_message = ChatMessage(role=MessageRole.SYSTEM, content=SUMMARY_PREFIX + summary)
+            summary_tokens = self._count(summary_message.content)
+            if summary_tokens > remaining:
+                summary_message, summary_tokens = None, 0
+            remaining -= summary_tokens
+
+        # Newest turns first; turns not yet folded into the summary come after the verbatim window
+        recent = self._turns(history, window_start)
+        pending = self._turns(history[:window_start], summarized)
+        kept: List[List[ChatMessage]] = []
+        history_tokens = 0
+        for turn in reversed(pending + recent):
+            tokens = self._token_count_for_messages(turn)
+            if tokens > remaining:
+                break
+            kept.append(turn)
+            remaining -= tokens
+            history_tokens += tokens
+        kept.reverse()
+
+        self._last_request = {
+            "prompt_tokens": fixed + summary_tokens + history_tokens,
+            "budget": self.token_limit,
+            "reserved_tokens": self.reserved_tokens,
+            "input_tokens": input_tokens,
+            "summary_tokens": summary_tokens,
+            "history_tokens": history_tokens,
+            "verbatim_turns": len(kept),
+            "dropped_turns": len(pending) + len(recent) - len(kept),
+            "summarized_messages": summarized,
+        }
+        messages = [message for turn in kept for message in turn]
+        return ([summary_message] if summary_message is not None else []) + messages
+
+    def set(self, messages: List[ChatMessage]) -> None:
+        """Set chat history."""
+        super().set(messages)
+        with self._lock:
+            if self._summarized > len(messages):
+                self._clear_summary()
+
+    def reset(self) -> None:
+        """Reset chat history and the running summary."""
+        super().reset()
+        with self._lock:
+            self._clear_summary()
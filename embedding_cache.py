@@ -0,0 +1,269 @@
+"""
+Content-addressed embedding cache shared across agents and worker processes.
+
+Vectors are keyed by the embedding model name plus a SHA-256 of the text and
+stored in a SQLite database in WAL mode, so several processes on the same host
+can read and write the same cache file concurrently. The cache is capped at a
+fixed number of entries and evicts the least recently used ones. Access times
+are only refreshed once they are older than a touch interval, and those
+refreshes are buffered and written in batches so cache hits stay read-only.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCacheStore:
+    """SQLite-backed store of embedding vectors with LRU eviction and a size cap."""
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 200_000,
+        evict_interval: int = 256,
+        touch_interval: float = 60.0,
+        touch_batch: int = 256,
+    ):
+        """
+        Initialize the cache store.
+
+        Args:
+            path: Path of the SQLite database file (created if missing)
+            max_entries: Maximum number of vectors kept in the cache
+            evict_interval: Number of inserts between eviction checks
+            touch_interval: Seconds a hit's last access may lag before it is refreshed
+            touch_batch: Number of buffered access-time refreshes written per flush
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.evict_interval = evict_interval
+        self.touch_interval = touch_interval
+        self.touch_batch = touch_batch
+        self._local = threading.local()
+        self._inserts_since_evict = 0
+        # Access-time refreshes waiting to be written, so hits stay read-only
+        self._touches: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY,"
+                " vector BLOB NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection; SQLite connections must not cross threads."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Fetch the cached vectors for ``keys`` and mark stale ones as recently used."""
+        if not keys:
+            return {}
+        conn = self._connection()
+        now = time.time()
+        found = {}
+        stale = []
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT key, vector, last_access FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            for key, blob, last_access in rows:
+                found[key] = array("f", blob).tolist()
+                # Recently touched entries are nowhere near eviction; skip the write
+                if now - last_access >= self.touch_interval:
+                    stale.append(key)
+        if stale:
+            with self._lock:
+                self._touches.update(dict.fromkeys(stale, now))
+                should_flush = len(self._touches) >= self.touch_batch
+            if should_flush:
+                self.flush_touches()
+        return found
+
+    def flush_touches(self):
+        """Write buffered access times so eviction sees the latest hits."""
+        with self._lock:
+            touches, self._touches = self._touches, {}
+        if not touches:
+            return
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "UPDATE embeddings SET last_access = MAX(last_access, ?) WHERE key = ?",
+                [(when, key) for key, when in touches.items()],
+            )
+
+    def put_many(self, items: Iterable[Tuple[str, List[float]]]):
+        """Store vectors, evicting the least recently used entries when over the cap."""
+        now = time.time()
+        rows = [(key, array("f", vector).tobytes(), now) for key, vector in items]
+        if not rows:
+            return
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)", rows
+            )
+        with self._lock:
+            self._inserts_since_evict += len(rows)
+            should_evict = self._inserts_since_evict >= self.evict_interval
+            if should_evict:
+                self._inserts_since_evict = 0
+        if should_evict:
+            self.evict()
+
+    def evict(self) -> int:
+        """Trim the cache to ``max_entries``, dropping the least recently used vectors."""
+        self.flush_touches()
+        conn = self._connection()
+        with conn:
+            excess = self.count() - self.max_entries
+            if excess <= 0:
+                return 0
+            conn.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                " SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                (excess,),
+            )
+        logger.debug(f"Evicted {excess} entries from embedding cache")
+        return excess
+
+    def count(self) -> int:
+        """Return the number of cached vectors."""
+        return self._connection().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Embedding model wrapper that serves repeated texts from an EmbeddingCacheStore."""
+
+    _inner: BaseEmbedding = PrivateAttr()
+    _store: EmbeddingCacheStore = PrivateAttr()
+    _stats_lock: Any = PrivateAttr()
+    _hits: int = PrivateAttr(default=0)
+    _misses: int = PrivateAttr(default=0)
+
+    def __init__(self, embed_model: BaseEmbedding, store: EmbeddingCacheStore, **kwargs: Any):
+        """
+        Wrap an embedding model with a shared cache.
+
+        Args:
+            embed_model: The embedding model that computes cache misses
+            store: Cache store shared with other agents and processes
+        """
+        super().__init__(
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            **kwargs
+        )
+        self._inner = embed_model
+        self._store = store
+        self._stats_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def inner(self) -> BaseEmbedding:
+        """The wrapped embedding model."""
+        return self._inner
+
+    def _key(self, kind: str, text: str) -> str:
+        # Query and text embeddings may differ for instruction-tuned models
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model_name}:{kind}:{digest}"
+
+    def _record(self, hits: int, misses: int):
+        with self._stats_lock:
+            self._hits += hits
+            self._misses += misses
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for this process and the shared cache size."""
+        with self._stats_lock:
+            hits, misses = self._hits, self._misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+            "entries": self._store.count(),
+            "max_entries": self._store.max_entries,
+        }
+
+    def _lookup(self, kind: str, texts: List[str]) -> Tuple[List[str], List[Optional[List[float]]]]:
+        keys = [self._key(kind, text) for text in texts]
+        cached = self._store.get_many(list(dict.fromkeys(keys)))
+        vectors = [cached.get(key) for key in keys]
+        return keys, vectors
+
+    def _fill(self, keys: List[str], vectors: List[Optional[List[float]]], texts: List[str], computed: List[List[float]]):
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        self._store.put_many(zip((keys[i] for i in missing), computed))
+        for i, vector in zip(missing, computed):
+            vectors[i] = vector
+        self._record(len(texts) - len(missing), len(missing))
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        keys, vectors = self._lookup("query", [query])
+        if vectors[0] is None:
+            self._fill(keys, vectors, [query], [self._inner._get_query_embedding(query)])
+        else:
+            self._record(1, 0)
+        return vectors[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        keys, vectors = self._lookup("query", [query])
+        if vectors[0] is None:
+            self._fill(keys, vectors, [query], [await self._inner._aget_query_embedding(query)])
+        else:
+            self._record(1, 0)
+        return vectors[0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors = self._lookup("text", texts)
+        missing = [texts[i] for i, vector in enumerate(vectors) if vector is None]
+        computed = self._inner._get_text_embeddings(missing) if missing else []
+        self._fill(keys, vectors, texts, computed)
+        return vectors
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors = self._lookup("text", texts)
+        missing = [texts[i] for i, vector in enumerate(vectors) if vector is None]
+        computed = await self._inner._aget_text_embeddings(missing) if missing else []
+        self._fill(keys, vectors, texts, computed)
+        return vectors
@@ -0,0 +1,382 @@
+"""
+CPU-optimized sentence embeddings for knowledge base builds and query time.
+
+``HuggingFaceEmbedding`` runs the full-precision PyTorch model with default
+settings. ``FastEmbedding`` runs the same model (mean pooling, L2-normalized)
+through one of these backends:
+
+- ``torch``: PyTorch fp32 with a fixed thread count
+- ``int8``: PyTorch with int8 dynamic quantization of the linear layers
+- ``onnx``: ONNX Runtime on a one-time ONNX export of the model
+- ``onnx-int8``: ONNX Runtime on a dynamically quantized (int8) export
+
+Batches are sorted by length before padding, so each forward pass pads to
+texts of similar length. Single-text requests (query embeddings from concurrent
+sessions) go through a ``MicroBatcher``, which coalesces the requests that
+arrive while a forward pass is running into the next pass.
+
+Usage:
+    python fast_embedding.py export [onnx|onnx-int8] [cache_dir]
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+BACKENDS = ("huggingface", "torch", "int8", "onnx", "onnx-int8")
+# Quantized vectors differ slightly from fp32 ones and between runtimes, so each
+# quantized backend's vectors are cached and indexed under a model name of their own
+QUANTIZED_SUFFIXES = {"int8": "#torch-int8", "onnx-int8": "#onnx-int8"}
+
+_STOP = object()
+
+
+def mean_pool(hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """Mean-pool token embeddings over the attention mask and L2-normalize (sentence-transformers pooling)."""
+    mask = attention_mask[..., None].astype(np.float32)
+    pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+    return pooled / np.maximum(norms, 1e-12)
+
+
+class _TorchEncoder:
+    """PyTorch forward pass, optionally with int8 dynamic quantization."""
+
+    def __init__(self, model_name: str, quantize: bool, threads: int, max_length: int):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        if threads:
+            torch.set_num_threads(threads)
+        self.torch = torch
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name).eval()
+        if quantize:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="pt")
+        with self.torch.inference_mode():
+            hidden = self.model(**encoded).last_hidden_state
+        return mean_pool(hidden.numpy(), encoded["attention_mask"].numpy())
+
+
+def export_onnx(model_name: str, cache_dir: str, quantize: bool = False) -> str:
+    """
+    Export the model to ONNX once (and quantize it to int8 if asked), reusing earlier exports.
+
+    Returns:
+        Path of the ONNX model file
+    """
+    directory = os.path.join(cache_dir, model_name.replace("/", "--"))
+    path = os.path.join(directory, "model.onnx")
+    if not os.path.exists(path):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        os.makedirs(directory, exist_ok=True)
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name).eval()
+        sample = tokenizer(["an example sentence"], return_tensors="pt")
+        names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        axes = {name: {0: "batch", 1: "sequence"} for name in names}
+        axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+        tmp = path + ".tmp"
+        with torch.inference_mode():
+            torch.onnx.export(
+                model, tuple(sample[name] for name in names), tmp,
+                input_names=names, output_names=["last_hidden_state"],
+                dynamic_axes=axes, opset_version=14,
+            )
+        os.replace(tmp, path)
+        logger.info(f"Exported {model_name} to {path}")
+    if not quantize:
+        return path
+    quantized = os.path.join(directory, "model.int8.onnx")
+    if not os.path.exists(quantized):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        tmp = quantized + ".tmp"
+        quantize_dynamic(path, tmp, weight_type=QuantType.QInt8)
+        os.replace(tmp, quantized)
+        logger.info(f"Quantized {path} to {quantized}")
+    return quantized
+
+
+class _OnnxEncoder:
+    """ONNX Runtime forward pass over an exported (optionally int8) model."""
+
+    def __init__(self, model_name: str, quantize: bool, threads: int, max_length: int, cache_dir: str):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            export_onnx(model_name, cache_dir, quantize), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {node.name for node in self.session.get_inputs()}
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np")
+        feeds = {name: value.astype(np.int64) for name, value in encoded.items() if name in self.input_names}
+        hidden = self.session.run(None, feeds)[0]
+        return mean_pool(hidden, encoded["attention_mask"])
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-text embedding requests into batched forward passes."""
+
+    def __init__(self, encode: Callable[[List[str]], Any], max_batch_size: int = 32, max_wait: float = 0.0):
+        """
+        Initialize the batcher; its worker thread starts with the first request.
+
+        Args:
+            encode: Embeds a list of texts in one forward pass
+            max_batch_size: Maximum number of requests combined into one pass
+            max_wait: Seconds to wait for more requests after the first one; with 0, a pass
+                takes whatever queued up while the previous pass ran, so idle requests pay no delay
+        """
+        self.encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._batches = 0
+        self._closed = False
+        self._worker: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def _ensure_worker(self):
+        """Start the worker on first use, and again in a forked child (threads do not survive fork)."""
+        if self._worker is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker is not None and self._pid == os.getpid():
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._worker.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue a text; the future resolves to its embedding."""
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        """Embed one text, sharing a forward pass with concurrent requests."""
+        return self.submit(text).result()
+
+    def _next_batch(self) -> List[Any]:
+        item = self._queue.get()
+        if item is _STOP:
+            return [item]
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            if item is _STOP:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is _STOP
+            requests = [item for item in batch if item is not _STOP]
+            if requests:
+                try:
+                    vectors = self.encode([text for text, _ in requests])
+                    for (_, future), vector in zip(requests, vectors):
+                        future.set_result([float(x) for x in vector])
+                except Exception as e:
+                    for _, future in requests:
+                        future.set_exception(e)
+                with self._lock:
+                    self._requests += len(requests)
+                    self._batches += 1
+            if stop:
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of requests, forward passes and the average pass size."""
+        with self._lock:
+            requests, batches = self._requests, self._batches
+        return {
+            "requests": requests,
+            "batches": batches,
+            "avg_batch_size": requests / batches if batches else 0.0,
+        }
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Finish queued requests and stop the worker."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._worker is not None and self._pid == os.getpid():
+            self._queue.put(_STOP)
+            self._worker.join(timeout)
+
+
+class FastEmbedding(BaseEmbedding):
+    """Sentence embeddings on a CPU-optimized backend with length-sorted batches and query micro-batching."""
+
+    backend: str = Field(default="int8", description="torch, int8, onnx or onnx-int8")
+    threads: int = Field(default=0, description="Intra-op threads per forward pass (0: library default)")
+    max_length: int = Field(default=256, description="Maximum tokens per text")
+    batch_wait: float = Field(default=0.0, description="Seconds a query waits for others to share its forward pass")
+
+    _encoder: Any = PrivateAttr(default=None)
+    _batcher: Any = PrivateAttr(default=None)
+
+    def __init__(
+        self,
+        backend: str = "int8",
+        model_name: str = MODEL_NAME,
+        threads: int = 0,
+        max_batch_size: int = 32,
+        batch_wait: float = 0.0,
+        max_length: int = 256,
+        cache_dir: Optional[str] = None,
+        **kwargs: Any,
+    ):
+        """
+        Load the model on the chosen backend.
+
+        Args:
+            backend: "torch" (fp32), "int8" (dynamic quantization), "onnx" or "onnx-int8"
+            model_name: Hugging Face model id
+            threads: Intra-op threads per forward pass (0 keeps the library default)
+            max_batch_size: Maximum texts per forward pass, for both ingestion and coalesced queries
+            batch_wait: Seconds a query waits for concurrent queries before its pass starts
+            max_length: Maximum tokens per text
+            cache_dir: Where ONNX exports are kept (defaults to ~/.cache/agent-onnx)
+        """
+        if backend not in BACKENDS or backend == "huggingface":
+            raise ValueError(f"Unknown embedding backend '{backend}'; use torch, int8, onnx or onnx-int8")
+        quantize = backend in ("int8", "onnx-int8")
+        super().__init__(
+            model_name=model_name + QUANTIZED_SUFFIXES.get(backend, ""),
+            embed_batch_size=max_batch_size,
+            backend=backend,
+            threads=threads,
+            max_length=max_length,
+            batch_wait=batch_wait,
+            **kwargs
+        )
+        if backend.startswith("onnx"):
+            cache_dir = cache_dir or os.path.join(os.path.expanduser("~"), ".cache", "agent-onnx")
+            self._encoder = _OnnxEncoder(model_name, quantize, threads, max_length, cache_dir)
+        else:
+            self._encoder = _TorchEncoder(model_name, quantize, threads, max_length)
+        self._batcher = MicroBatcher(self._encode, max_batch_size=max_batch_size, max_wait=batch_wait)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FastEmbedding"
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts in passes of at most ``embed_batch_size``, grouping texts of similar length."""
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), self.embed_batch_size):
+            rows = order[start:start + self.embed_batch_size]
+            batch = self._encoder([texts[i] for i in rows])
+            if not vectors.shape[1]:
+                vectors = np.empty((len(texts), batch.shape[1]), dtype=np.float32)
+            vectors[rows] = batch
+        return vectors
+
+    def stats(self) -> Dict[str, Any]:
+        """Return micro-batching counters for query embeddings."""
+        return dict(self._batcher.stats(), backend=self.backend)
+
+    def close(self):
+        """Stop the micro-batching worker."""
+        self._batcher.close()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._batcher.embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await asyncio.wrap_future(self._batcher.submit(query))
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._batcher.embed(text)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self._batcher.submit(text))
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts).tolist() if texts else []
+
+
+def create_embed_model(backend: Optional[str] = None) -> BaseEmbedding:
+    """
+    Build the embedding model selected by ``backend`` (defaults to the EMBED_BACKEND environment variable).
+
+    "huggingface" is the plain ``HuggingFaceEmbedding``; the other backends are
+    ``FastEmbedding`` configured from EMBED_THREADS, EMBED_BATCH_SIZE and EMBED_BATCH_WAIT_MS.
+    """
+    backend = (backend or os.getenv("EMBED_BACKEND", "huggingface")).lower()
+    if backend not in BACKENDS:
+        logger.warning(f"Unknown EMBED_BACKEND '{backend}', using 'huggingface'")
+        backend = "huggingface"
+    if backend == "huggingface":
+        from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+        return HuggingFaceEmbedding(model_name=MODEL_NAME)
+    return FastEmbedding(
+        backend=backend,
+        threads=int(os.getenv("EMBED_THREADS", "0")),
+        max_batch_size=int(os.getenv("EMBED_BATCH_SIZE", "32")),
+        batch_wait=float(os.getenv("EMBED_BATCH_WAIT_MS", "0")) / 1000.0,
+        cache_dir=os.getenv("EMBED_ONNX_DIR") or None,
+    )
+
+
+def main(argv: List[str]) -> int:
+    """Command-line entry point: export (and quantize) the ONNX model ahead of time."""
+    if not argv or argv[0] != "export":
+        print("Usage: python fast_embedding.py export [onnx|onnx-int8] [cache_dir]")
+        return 2
+    logging.basicConfig(level=logging.INFO)
+    backend = argv[1] if len(argv) > 1 else "onnx-int8"
+    cache_dir = argv[2] if len(argv) > 2 else os.path.join(os.path.expanduser("~"), ".cache", "agent-onnx")
+    print(export_onnx(MODEL_NAME, cache_dir, quantize=backend == "onnx-int8"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,329 @@
+"""
+Pre-dispatch router that answers trivial requests without the LLM.
+
+Pure arithmetic, a weather lookup or an exact movie title do not need a ReAct
+loop. ``FastRouter`` recognizes them with high-confidence rules (and,
+optionally, an embedding-similarity intent classifier over a few example
+phrasings), calls the tool directly and fills in a templated answer. Anything
+it is unsure about goes to the agent as before.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Tool answering each fast-path intent
+INTENT_TOOLS = {
+    "calculation": "calculator",
+    "weather": "weather",
+    "movie": "movie_info",
+}
+
+# Example phrasings for the embedding classifier; "agent" examples are requests
+# that need the full agent and keep near-misses off the fast path
+INTENT_EXAMPLES = {
+    "calculation": [
+        "calculate 12 * 7",
+        "what is 15 + 27",
+        "how much is 100 / 4",
+        "compute (3 + 5) * 2",
+        "can you work out 250 - 75 for me",
+    ],
+    "weather": [
+        "what's the weather in Paris",
+        "how is the weather in Tokyo today",
+        "weather for Berlin",
+        "what is it like outside in London right now",
+        "tell me the current weather in New York",
+    ],
+    "movie": [
+        "tell me about The Godfather",
+        "what is the movie Inception about",
+        "give me details on the film Titanic",
+        "who is in the cast of Pulp Fiction",
+        "what is the plot of The Matrix",
+    ],
+    "agent": [
+        "recommend movies like Inception",
+        "show me films by Christopher Nolan",
+        "Nolan films after 2005 rated above 8.5",
+        "what is machine learning",
+        "explain neural networks",
+        "what did we talk about earlier",
+        "search my memory for movies",
+        "hello, can you introduce yourself",
+        "what's 25% of 80",
+        "will it rain in London tomorrow",
+    ],
+}
+
+_ARITHMETIC = re.compile(r"[\d\s+\-*/().%]+")
+_ARITHMETIC_SPAN = re.compile(r"[-(]?\d[\d\s+\-*/().%]*")
+_OPERATOR = re.compile(r"[\d)]\s*[+\-*/%]+\s*[-\d(]")
+# Dates such as 2024-01-15 or 15/01/2024 look like subtraction or division
+_DATE = re.compile(r"(?<![\d.])(?:\d{4}([-/])\d{1,2}\1\d{1,2}|\d{1,2}([-/])\d{1,2}\2\d{2,4})(?![\d.])")
+_CALC_PREFIX = re.compile(
+    r"^(?:please\s+)?(?:calculate|compute|evaluate|what(?:'s|\s+is)|how\s+much\s+is)\s+", re.IGNORECASE
+)
+# Time words that end a location: "weather in London tomorrow" is about London
+_TEMPORAL = (r"(?:today|tonight|tomorrow|now|right\s+now|later|this\s+(?:morning|afternoon|evening|week|weekend)"
+             r"|next\s+week|(?:on\s+)?(?:the\s+)?weekend)")
+_WEATHER = re.compile(
+    r"^(?:(?:what(?:'s|\s+is)|how(?:'s|\s+is))\s+the\s+)?weather\s+(?:like\s+)?(?:in|for|at)\s+"
+    rf"(?P<location>[a-z][a-z .,'-]*?)(?:,?\s+{_TEMPORAL}(?:\s+(?:morning|afternoon|evening|night))?)?\s*[?.!]*$",
+    re.IGNORECASE,
+)
+_WEATHER_LOCATION = re.compile(
+    rf"\b(?:in|for|at)\s+(?P<location>(?!(?i:{_TEMPORAL})\b)[A-Z][\w'-]*(?:\s+(?!(?i:{_TEMPORAL})\b)[A-Z][\w'-]*)*)"
+)
+# (pattern, confidence): "tell me about X" is unambiguous, "what is X" also
+# matches knowledge base questions and is left to the agent by default
+_MOVIE_RULES = [
+    (re.compile(r"^(?:tell\s+me\s+about|show\s+me|info(?:rmation)?\s+(?:on|about))\s+"
+                r"(?:the\s+(?:movie|film)\s+)?(?P<title>.+?)\s*[?.!]*$", re.IGNORECASE), 0.95),
+    (re.compile(r"^what(?:'s|\s+is)\s+the\s+(?:movie|film)\s+(?P<title>.+?)(?:\s+about)?\s*[?.!]*$",
+                re.IGNORECASE), 0.95),
+    (re.compile(r"^what(?:'s|\s+is)\s+(?P<title>.+?)(?:\s+about)?\s*[?.!]*$", re.IGNORECASE), 0.85),
+]
+_MOVIE_TITLE_HINT = re.compile(r"[\"“'](?P<quoted>[^\"”']+)[\"”']|\b(?:about|of|on|watch)\s+(?P<rest>.+?)\s*[?.!]*$",
+                               re.IGNORECASE)
+
+
+class Route:
+    """A routing decision: the tool call answering a message and how sure the router is."""
+
+    __slots__ = ("intent", "tool", "arguments", "confidence", "source", "output", "answer")
+
+    def __init__(self, intent: str, arguments: Dict[str, Any], confidence: float, source: str):
+        self.intent = intent
+        self.tool = INTENT_TOOLS[intent]
+        self.arguments = arguments
+        self.confidence = confidence
+        self.source = source
+        self.output: Optional[str] = None
+        self.answer: Optional[str] = None
+
+    def __repr__(self) -> str:
+        return (f"Route(intent={self.intent!r}, arguments={self.arguments!r}, "
+                f"confidence={self.confidence:.2f}, source={self.source!r})")
+
+
+def _is_arithmetic(text: str) -> bool:
+    return (bool(text) and bool(_ARITHMETIC.fullmatch(text)) and bool(_OPERATOR.search(text))
+            and not _DATE.search(text))
+
+
+class FastRouter:
+    """Routes trivial messages straight to a tool; everything else falls back to the agent."""
+
+    def __init__(self, tools: Dict[str, Callable[..., str]],
+                 movie_lookup: Optional[Callable[[str], Optional[str]]] = None,
+                 embed_model: Optional[Callable[[], Any]] = None,
+                 rule_threshold: float = 0.9, embedding_threshold: float = 0.8,
+                 embedding_margin: float = 0.05):
+        """
+        Initialize the router.
+
+        Args:
+            tools: Tool functions by tool name (``calculator``, ``weather``, ``movie_info``);
+                intents whose tool is missing are never routed
+            movie_lookup: Returns the catalog title for an exact (or normalized) title, else None
+            embed_model: Returns the embedding model, enabling the embedding classifier
+                (called on first use, so lazy startup is not affected)
+            rule_threshold: Minimum confidence of a rule match
+            embedding_threshold: Minimum cosine similarity to an intent's examples
+            embedding_margin: Minimum lead of the best intent over any other intent
+        """
+        self.tools = {intent: tools[tool] for intent, tool in INTENT_TOOLS.items() if tool in tools}
+        self.movie_lookup = movie_lookup
+        self.embed_model = embed_model
+        self.rule_threshold = rule_threshold
+        self.embedding_threshold = embedding_threshold
+        self.embedding_margin = embedding_margin
+        self._examples: Optional[Tuple[np.ndarray, List[str]]] = None
+        self._examples_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.fast_path = 0
+        self.llm_path = 0
+        self.below_threshold = 0
+        self.tool_failures = 0
+        self.intents: Counter = Counter()
+        self.sources: Counter = Counter()
+        self._route_seconds = 0.0
+
+    # Rules
+
+    def _match_rules(self, message: str) -> Optional[Route]:
+        """Match the high-confidence rules; returns the best route even if below the threshold."""
+        text = message.strip()
+        if "calculation" in self.tools:
+            expression = _CALC_PREFIX.sub("", text).rstrip(" ?=.!")
+            if _is_arithmetic(expression):
+                return Route("calculation", {"expression": expression.strip()}, 1.0, "rule")
+        if "weather" in self.tools:
+            match = _WEATHER.match(text)
+            if match:
+                location = match.group("location").strip(" ,")
+                return Route("weather", {"location": location}, 0.95, "rule")
+        if "movie" in self.tools and self.movie_lookup is not None:
+            for pattern, confidence in _MOVIE_RULES:
+                match = pattern.match(text)
+                if not match:
+                    continue
+                title = self.movie_lookup(match.group("title").strip(" \"'“”"))
+                if title:
+                    return Route("movie", {"movie_title": title}, confidence, "rule")
+        return None
+
+    # Embedding classifier
+
+    @staticmethod
+    def _normalize(vectors: Any) -> np.ndarray:
+        array = np.asarray(vectors, dtype=np.float32)
+        return array / np.maximum(np.linalg.norm(array, axis=-1, keepdims=True), 1e-12)
+
+    def _example_vectors(self, model: Any) -> Tuple[np.ndarray, List[str]]:
+        """Embed the intent examples once."""
+        if self._examples is None:
+            with self._examples_lock:
+                if self._examples is None:
+                    texts, labels = [], []
+                    for intent, examples in INTENT_EXAMPLES.items():
+                        if intent == "agent" or intent in self.tools:
+                            texts.extend(examples)
+                            labels.extend([intent] * len(examples))
+                    vectors = self._normalize(model.get_text_embedding_batch(texts))
+                    self._examples = (vectors, labels)
+        return self._examples
+
+    def _extract_arguments(self, intent: str, message: str) -> Optional[Dict[str, Any]]:
+        """Pull the tool arguments for a classified intent out of free text."""
+        if intent == "calculation":
+            spans = [span.strip().rstrip("=") for span in _ARITHMETIC_SPAN.findall(message)]
+            spans = [span.strip() for span in spans if _is_arithmetic(span.strip())]
+            return {"expression": max(spans, key=len)} if spans else None
+        if intent == "weather":
+            match = _WEATHER_LOCATION.search(message)
+            return {"location": match.group("location")} if match else None
+        if intent == "movie" and self.movie_lookup is not None:
+            for match in _MOVIE_TITLE_HINT.finditer(message):
+                title = self.movie_lookup((match.group("quoted") or match.group("rest") or "").strip())
+                if title:
+                    return {"movie_title": title}
+        return None
+
+    def _classify(self, message: str) -> Optional[Route]:
+        """Classify the message by similarity to the intent examples."""
+        model = self.embed_model()
+        if model is None:
+            return None
+        vectors, labels = self._example_vectors(model)
+        query = self._normalize(model.get_query_embedding(message))
+        scores = vectors @ query
+        best: Dict[str, float] = {}
+        for label, score in zip(labels, scores.tolist()):
+            best[label] = max(score, best.get(label, -1.0))
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+        intent, score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else -1.0
+        if intent == "agent" or score < self.embedding_threshold or score - runner_up < self.embedding_margin:
+            return None
+        arguments = self._extract_arguments(intent, message)
+        if arguments is None:
+            return None
+        return Route(intent, arguments, score, "embedding")
+
+    # Dispatch
+
+    def route(self, message: str) -> Optional[Route]:
+        """
+        Decide whether a message can skip the agent.
+
+        Args:
+            message: User's message
+
+        Returns:
+            The route to take, or None when the agent should answer
+        """
+        route = self._match_rules(message)
+        if route is not None and route.confidence < self.rule_threshold:
+            with self._lock:
+                self.below_threshold += 1
+            route = None
+        if route is None and self.embed_model is not None:
+            try:
+                route = self._classify(message)
+            except Exception as e:
+                logger.warning(f"Embedding intent classification failed: {e}")
+        return route
+
+    def dispatch(self, message: str) -> Optional[Route]:
+        """
+        Answer a message on the fast path if the router is confident about it.
+
+        Args:
+            message: User's message
+
+        Returns:
+            The route with the tool ``output`` and templated ``answer`` filled in,
+            or None when the message should go to the agent
+        """
+        start = time.perf_counter()
+        route = self.route(message)
+        if route is not None:
+            try:
+                route.output = str(self.tools[route.intent](**route.arguments))
+                route.answer = self._render(route)
+            except Exception as e:
+                logger.warning(f"Fast path {route.tool} failed, falling back to the agent: {e}")
+            if route.answer is None:
+                with self._lock:
+                    self.tool_failures += 1
+                route = None
+        with self._lock:
+            self._route_seconds += time.perf_counter() - start
+            if route is None:
+                self.llm_path += 1
+            else:
+                self.fast_path += 1
+                self.intents[route.intent] += 1
+                self.sources[route.source] += 1
+        return route
+
+    @staticmethod
+    def _render(route: Route) -> Optional[str]:
+        """Fill in the answer template; None if the tool output is not a usable answer."""
+        output = route.output.strip()
+        if not output or output.startswith(("❌", "Error")):
+            return None
+        if route.intent == "calculation":
+            if not output.startswith("Result:"):
+                return None
+            return f"🧮 {route.arguments['expression']} = {output[len('Result:'):].strip()}"
+        if route.intent == "weather":
+            return f"🌤️ {output}"
+        if route.intent == "movie" and "not found" in output:
+            return None
+        return output
+
+    def stats(self) -> Dict[str, Any]:
+        """Return fast-path versus LLM-path counters and routing overhead."""
+        with self._lock:
+            total = self.fast_path + self.llm_path
+            return {
+                "fast_path": self.fast_path,
+                "llm_path": self.llm_path,
+                "fast_path_share": self.fast_path / total if total else 0.0,
+                "below_threshold": self.below_threshold,
+                "tool_failures": self.tool_failures,
+                "intents": dict(self.intents),
+                "sources": dict(self.sources),
+                "avg_route_us": self._route_seconds / total * 1e6 if total else 0.0,
+            }
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Streaming, batched ingestion of documents into the knowledge base index.
+
+Files are streamed from a generator and read and chunked in a process pool
+with a bounded number of files in flight. Chunks are embedded in fixed-size
+batches, and each batch is inserted into the index before more chunks are
+taken, so peak memory depends on the in-flight window rather than on the
+size of the corpus. Progress and throughput are logged as it runs.
+
+Usage:
+    python ingest.py [documents_path] [index_dir] [--workers N] [--batch-size N] [--embed-backend B] [--full]
+"""
+
+import argparse
+import functools
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sized, Tuple
+
+from llama_index.core import SimpleDirectoryReader
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import BaseNode, Document, MetadataMode
+
+logger = logging.getLogger(__name__)
+
+# Below this many files the process pool costs more than it saves
+MIN_FILES_FOR_POOL = 16
+
+
+def load_file_documents(documents_path: str, name: str) -> List[Document]:
+    """Load one source file into documents with stable, manifest-tracked ids."""
+    path = os.path.join(documents_path, name)
+    documents = SimpleDirectoryReader(input_files=[path]).load_data()
+    for i, document in enumerate(documents):
+        document.id_ = f"{name}:{i}"
+    return documents
+
+
+@functools.lru_cache(maxsize=None)
+def _splitter(chunk_size: int, chunk_overlap: int) -> SentenceSplitter:
+    return SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def read_and_chunk(documents_path: str, name: str, chunk_size: int, chunk_overlap: int) -> Tuple[str, List[str], List[BaseNode], int]:
+    """
+    Read one file and split it into chunks (runs in the worker processes).
+
+    Returns:
+        Tuple of (file name, document ids, chunk nodes, file size in bytes)
+    """
+    documents = load_file_documents(documents_path, name)
+    nodes = _splitter(chunk_size, chunk_overlap).get_nodes_from_documents(documents)
+    size = os.path.getsize(os.path.join(documents_path, name))
+    return name, [document.id_ for document in documents], nodes, size
+
+
+class _InlineExecutor(Executor):
+    """Runs submitted work immediately in the calling process."""
+
+    def submit(self, fn: Callable, *args: Any, **kwargs: Any) -> Future:
+        future: Future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+def _process_pool(workers: int) -> ProcessPoolExecutor:
+    """A process pool that is safe to start from a process with background threads."""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        # Forking a multi-threaded process (the agent runs background workers) can
+        # deadlock the children; the fork server forks from a clean, preloaded process
+        context = multiprocessing.get_context("forkserver")
+        if __name__ != "__main__":
+            context.set_forkserver_preload([__name__])
+        return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+class StreamingIngestor:
+    """Reads, chunks, embeds and inserts documents into a VectorStoreIndex in bounded batches."""
+
+    def __init__(
+        self,
+        index: Any,
+        embed_model: Any,
+        documents_path: str,
+        chunk_size: int = 1024,
+        chunk_overlap: int = 200,
+        workers: Optional[int] = None,
+        batch_size: int = 256,
+        max_in_flight: Optional[int] = None,
+        progress_interval: float = 5.0,
+        keyword_index: Any = None,
+    ):
+        """
+        Initialize the ingestor.
+
+        Args:
+            index: VectorStoreIndex the chunks are inserted into
+            embed_model: Embedding model for the chunks
+            documents_path: Directory containing the documents
+            chunk_size: Chunk size for the sentence splitter
+            chunk_overlap: Chunk overlap for the sentence splitter
+            workers: Chunking processes (None picks one per spare CPU for large inputs, 0 chunks in-process)
+            batch_size: Chunks embedded and inserted per batch
+            max_in_flight: Files being read and chunked at once (defaults to twice the workers)
+            progress_interval: Seconds between progress log lines
+            keyword_index: Optional BM25 index updated with every inserted batch
+        """
+        self.index = index
+        self.embed_model = embed_model
+        self.documents_path = documents_path
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.progress_interval = progress_interval
+        self.keyword_index = keyword_index
+        self.stats: Dict[str, Any] = {}
+
+    def _resolve_workers(self, total: Optional[int]) -> int:
+        if self.workers is not None:
+            return self.workers
+        if total is not None and total < MIN_FILES_FOR_POOL:
+            return 0
+        # Leave one core for the embedding model in the main process
+        return min(8, (os.cpu_count() or 1) - 1)
+
+    def ingest(self, files: Iterable[Tuple[str, str]], total: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Ingest files into the index.
+
+        Args:
+            files: (file name, sha256) pairs, e.g. a generator over the documents directory
+            total: Number of files, for progress reporting (taken from ``files`` if it has a length)
+
+        Returns:
+            Manifest entries (``sha256`` and ``doc_ids``) for every file that was fully inserted;
+            files that failed to load are logged and left out
+        """
+        total = total if total is not None else (len(files) if isinstance(files, Sized) else None)
+        workers = self._resolve_workers(total)
+        max_in_flight = self.max_in_flight or max(2, 2 * workers)
+        self.stats = {
+            "files": 0, "failed_files": 0, "documents": 0, "chunks": 0, "batches": 0,
+            "bytes": 0, "workers": workers, "embed_seconds": 0.0, "insert_seconds": 0.0,
+        }
+        self._start = self._last_report = time.perf_counter()
+        self._total = total
+
+        completed: Dict[str, Dict[str, Any]] = {}
+        # Chunks waiting to be embedded, and per-file chunk counts still to be inserted
+        pending_nodes: List[Tuple[str, BaseNode]] = []
+        remaining: Dict[str, int] = {}
+        entries: Dict[str, Dict[str, Any]] = {}
+
+        def file_done(name: str):
+            completed[name] = entries.pop(name)
+            remaining.pop(name, None)
+            self.stats["files"] += 1
+
+        def flush(force: bool):
+            while len(pending_nodes) >= self.batch_size or (force and pending_nodes):
+                batch = pending_nodes[:self.batch_size]
+                del pending_nodes[:self.batch_size]
+                self._insert_batch([node for _, node in batch])
+                for name, _ in batch:
+                    remaining[name] -= 1
+                    if not remaining[name]:
+                        file_done(name)
+                self._report()
+
+        executor = _process_pool(workers) if workers > 0 else _InlineExecutor()
+        in_flight: "deque[Tuple[str, str, Future]]" = deque()
+        file_iter = iter(files)
+        try:
+            exhausted = False
+            while in_flight or not exhausted:
+                # Keep the window full; read ahead only up to max_in_flight files
+                while not exhausted and len(in_flight) < max_in_flight:
+                    try:
+                        name, sha = next(file_iter)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    future = executor.submit(
+                        read_and_chunk, self.documents_path, name, self.chunk_size, self.chunk_overlap
+                    )
+                    in_flight.append((name, sha, future))
+                if not in_flight:
+                    break
+
+                name, sha, future = in_flight.popleft()
+                try:
+                    _, doc_ids, nodes, size = future.result()
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Skipping {name}: {e}")
+                    self.stats["failed_files"] += 1
+                    continue
+                self.stats["documents"] += len(doc_ids)
+                self.stats["bytes"] += size
+                entries[name] = {"sha256": sha, "doc_ids": doc_ids}
+                if not nodes:
+                    file_done(name)
+                    continue
+                remaining[name] = len(nodes)
+                pending_nodes.extend((name, node) for node in nodes)
+                flush(force=False)
+            flush(force=True)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        self._finish_stats()
+        logger.info(
+            f"Ingested {self.stats['files']} files ({self.stats['chunks']} chunks) in "
+            f"{self.stats['seconds']:.1f}s: {self.stats['files_per_s']:.1f} files/s, "
+            f"{self.stats['chunks_per_s']:.1f} chunks/s, {self.stats['mb_per_s']:.2f} MB/s"
+        )
+        return completed
+
+    def _insert_batch(self, nodes: List[BaseNode]):
+        """Embed a batch of chunks and insert it into the index."""
+        start = time.perf_counter()
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        embeddings = self.embed_model.get_text_embedding_batch(texts)
+        for node, embedding in zip(nodes, embeddings):
+            node.embedding = embedding
+        embedded = time.perf_counter()
+        # Nodes that already carry embeddings are stored as-is
+        self.index.insert_nodes(nodes)
+        if self.keyword_index is not None:
+            self.keyword_index.add_nodes(nodes)
+        self.stats["embed_seconds"] += embedded - start
+        self.stats["insert_seconds"] += time.perf_counter() - embedded
+        self.stats["chunks"] += len(nodes)
+        self.stats["batches"] += 1
+
+    def _finish_stats(self):
+        seconds = max(time.perf_counter() - self._start, 1e-9)
+        self.stats.update(
+            seconds=seconds,
+            files_per_s=self.stats["files"] / seconds,
+            chunks_per_s=self.stats["chunks"] / seconds,
+            mb_per_s=self.stats["bytes"] / seconds / 1e6,
+        )
+
+    def _report(self):
+        now = time.perf_counter()
+        if now - self._last_report < self.progress_interval:
+            return
+        self._last_report = now
+        elapsed = now - self._start
+        done = self.stats["files"]
+        progress = f"{done}/{self._total} files" if self._total else f"{done} files"
+        logger.info(
+            f"Ingest progress: {progress}, {self.stats['chunks']} chunks, "
+            f"{self.stats['chunks'] / elapsed:.1f} chunks/s, {self.stats['bytes'] / elapsed / 1e6:.2f} MB/s"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command-line entry point: build or update the persisted knowledge base index."""
+    from knowledge_index import PersistentKnowledgeIndex
+
+    parser = argparse.ArgumentParser(description="Ingest documents into the knowledge base index")
+    parser.add_argument("documents_path", nargs="?", default=os.getenv("DOCUMENTS_PATH", "./documents"))
+    parser.add_argument("index_dir", nargs="?", default=os.getenv("INDEX_DIR", "./storage"))
+    parser.add_argument("--workers", type=int, default=None, help="Chunking processes (0 = in-process)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks embedded and inserted per batch")
+    parser.add_argument("--embed-batch-size", type=int, default=None, help="Texts per embedding model forward pass")
+    parser.add_argument("--chunk-size", type=int, default=int(os.getenv("KB_CHUNK_SIZE", "1024")),
+                        help="Chunk size in tokens (must match the agent's KB_CHUNK_SIZE)")
+    parser.add_argument("--chunk-overlap", type=int, default=int(os.getenv("KB_CHUNK_OVERLAP", "200")),
+                        help="Chunk overlap in tokens (must match the agent's KB_CHUNK_OVERLAP)")
+    parser.add_argument("--embed-backend", default=None,
+                        help="huggingface, torch, int8, onnx or onnx-int8 (must match the agent's EMBED_BACKEND)")
+    parser.add_argument("--full", action="store_true", help="Rebuild from scratch instead of updating")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    from embedding_cache import CachedEmbedding, EmbeddingCacheStore
+    from fast_embedding import create_embed_model
+
+    embed_model = create_embed_model(args.embed_backend)
+    if args.embed_batch_size:
+        embed_model.embed_batch_size = args.embed_batch_size
+    cache_path = os.getenv("EMBED_CACHE_PATH", os.path.join(args.index_dir, "embedding_cache.sqlite"))
+    if cache_path:
+        embed_model = CachedEmbedding(
+            embed_model,
+            EmbeddingCacheStore(cache_path, max_entries=int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "200000")))
+        )
+
+    knowledge_index = PersistentKnowledgeIndex(
+        args.documents_path,
+        args.index_dir,
+        embed_model=embed_model,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        workers=args.workers,
+        batch_size=args.batch_size,
+    )
+    if args.full:
+        knowledge_index.build()
+    else:
+        knowledge_index.load_or_build()
+    print(knowledge_index.last_ingest_stats)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
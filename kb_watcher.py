@@ -0,0 +1,182 @@
+"""
+Watch the knowledge base documents directory for changes.
+
+A background thread polls the directory's file listing (name, size and
+modification time, so unchanged files are never read) and reports created,
+modified and deleted files once they have been quiet for ``debounce`` seconds,
+so a file that is still being written is indexed once, when complete. Polling
+needs no extra dependency and behaves the same on every platform and on
+network or container-mounted directories where change notifications are
+unreliable.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (size, modification time in ns) of a file
+_Stat = Tuple[int, int]
+
+
+class DocumentChanges:
+    """Files created, modified and deleted since the last reported change."""
+
+    __slots__ = ("created", "modified", "deleted", "changed_at")
+
+    def __init__(self, created: List[str], modified: List[str], deleted: List[str], changed_at: float):
+        self.created = created
+        self.modified = modified
+        self.deleted = deleted
+        # Wall-clock time of the earliest change (file mtime, or when a deletion was noticed)
+        self.changed_at = changed_at
+
+    @property
+    def names(self) -> List[str]:
+        """Every affected file name."""
+        return self.created + self.modified + self.deleted
+
+    def __repr__(self) -> str:
+        return f"DocumentChanges(created={self.created}, modified={self.modified}, deleted={self.deleted})"
+
+
+class DocumentWatcher:
+    """Polls a directory and calls back with the files that changed, once they settle."""
+
+    def __init__(
+        self,
+        path: str,
+        on_change: Callable[[DocumentChanges], None],
+        interval: float = 1.0,
+        debounce: float = 0.5,
+        max_backoff: float = 300.0,
+    ):
+        """
+        Initialize the watcher; call ``start`` to begin polling.
+
+        Args:
+            path: Directory to watch (non-hidden files directly inside it)
+            on_change: Called from the watcher thread with each batch of changes
+            interval: Seconds between polls
+            debounce: Seconds a directory must be unchanged before its changes are reported
+            max_backoff: Longest wait, in seconds, before retrying changes whose callback failed
+        """
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self.debounce = debounce
+        self.max_backoff = max_backoff
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._known = self.snapshot()
+        # Listing seen last poll and since when it has been unchanged
+        self._pending: Optional[Dict[str, _Stat]] = None
+        self._pending_since = 0.0
+        self._deleted_seen: Optional[float] = None
+        # Listing whose callback last failed, how often in a row, and when to try it again
+        self._failed: Optional[Dict[str, _Stat]] = None
+        self._failures = 0
+        self._retry_at = 0.0
+
+    def snapshot(self) -> Dict[str, _Stat]:
+        """Size and modification time of every non-hidden file in the directory."""
+        files = {}
+        try:
+            with os.scandir(self.path) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    try:
+                        if entry.is_file():
+                            stat = entry.stat()
+                            files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+                    except OSError:
+                        # Removed while listing
+                        continue
+        except FileNotFoundError:
+            pass
+        return files
+
+    def start(self):
+        """Start polling in a background thread."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="kb-watcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Watching {self.path} for document changes every {self.interval:.1f}s")
+
+    def stop(self, timeout: float = 5.0):
+        """Stop polling; a change being applied is allowed to finish."""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def _diff(self, current: Dict[str, _Stat]) -> DocumentChanges:
+        created = sorted(name for name in current if name not in self._known)
+        modified = sorted(name for name in current if name in self._known and current[name] != self._known[name])
+        deleted = sorted(name for name in self._known if name not in current)
+        mtimes = [current[name][1] / 1e9 for name in created + modified]
+        changed_at = min(mtimes) if mtimes else time.time()
+        if deleted:
+            changed_at = min(changed_at, self._deleted_seen or time.time())
+        return DocumentChanges(created, modified, deleted, changed_at)
+
+    def poll(self) -> Optional[Tuple[DocumentChanges, Dict[str, _Stat]]]:
+        """
+        Check the directory once.
+
+        Returns:
+            Tuple of (changes, new listing) once the directory changed and has since settled,
+            otherwise None; pass the listing to ``commit`` after applying the changes
+        """
+        current = self.snapshot()
+        if current == self._known:
+            self._pending, self._deleted_seen = None, None
+            return None
+        now = time.monotonic()
+        if current != self._pending:
+            # Still changing (or just noticed): wait until it stays the same for ``debounce``
+            if self._deleted_seen is None and any(name not in current for name in self._known):
+                self._deleted_seen = time.time()
+            self._pending, self._pending_since = current, now
+            if self.debounce > 0:
+                return None
+        elif now - self._pending_since < self.debounce:
+            return None
+        return self._diff(current), current
+
+    def commit(self, listing: Dict[str, _Stat]):
+        """Mark a listing returned by ``poll`` as applied."""
+        self._known, self._pending, self._deleted_seen = listing, None, None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                polled = self.poll()
+            except Exception as e:
+                logger.warning(f"Polling {self.path} failed: {e}")
+                continue
+            if polled is None:
+                continue
+            changes, listing = polled
+            if listing == self._failed and time.monotonic() < self._retry_at:
+                # Backing off; a different listing (e.g. the bad file was fixed) is tried at once
+                continue
+            logger.info(f"Documents changed: {len(changes.created)} created, {len(changes.modified)} modified, "
+                        f"{len(changes.deleted)} deleted")
+            try:
+                self.on_change(changes)
+            except Exception as e:
+                # Not committed, so the same changes are retried, waiting twice as long each time
+                self._failures = self._failures + 1 if listing == self._failed else 1
+                self._failed = listing
+                delay = min(self.interval * 2 ** self._failures, self.max_backoff)
+                self._retry_at = time.monotonic() + delay
+                logger.error(f"Applying document changes failed (attempt {self._failures}), "
+                             f"retrying in {delay:.1f}s: {e}")
+                continue
+            self._failed, self._failures = None, 0
+            self.commit(listing)
@@ -0,0 +1,552 @@
+"""
+Persistent vector index for the agent knowledge base.
+
+The index is stored under ``persist_dir`` together with a manifest that maps
+every source file to its content hash and the document ids it produced. On
+startup only new, changed or deleted files are re-embedded; everything else is
+loaded straight from disk.
+
+Documents are ingested through ``ingest.StreamingIngestor`` (bounded, batched
+embedding), and vectors are persisted as a float32 NumPy matrix rather than
+the vector store's JSON, which is far slower to write and parse for large
+corpora. Loaded indexes keep that matrix as one array (optionally memory-mapped)
+and score a dense query with a single matrix product, instead of turning it
+into per-vector Python lists. A BM25 keyword index over the same chunks is
+maintained alongside for hybrid retrieval.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from llama_index.core import StorageContext, VectorStoreIndex, load_index_from_storage
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import NodeWithScore
+from llama_index.core.utils import get_tokenizer
+from llama_index.core.storage.docstore.types import DEFAULT_PERSIST_FNAME as DOCSTORE_FNAME
+from llama_index.core.storage.index_store.types import DEFAULT_PERSIST_FNAME as INDEX_STORE_FNAME
+from llama_index.core.graph_stores.types import DEFAULT_PERSIST_FNAME as GRAPH_STORE_FNAME
+from llama_index.core.vector_stores.simple import SimpleVectorStore, SimpleVectorStoreData
+from llama_index.core.vector_stores.types import VectorStoreQuery, VectorStoreQueryMode, VectorStoreQueryResult
+
+from bm25_index import BM25Index, HybridRetriever
+from ingest import StreamingIngestor
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+# Version 2: vectors moved from JSON to vectors.npy + vectors.json
+MANIFEST_VERSION = 2
+VECTORS_FILE = "vectors.npy"
+VECTORS_META_FILE = "vectors.json"
+KEYWORD_INDEX_FILE = "keyword_index.json"
+RETRIEVAL_MODES = ("hybrid", "dense")
+# The JSON vector store written by index versions before 2
+LEGACY_VECTOR_STORE_FILE = "default__vector_store.json"
+
+
+class MatrixEmbeddings(MutableMapping):
+    """
+    Node id -> embedding mapping over a persisted vector matrix.
+
+    The matrix is never copied into Python objects, so forked workers keep sharing
+    its pages. Deleted rows are masked out and new or replaced embeddings go to a
+    small overlay, as happens during incremental re-indexing.
+    """
+
+    def __init__(self, ids: List[str], matrix: np.ndarray):
+        self.ids = ids
+        self.matrix = matrix
+        self.rows = {node_id: row for row, node_id in enumerate(ids)}
+        self.alive = np.ones(len(ids), dtype=bool)
+        self.norms = np.maximum(np.linalg.norm(matrix, axis=1), 1e-12) if len(ids) else np.ones(0, dtype=np.float32)
+        self.added: Dict[str, List[float]] = {}
+
+    def _row(self, node_id: str) -> Optional[int]:
+        row = self.rows.get(node_id)
+        return row if row is not None and self.alive[row] else None
+
+    def __getitem__(self, node_id: str) -> List[float]:
+        if node_id in self.added:
+            return self.added[node_id]
+        row = self._row(node_id)
+        if row is None:
+            raise KeyError(node_id)
+        return self.matrix[row].tolist()
+
+    def __setitem__(self, node_id: str, embedding: List[float]):
+        row = self._row(node_id)
+        if row is not None:
+            self.alive[row] = False
+        self.added[node_id] = embedding
+
+    def __delitem__(self, node_id: str):
+        if node_id in self.added:
+            del self.added[node_id]
+            return
+        row = self._row(node_id)
+        if row is None:
+            raise KeyError(node_id)
+        self.alive[row] = False
+
+    def __contains__(self, node_id: object) -> bool:
+        return node_id in self.added or self._row(node_id) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        for row in np.flatnonzero(self.alive):
+            yield self.ids[row]
+        yield from self.added
+
+    def __len__(self) -> int:
+        return int(self.alive.sum()) + len(self.added)
+
+    def top_k(self, query_embedding: List[float], k: int) -> Tuple[List[float], List[str]]:
+        """The ``k`` embeddings most cosine-similar to the query, best first."""
+        target = np.asarray(query_embedding, dtype=np.float32)
+        target = target / max(float(np.linalg.norm(target)), 1e-12)
+        scores = (self.matrix @ target) / self.norms if len(self.ids) else np.empty(0, dtype=np.float32)
+        scores = np.where(self.alive, scores, -np.inf)
+        ids = self.ids
+        if self.added:
+            extra = np.asarray(list(self.added.values()), dtype=np.float32)
+            extra_scores = (extra @ target) / np.maximum(np.linalg.norm(extra, axis=1), 1e-12)
+            scores = np.concatenate([scores, extra_scores])
+            ids = ids + list(self.added)
+        k = min(k, len(scores))
+        if k <= 0:
+            return [], []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top = top[np.isfinite(scores[top])]
+        return [float(scores[i]) for i in top], [ids[i] for i in top]
+
+
+class MatrixVectorStore(SimpleVectorStore):
+    """``SimpleVectorStore`` over ``MatrixEmbeddings``; plain dense queries are one matrix product."""
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        embeddings = self.data.embedding_dict
+        if (
+            not isinstance(embeddings, MatrixEmbeddings)
+            or query.mode != VectorStoreQueryMode.DEFAULT
+            or query.filters is not None
+            or query.node_ids is not None
+        ):
+            return super().query(query, **kwargs)
+        similarities, ids = embeddings.top_k(query.query_embedding, query.similarity_top_k)
+        return VectorStoreQueryResult(similarities=similarities, ids=ids)
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """Return the hex SHA-256 digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def format_passages(
+    results: Sequence[NodeWithScore],
+    max_tokens: int = 1500,
+    tokenizer: Optional[Callable[[str], List[Any]]] = None,
+) -> str:
+    """
+    Format retrieved chunks as numbered passages with their source files.
+
+    Duplicate chunks (identical text, or text contained in a passage already
+    included, as happens with overlapping chunks) are dropped, and the passages
+    are cut off once ``max_tokens`` is reached.
+
+    Args:
+        results: Retrieved chunks, best first
+        max_tokens: Token budget for the passage text
+        tokenizer: Function returning the tokens of a string (defaults to LlamaIndex's tokenizer)
+
+    Returns:
+        The passages, or an empty string if nothing was retrieved
+    """
+    tokenizer = tokenizer or get_tokenizer()
+    passages: List[str] = []
+    seen: List[str] = []
+    remaining = max_tokens
+    for result in results:
+        text = result.node.get_content().strip()
+        normalized = re.sub(r"\s+", " ", text).lower()
+        if not normalized or any(normalized in other for other in seen):
+            continue
+        tokens = len(tokenizer(text))
+        if tokens > remaining:
+            if remaining < 32 and passages:
+                break
+            # Keep the leading part of the chunk that fits, cut at a word boundary
+            text = text[: max(1, len(text) * remaining // tokens)].rsplit(" ", 1)[0] + " …"
+            tokens = remaining
+        seen.append(normalized)
+        source = result.node.metadata.get("file_name", "unknown source")
+        passages.append(f"[{len(passages) + 1}] {source}\n{text}")
+        remaining -= tokens
+        if remaining <= 0:
+            break
+    return "\n\n".join(passages)
+
+
+class PersistentKnowledgeIndex:
+    """A VectorStoreIndex persisted to disk with a per-file content-hash manifest."""
+
+    def __init__(
+        self,
+        documents_path: str,
+        persist_dir: str,
+        embed_model: Any,
+        chunk_size: int = 1024,
+        chunk_overlap: int = 200,
+        workers: Optional[int] = None,
+        batch_size: int = 256,
+    ):
+        """
+        Initialize the persistent index.
+
+        Args:
+            documents_path: Directory containing the knowledge base documents
+            persist_dir: Directory where the index and manifest are stored
+            embed_model: Embedding model used for new or changed documents
+            chunk_size: Chunk size for the sentence splitter
+            chunk_overlap: Chunk overlap for the sentence splitter
+            workers: Chunking processes for ingestion (None = automatic, 0 = in-process)
+            batch_size: Chunks embedded and inserted per batch during ingestion
+        """
+        self.documents_path = documents_path
+        self.persist_dir = persist_dir
+        self.embed_model = embed_model
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.workers = workers
+        self.batch_size = batch_size
+        self.manifest_path = os.path.join(persist_dir, MANIFEST_FILE)
+        self.last_ingest_stats: Dict[str, Any] = {}
+        self.index: Optional[VectorStoreIndex] = None
+        self.keyword_index: Optional[BM25Index] = None
+
+    @property
+    def settings(self) -> Dict[str, Any]:
+        """Settings that invalidate the whole index when they change."""
+        return {
+            "version": MANIFEST_VERSION,
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "embed_model": getattr(self.embed_model, "model_name", type(self.embed_model).__name__),
+        }
+
+    def _node_parser(self) -> SentenceSplitter:
+        return SentenceSplitter(chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
+
+    def list_files(self) -> List[str]:
+        """Names of the (non-hidden) files in the documents directory."""
+        return [
+            name for name in sorted(os.listdir(self.documents_path))
+            if not name.startswith(".") and os.path.isfile(os.path.join(self.documents_path, name))
+        ]
+
+    def iter_files(self, names: Optional[List[str]] = None) -> Iterator[Tuple[str, str]]:
+        """Yield (file name, sha256) pairs, hashing each file only when it is reached."""
+        for name in self.list_files() if names is None else names:
+            yield name, file_sha256(os.path.join(self.documents_path, name))
+
+    def scan(self) -> Dict[str, str]:
+        """Hash every (non-hidden) file in the documents directory, keyed by file name."""
+        return dict(self.iter_files())
+
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable index manifest {self.manifest_path}: {e}")
+            return None
+
+    def _write_manifest(self, files: Dict[str, Dict[str, Any]]):
+        manifest = dict(self.settings, files=files)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _ingest(self, index: VectorStoreIndex, files: Iterator[Tuple[str, str]], total: int) -> Dict[str, Dict[str, Any]]:
+        """Stream files into ``index`` and return the manifest entries of those inserted."""
+        ingestor = StreamingIngestor(
+            index,
+            self.embed_model,
+            self.documents_path,
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+            workers=self.workers,
+            batch_size=self.batch_size,
+            keyword_index=self.keyword_index,
+        )
+        entries = ingestor.ingest(files, total=total)
+        self.last_ingest_stats = ingestor.stats
+        return entries
+
+    def _persist(self, index: VectorStoreIndex):
+        """Persist the docstore and index store as JSON and the vectors as a NumPy matrix."""
+        os.makedirs(self.persist_dir, exist_ok=True)
+        storage_context = index.storage_context
+        storage_context.docstore.persist(os.path.join(self.persist_dir, DOCSTORE_FNAME))
+        storage_context.index_store.persist(os.path.join(self.persist_dir, INDEX_STORE_FNAME))
+        storage_context.graph_store.persist(os.path.join(self.persist_dir, GRAPH_STORE_FNAME))
+
+        data = storage_context.vector_store.data
+        embeddings = data.embedding_dict
+        ids = list(embeddings)
+        if isinstance(embeddings, MatrixEmbeddings):
+            rows = np.flatnonzero(embeddings.alive)
+            matrix = np.asarray(embeddings.matrix[rows], dtype=np.float32)
+            if embeddings.added:
+                added = np.asarray(list(embeddings.added.values()), dtype=np.float32)
+                matrix = np.concatenate([matrix, added]) if len(rows) else added
+        else:
+            matrix = np.asarray([embeddings[i] for i in ids], dtype=np.float32)
+        meta = {
+            "ids": ids,
+            "text_id_to_ref_doc_id": data.text_id_to_ref_doc_id,
+            "metadata_dict": data.metadata_dict,
+        }
+        vectors_path = os.path.join(self.persist_dir, VECTORS_FILE)
+        meta_path = os.path.join(self.persist_dir, VECTORS_META_FILE)
+        with open(f"{vectors_path}.tmp", "wb") as f:
+            np.save(f, matrix)
+        with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+            f.write(json.dumps(meta))
+        os.replace(f"{vectors_path}.tmp", vectors_path)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+        self.keyword_index.persist(os.path.join(self.persist_dir, KEYWORD_INDEX_FILE))
+
+        legacy_path = os.path.join(self.persist_dir, LEGACY_VECTOR_STORE_FILE)
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+
+    def _load_vector_store(self, mmap: bool = False) -> SimpleVectorStore:
+        """
+        Open the vector store over the persisted NumPy matrix.
+
+        Args:
+            mmap: Memory-map the matrix read-only instead of reading it into memory. Only
+                for indexes that are not updated in place: the file is replaced on persist,
+                which Windows refuses while it is mapped.
+        """
+        matrix = np.load(os.path.join(self.persist_dir, VECTORS_FILE), mmap_mode="r" if mmap else None)
+        with open(os.path.join(self.persist_dir, VECTORS_META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if len(meta["ids"]) != len(matrix):
+            raise ValueError("vector ids do not match the vector matrix")
+        data = SimpleVectorStoreData(
+            embedding_dict=MatrixEmbeddings(meta["ids"], matrix),
+            text_id_to_ref_doc_id=meta["text_id_to_ref_doc_id"],
+            metadata_dict=meta["metadata_dict"],
+        )
+        return MatrixVectorStore(data=data)
+
+    def _load_keyword_index(self, index: VectorStoreIndex) -> BM25Index:
+        """Load the persisted keyword index, rebuilding it from the docstore if it is missing or stale."""
+        path = os.path.join(self.persist_dir, KEYWORD_INDEX_FILE)
+        try:
+            keyword_index = BM25Index.load(path)
+            if set(keyword_index.node_ids) == set(index.index_struct.nodes_dict.values()):
+                return keyword_index
+            logger.info("Keyword index does not match the vector index; rebuilding it")
+        except FileNotFoundError:
+            logger.info("No keyword index found; building it from the stored chunks")
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not load keyword index {path}: {e}; rebuilding it")
+        return BM25Index.from_nodes(index.docstore.docs.values())
+
+    def as_retriever(self, mode: str = "hybrid", top_k: int = 2, candidates: int = 10, rrf_k: int = 60,
+                     embed_model: Any = None) -> BaseRetriever:
+        """
+        Build a retriever over the loaded index.
+
+        Args:
+            mode: "hybrid" (BM25 + dense, fused by reciprocal rank) or "dense"
+            top_k: Number of chunks returned
+            candidates: Chunks taken from each ranking before fusion (hybrid only)
+            rrf_k: Reciprocal-rank fusion constant (hybrid only)
+            embed_model: Query embedding model (defaults to the one the index was loaded with)
+
+        Returns:
+            A retriever for ``mode``
+        """
+        if self.index is None:
+            raise RuntimeError("Knowledge index has not been loaded or built")
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode {mode!r}; expected one of {', '.join(RETRIEVAL_MODES)}")
+        if mode == "dense":
+            return self.index.as_retriever(similarity_top_k=top_k, embed_model=embed_model)
+        return HybridRetriever(
+            self.index.as_retriever(similarity_top_k=max(candidates, top_k), embed_model=embed_model),
+            self.keyword_index,
+            self.index.docstore,
+            top_k=top_k,
+            candidates=max(candidates, top_k),
+            rrf_k=rrf_k,
+        )
+
+    @staticmethod
+    def diff(current: Dict[str, str], previous: Dict[str, Dict[str, Any]]) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Compare the current file hashes against the manifest.
+
+        Returns:
+            Tuple of (added, changed, deleted) file names
+        """
+        added = [name for name in current if name not in previous]
+        changed = [
+            name for name in current
+            if name in previous and previous[name].get("sha256") != current[name]
+        ]
+        deleted = [name for name in previous if name not in current]
+        return added, changed, deleted
+
+    def build(self, current: Optional[Dict[str, str]] = None) -> VectorStoreIndex:
+        """Build the index from scratch and persist it."""
+        index = VectorStoreIndex(
+            nodes=[],
+            transformations=[self._node_parser()],
+            embed_model=self.embed_model,
+        )
+        self.keyword_index = BM25Index()
+        if current is None:
+            names = self.list_files()
+            files = self._ingest(index, self.iter_files(names), total=len(names))
+        else:
+            files = self._ingest(index, iter(current.items()), total=len(current))
+        self._persist(index)
+        self._write_manifest(files)
+        documents = sum(len(entry["doc_ids"]) for entry in files.values())
+        logger.info(f"Built knowledge index from {len(files)} files ({documents} documents)")
+        self.index = index
+        return index
+
+    def load(self, mmap: bool = False) -> Optional[Tuple[VectorStoreIndex, Dict[str, Dict[str, Any]]]]:
+        """
+        Load the persisted index and its manifest, or None if they are missing or stale.
+
+        Args:
+            mmap: Memory-map the vectors (see ``_load_vector_store``), e.g. to share them between processes
+        """
+        manifest = self._read_manifest()
+        if manifest is None:
+            return None
+        if any(manifest.get(key) != value for key, value in self.settings.items()):
+            logger.info("Index settings changed; knowledge index will be rebuilt")
+            return None
+
+        try:
+            storage_context = StorageContext.from_defaults(
+                persist_dir=self.persist_dir,
+                vector_stores={"default": self._load_vector_store(mmap)},
+            )
+            index = load_index_from_storage(
+                storage_context,
+                embed_model=self.embed_model,
+                transformations=[self._node_parser()],
+            )
+        except Exception as e:
+            logger.warning(f"Could not load persisted knowledge index: {e}")
+            return None
+
+        files = manifest.get("files", {})
+        # A crash between persisting the index and writing the manifest leaves them
+        # out of sync; fall back to a rebuild rather than risk duplicate documents.
+        expected_ids = {doc_id for entry in files.values() for doc_id in entry.get("doc_ids", [])}
+        if not set(index.ref_doc_info.keys()) <= expected_ids:
+            logger.warning("Knowledge index does not match its manifest; rebuilding")
+            return None
+        self.keyword_index = self._load_keyword_index(index)
+        return index, files
+
+    def load_or_build(self, current: Optional[Dict[str, str]] = None) -> VectorStoreIndex:
+        """
+        Load the persisted index, re-embedding only files that changed since it was saved.
+
+        Args:
+            current: File hashes to bring the index up to date with (defaults to hashing every file)
+
+        Returns:
+            An up-to-date VectorStoreIndex
+        """
+        current = self.scan() if current is None else current
+        loaded = self.load()
+        if loaded is None:
+            return self.build(current)
+
+        index, files = loaded
+        added, changed, deleted = self.diff(current, files)
+        self.index = index
+        if not (added or changed or deleted):
+            logger.info(f"Loaded knowledge index from {self.persist_dir} ({len(files)} files, unchanged)")
+            return index
+
+        for name in changed + deleted:
+            for doc_id in files.pop(name).get("doc_ids", []):
+                ref_doc_info = index.docstore.get_ref_doc_info(doc_id)
+                for node_id in ref_doc_info.node_ids if ref_doc_info else []:
+                    self.keyword_index.remove(node_id)
+                index.delete_ref_doc(doc_id, delete_from_docstore=True)
+        updated = added + changed
+        files.update(self._ingest(index, ((name, current[name]) for name in updated), total=len(updated)))
+
+        self._persist(index)
+        self._write_manifest(files)
+        logger.info(
+            f"Updated knowledge index: {len(added)} added, {len(changed)} changed, {len(deleted)} deleted"
+        )
+        return index
+
+    def reload(self, changed: Optional[Sequence[str]] = None) -> "PersistentKnowledgeIndex":
+        """
+        Load a fresh copy of the index from disk with the given files re-indexed.
+
+        This instance is left untouched, so queries against it can continue while the
+        copy is built; callers swap the copy in when it is ready.
+
+        Args:
+            changed: Names of files created, modified or deleted since the index was saved;
+                only these are re-hashed (None re-hashes every file)
+
+        Returns:
+            A new, up-to-date ``PersistentKnowledgeIndex``
+        """
+        fresh = PersistentKnowledgeIndex(
+            self.documents_path,
+            self.persist_dir,
+            embed_model=self.embed_model,
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+            workers=self.workers,
+            batch_size=self.batch_size,
+        )
+        current = None
+        manifest = self._read_manifest() if changed is not None else None
+        if manifest is not None:
+            current = {name: entry.get("sha256") for name, entry in manifest.get("files", {}).items()}
+            for name in changed:
+                path = os.path.join(self.documents_path, name)
+                current.pop(name, None)
+                if not name.startswith(".") and os.path.isfile(path):
+                    try:
+                        current[name] = file_sha256(path)
+                    except OSError:
+                        # Deleted again since the change was noticed
+                        pass
+        fresh.load_or_build(current)
+        return fresh
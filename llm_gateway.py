@@ -0,0 +1,687 @@
+"""
+Gateway between the agent and the Groq API.
+
+Every LLM call goes through one pooled keep-alive HTTP client per process (sync
+and async), whose transport:
+
+* schedules requests against the account's requests-per-minute and
+  tokens-per-minute limits with a pair of token buckets per model, kept in sync
+  with Groq's ``x-ratelimit-*`` response headers;
+* retries connection errors, timeouts, 429 and 5xx responses with full-jitter
+  exponential backoff (honoring ``Retry-After``) until a per-request deadline;
+* hedges: when an attempt has not answered after ``hedge_after`` seconds, a
+  second one is sent and whichever answers first is used;
+* falls back to a smaller model when the primary cannot answer within the
+  latency SLO, because its rate limit would make the request wait too long or
+  because retries have used up the budget.
+
+Streaming responses are hedged and retried until their headers arrive; once
+tokens flow the request is committed.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+GROQ_API_BASE = "https://api.groq.com/openai/v1"
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_SCALE = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parse a rate-limit reset or ``Retry-After`` value ("7.66s", "2m59.56s", "120ms", "3") into seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_SCALE[unit] for number, unit in parts)
+
+
+def estimate_tokens(body: bytes, output_tokens: int = 512) -> int:
+    """Estimate the tokens a chat completion request counts against the tokens-per-minute limit."""
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        return output_tokens
+    chars = 0
+    for message in payload.get("messages") or []:
+        content = message.get("content") if isinstance(message, dict) else None
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            chars += sum(len(part.get("text", "")) for part in content if isinstance(part, dict))
+    # About four characters per token for English text, plus a few per message
+    prompt = chars // 4 + 4 * len(payload.get("messages") or [])
+    return prompt + int(payload.get("max_tokens") or payload.get("max_completion_tokens") or output_tokens)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at ``per_minute`` tokens per minute."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        """
+        Initialize a full bucket.
+
+        Args:
+            per_minute: Refill rate (the account limit per minute); 0 disables the bucket
+            capacity: Largest burst (defaults to one minute's worth)
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float, max_wait: float) -> Optional[float]:
+        """
+        Take ``amount`` tokens, possibly ahead of time.
+
+        Returns:
+            Seconds the caller must wait before using them, or None (nothing taken)
+            when that would be longer than ``max_wait``
+        """
+        if self.rate <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            delay = max(self._blocked_until - now, 0.0)
+            if self._level < amount:
+                delay = max(delay, (amount - self._level) / self.rate)
+            if delay > max_wait:
+                return None
+            self._level -= amount
+            return delay
+
+    def refund(self, amount: float):
+        """Return tokens of a reservation that was not used."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._level = min(self.capacity, self._level + min(amount, self.capacity))
+
+    def sync(self, remaining: Optional[float], reset: Optional[float] = None):
+        """Lower the level to what the server reports remaining (our estimate may be optimistic)."""
+        if self.rate <= 0 or remaining is None:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            if remaining < self._level:
+                self._level = remaining
+                if remaining <= 0 and reset:
+                    self.block(reset, locked=True)
+
+    def block(self, seconds: float, locked: bool = False):
+        """Refuse to hand out tokens for ``seconds`` (after a 429)."""
+        if self.rate <= 0:
+            return
+        if not locked:
+            with self._lock:
+                return self.block(seconds, locked=True)
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def available(self) -> float:
+        """Tokens available right now."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._level
+
+
+class _ModelState:
+    """Rate-limit buckets and latency history of one model."""
+
+    __slots__ = ("requests", "tokens", "latencies", "ewma", "observed")
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.latencies: Deque[float] = deque(maxlen=1000)
+        self.ewma: Optional[float] = None
+        self.observed = 0.0
+
+    def expected_latency(self, half_life: float) -> float:
+        """Latency moving average, halved every ``half_life`` seconds without a new observation."""
+        if self.ewma is None:
+            return 0.0
+        if half_life <= 0:
+            return self.ewma
+        return self.ewma * 0.5 ** ((time.monotonic() - self.observed) / half_life)
+
+
+class LLMGateway:
+    """Pooled, rate-limited, retrying and hedging HTTP layer for OpenAI-compatible chat completions."""
+
+    def __init__(
+        self,
+        model: str,
+        fallback_model: Optional[str] = None,
+        requests_per_minute: float = 30,
+        tokens_per_minute: float = 6000,
+        max_retries: int = 4,
+        deadline: float = 60.0,
+        slo: float = 10.0,
+        hedge_after: float = 0.0,
+        max_connections: int = 20,
+        connect_timeout: float = 5.0,
+        output_tokens: int = 512,
+        backoff_base: float = 0.25,
+        backoff_cap: float = 8.0,
+        latency_half_life: float = 60.0,
+    ):
+        """
+        Initialize the gateway.
+
+        Args:
+            model: Primary model
+            fallback_model: Smaller model used when the primary would miss the SLO (None disables)
+            requests_per_minute: Account request limit, per model (0 disables scheduling)
+            tokens_per_minute: Account token limit, per model (0 disables scheduling)
+            max_retries: Retries per request after the first attempt
+            deadline: Seconds a request may take, including waits and retries
+            slo: Target seconds until a response starts; beyond it the fallback model is used
+            hedge_after: Send a second attempt when the first has not answered after this many
+                seconds (0 disables hedging)
+            max_connections: Size of the keep-alive connection pool
+            connect_timeout: Seconds to establish a connection
+            output_tokens: Completion tokens assumed for requests without ``max_tokens``
+            backoff_base: First retry delay bound in seconds (doubles per retry)
+            backoff_cap: Largest retry delay bound in seconds
+            latency_half_life: Seconds after which a model's latency estimate halves while it
+                gets no traffic, so a model skipped for being slow is tried again (0 disables)
+        """
+        self.model = model
+        self.fallback_model = fallback_model if fallback_model and fallback_model != model else None
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.deadline = deadline
+        self.slo = slo
+        self.hedge_after = hedge_after
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self.output_tokens = output_tokens
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.latency_half_life = latency_half_life
+
+        self._models: Dict[str, _ModelState] = {}
+        self._lock = threading.Lock()
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._sync_pool: Optional[httpx.HTTPTransport] = None
+        # httpx async connections belong to the event loop that opened them
+        self._async_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+        self._client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._counters = {
+            "requests": 0,
+            "attempts": 0,
+            "retries": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "fallbacks": 0,
+            "throttled": 0,
+            "failures": 0,
+        }
+        self._throttle_wait = 0.0
+
+    @classmethod
+    def from_env(cls, model: str) -> "LLMGateway":
+        """
+        Create a gateway configured by the ``LLM_*`` environment variables.
+
+        ``LLM_RPM`` and ``LLM_TPM`` are the account's limits; they are split evenly
+        between the ``LLM_PROCESSES`` processes sharing the account.
+        """
+        processes = max(int(os.getenv("LLM_PROCESSES", "1")), 1)
+        return cls(
+            model,
+            fallback_model=os.getenv("LLM_FALLBACK_MODEL", "llama-3.1-8b-instant") or None,
+            requests_per_minute=float(os.getenv("LLM_RPM", "30")) / processes,
+            tokens_per_minute=float(os.getenv("LLM_TPM", "6000")) / processes,
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+            deadline=float(os.getenv("LLM_DEADLINE", "60")),
+            slo=float(os.getenv("LLM_SLO", "10")),
+            hedge_after=float(os.getenv("LLM_HEDGE_AFTER", "0")),
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "20")),
+            output_tokens=int(os.getenv("LLM_OUTPUT_TOKENS", "512")),
+            latency_half_life=float(os.getenv("LLM_LATENCY_HALF_LIFE", "60")),
+        )
+
+    # --- clients -----------------------------------------------------------
+
+    def client(self) -> httpx.Client:
+        """The shared synchronous client (pass as ``http_client``)."""
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(transport=_GatewayTransport(self), timeout=self._timeout())
+            return self._client
+
+    def async_client(self) -> httpx.AsyncClient:
+        """The shared asynchronous client (pass as ``async_http_client``)."""
+        with self._lock:
+            if self._async_client is None:
+                self._async_client = httpx.AsyncClient(transport=_AsyncGatewayTransport(self), timeout=self._timeout())
+            return self._async_client
+
+    def _timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.deadline, connect=self.connect_timeout)
+
+    def _pool(self) -> httpx.HTTPTransport:
+        with self._lock:
+            if self._sync_pool is None:
+                self._sync_pool = httpx.HTTPTransport(limits=self._limits)
+            return self._sync_pool
+
+    def _async_pool(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            pool = self._async_pools.get(loop)
+            if pool is None:
+                pool = self._async_pools[loop] = httpx.AsyncHTTPTransport(limits=self._limits)
+            return pool
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(
+                    max_workers=self.max_connections, thread_name_prefix="llm-hedge"
+                )
+            return self._hedge_executor
+
+    def close(self):
+        """Close pooled connections."""
+        with self._lock:
+            pool, self._sync_pool = self._sync_pool, None
+            executor, self._hedge_executor = self._hedge_executor, None
+        if pool is not None:
+            pool.close()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    # --- scheduling --------------------------------------------------------
+
+    def _state(self, model: str) -> _ModelState:
+        with self._lock:
+            state = self._models.get(model)
+            if state is None:
+                state = self._models[model] = _ModelState(self.requests_per_minute, self.tokens_per_minute)
+            return state
+
+    def _reserve(self, model: str, tokens: int, max_wait: float) -> Optional[float]:
+        """Reserve one request and ``tokens`` tokens of a model's limits; see ``TokenBucket.reserve``."""
+        state = self._state(model)
+        delay = state.requests.reserve(1, max_wait)
+        if delay is None:
+            return None
+        token_delay = state.tokens.reserve(tokens, max_wait)
+        if token_delay is None:
+            state.requests.refund(1)
+            return None
+        return max(delay, token_delay)
+
+    def _expected_latency(self, model: str) -> float:
+        return self._state(model).expected_latency(self.latency_half_life)
+
+    def _schedule(self, body: bytes, started: float, requested: str, model: str) -> Tuple[Optional[str], float]:
+        """
+        Pick the model for an attempt and reserve its rate limits.
+
+        ``model`` (the one used last) is tried first, then the requested model and the fallback.
+
+        Returns:
+            Tuple of (model, seconds to wait first); model is None when no model can be
+            scheduled before the deadline
+        """
+        tokens = estimate_tokens(body, self.output_tokens)
+        elapsed = time.monotonic() - started
+        remaining = self.deadline - elapsed
+        candidates = [model]
+        for candidate in (requested, self.fallback_model):
+            if candidate and candidate not in candidates:
+                candidates.append(candidate)
+        # Prefer the first model that can still answer within the SLO ...
+        for candidate in candidates:
+            budget = min(self.slo - elapsed, remaining) - self._expected_latency(candidate)
+            if budget < 0:
+                continue
+            delay = self._reserve(candidate, tokens, budget)
+            if delay is not None:
+                return candidate, delay
+        # ... otherwise the first one that can at least start before the deadline
+        for candidate in candidates:
+            delay = self._reserve(candidate, tokens, max(remaining - self._expected_latency(candidate), 0.0))
+            if delay is not None:
+                return candidate, delay
+        return None, 0.0
+
+    def _note_wait(self, delay: float):
+        if delay > 0:
+            with self._lock:
+                self._counters["throttled"] += 1
+                self._throttle_wait += delay
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _observe(self, model: str, response: httpx.Response, latency: float):
+        """Update a model's latency history and rate-limit buckets from a response."""
+        state = self._state(model)
+        headers = response.headers
+        state.requests.sync(_float(headers.get("x-ratelimit-remaining-requests")),
+                            parse_duration(headers.get("x-ratelimit-reset-requests")))
+        state.tokens.sync(_float(headers.get("x-ratelimit-remaining-tokens")),
+                          parse_duration(headers.get("x-ratelimit-reset-tokens")))
+        if response.status_code == 429:
+            retry_after = parse_duration(headers.get("retry-after")) or 1.0
+            state.requests.block(retry_after)
+            state.tokens.block(retry_after)
+            return
+        if response.status_code < 500:
+            state.latencies.append(latency)
+            # Blend with the decayed estimate, so a model that recovered while skipped is trusted again quickly
+            previous = state.expected_latency(self.latency_half_life)
+            state.ewma = latency if state.ewma is None else 0.8 * previous + 0.2 * latency
+            state.observed = time.monotonic()
+
+    def _backoff(self, retry: int) -> float:
+        """Full-jitter exponential backoff; ``Retry-After`` is enforced by the model's buckets instead."""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** retry)))
+
+    def _request(self, request: httpx.Request, payload: Optional[Dict[str, Any]], model: str,
+                 started: float) -> httpx.Request:
+        """Copy a request for one attempt: target ``model`` and fit the read timeout into the deadline."""
+        content = request.content
+        if payload is not None and payload.get("model") != model:
+            content = json.dumps(dict(payload, model=model)).encode("utf-8")
+        headers = httpx.Headers(request.headers)
+        headers["Content-Length"] = str(len(content))
+        extensions = dict(request.extensions)
+        timeout = dict(extensions.get("timeout") or {})
+        remaining = max(self.deadline - (time.monotonic() - started), 0.1)
+        timeout["read"] = min(timeout.get("read") or remaining, remaining)
+        timeout["pool"] = min(timeout.get("pool") or remaining, remaining)
+        extensions["timeout"] = timeout
+        return httpx.Request(request.method, request.url, headers=headers, content=content, extensions=extensions)
+
+    def _payload(self, request: httpx.Request) -> Tuple[Optional[Dict[str, Any]], str]:
+        """The request's JSON body (None if it is not a JSON object) and the model it asks for."""
+        try:
+            payload = json.loads(request.content or b"{}")
+        except ValueError:
+            return None, self.model
+        if not isinstance(payload, dict):
+            return None, self.model
+        return payload, str(payload.get("model") or self.model)
+
+    @staticmethod
+    def _failed(response: Optional[httpx.Response], error: Optional[BaseException]) -> bool:
+        return error is not None or response is None or response.status_code in RETRYABLE_STATUS
+
+    def _give_up(self, response: Optional[httpx.Response], error: Optional[BaseException],
+                 request: httpx.Request) -> httpx.Response:
+        self._count("failures")
+        if response is not None:
+            return response
+        if error is not None:
+            raise error
+        return httpx.Response(
+            429,
+            json={"error": {"message": "Rate limit: no model can be scheduled before the deadline",
+                            "type": "rate_limit_exceeded"}},
+            request=request,
+        )
+
+    # --- synchronous path --------------------------------------------------
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        """Send a request with scheduling, retries, hedging and fallback."""
+        started = time.monotonic()
+        request.read()
+        payload, requested = self._payload(request)
+        self._count("requests")
+        response: Optional[httpx.Response] = None
+        error: Optional[BaseException] = None
+        model: Optional[str] = requested
+        fell_back = False
+        for retry in range(self.max_retries + 1):
+            model, delay = self._schedule(request.content, started, requested, model or requested)
+            if model is None:
+                break
+            if model != requested and not fell_back:
+                fell_back = True
+                self._count("fallbacks")
+            self._note_wait(delay)
+            if delay:
+                time.sleep(delay)
+            if retry:
+                self._count("retries")
+            response, error = self._attempt(request, payload, model, started)
+            if not self._failed(response, error) or (error is not None and not isinstance(error, httpx.TransportError)):
+                break
+            backoff = self._backoff(retry)
+            if retry == self.max_retries or time.monotonic() - started + backoff >= self.deadline:
+                break
+            if response is not None:
+                response.close()
+                response = None
+            logger.info(f"LLM request to {model} failed ({error or 'retryable status'}); retrying in {backoff:.2f}s")
+            time.sleep(backoff)
+        if self._failed(response, error):
+            return self._give_up(response, error, request)
+        return response
+
+    def _send(self, request: httpx.Request, model: str) -> Tuple[Optional[httpx.Response], Optional[BaseException]]:
+        self._count("attempts")
+        start = time.monotonic()
+        try:
+            response = self._pool().handle_request(request)
+        except Exception as e:
+            return None, e
+        self._observe(model, response, time.monotonic() - start)
+        return response, None
+
+    def _attempt(self, request: httpx.Request, payload: Optional[Dict[str, Any]], model: str,
+                 started: float) -> Tuple[Optional[httpx.Response], Optional[BaseException]]:
+        """One attempt, hedged with a second one if it is slow to answer."""
+        first = self._request(request, payload, model, started)
+        if self.hedge_after <= 0:
+            return self._send(first, model)
+        executor = self._executor()
+        futures = [executor.submit(self._send, first, model)]
+        done, _ = wait(futures, timeout=self.hedge_after)
+        # A hedge only goes out if the rate limits have room for it right now
+        if not done and self._reserve(model, estimate_tokens(request.content, self.output_tokens), 0.0) is not None:
+            self._count("hedges")
+            futures.append(executor.submit(self._send, self._request(request, payload, model, started), model))
+        pending = set(futures)
+        result: Tuple[Optional[httpx.Response], Optional[BaseException]] = (None, None)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                response, error = future.result()
+                if not self._failed(response, error):
+                    if future is not futures[0]:
+                        self._count("hedge_wins")
+                    # The slower attempt is closed when it finishes
+                    for other in pending:
+                        other.add_done_callback(_close_future_response)
+                    return response, None
+                if result[0] is not None:
+                    result[0].close()
+                result = (response, error)
+        return result
+
+    # --- asynchronous path -------------------------------------------------
+
+    async def ahandle(self, request: httpx.Request) -> httpx.Response:
+        """Async version of ``handle``."""
+        started = time.monotonic()
+        await request.aread()
+        payload, requested = self._payload(request)
+        self._count("requests")
+        response: Optional[httpx.Response] = None
+        error: Optional[BaseException] = None
+        model: Optional[str] = requested
+        fell_back = False
+        for retry in range(self.max_retries + 1):
+            model, delay = self._schedule(request.content, started, requested, model or requested)
+            if model is None:
+                break
+            if model != requested and not fell_back:
+                fell_back = True
+                self._count("fallbacks")
+            self._note_wait(delay)
+            if delay:
+                await asyncio.sleep(delay)
+            if retry:
+                self._count("retries")
+            response, error = await self._aattempt(request, payload, model, started)
+            if not self._failed(response, error) or (error is not None and not isinstance(error, httpx.TransportError)):
+                break
+            backoff = self._backoff(retry)
+            if retry == self.max_retries or time.monotonic() - started + backoff >= self.deadline:
+                break
+            if response is not None:
+                await response.aclose()
+                response = None
+            logger.info(f"LLM request to {model} failed ({error or 'retryable status'}); retrying in {backoff:.2f}s")
+            await asyncio.sleep(backoff)
+        if self._failed(response, error):
+            return self._give_up(response, error, request)
+        return response
+
+    async def _asend(self, request: httpx.Request, model: str) -> Tuple[Optional[httpx.Response], Optional[BaseException]]:
+        self._count("attempts")
+        start = time.monotonic()
+        try:
+            response = await self._async_pool().handle_async_request(request)
+        except Exception as e:
+            return None, e
+        self._observe(model, response, time.monotonic() - start)
+        return response, None
+
+    async def _aattempt(self, request: httpx.Request, payload: Optional[Dict[str, Any]], model: str,
+                        started: float) -> Tuple[Optional[httpx.Response], Optional[BaseException]]:
+        first = asyncio.ensure_future(self._asend(self._request(request, payload, model, started), model))
+        if self.hedge_after <= 0:
+            return await first
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_after)
+        tasks = [first]
+        if not done and self._reserve(model, estimate_tokens(request.content, self.output_tokens), 0.0) is not None:
+            self._count("hedges")
+            tasks.append(asyncio.ensure_future(self._asend(self._request(request, payload, model, started), model)))
+        pending = set(tasks)
+        result: Tuple[Optional[httpx.Response], Optional[BaseException]] = (None, None)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                response, error = task.result()
+                if not self._failed(response, error):
+                    if task is not first:
+                        self._count("hedge_wins")
+                    for other in pending:
+                        other.add_done_callback(_aclose_task_response)
+                    return response, None
+                if result[0] is not None:
+                    await result[0].aclose()
+                result = (response, error)
+        return result
+
+    # --- reporting ---------------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        """Request, retry, hedge and fallback counts, throttling and per-model latency."""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counters)
+            stats["throttle_wait"] = self._throttle_wait
+            models = dict(self._models)
+        stats["models"] = {}
+        for name, state in models.items():
+            latencies = sorted(state.latencies)
+            entry: Dict[str, Any] = {
+                "responses": len(latencies),
+                "requests_available": state.requests.available(),
+                "tokens_available": state.tokens.available(),
+            }
+            if latencies:
+                entry["p50"] = latencies[len(latencies) // 2]
+                entry["p95"] = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+            stats["models"][name] = entry
+        return stats
+
+
+class _GatewayTransport(httpx.BaseTransport):
+    def __init__(self, gateway: LLMGateway):
+        self.gateway = gateway
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self.gateway.handle(request)
+
+    def close(self):
+        self.gateway.close()
+
+
+class _AsyncGatewayTransport(httpx.AsyncBaseTransport):
+    def __init__(self, gateway: LLMGateway):
+        self.gateway = gateway
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self.gateway.ahandle(request)
+
+    async def aclose(self):
+        pools = list(self.gateway._async_pools.values())
+        self.gateway._async_pools.clear()
+        for pool in pools:
+            await pool.aclose()
+
+
+def _float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _close_future_response(future: Any):
+    response = future.result()[0]
+    if response is not None:
+        response.close()
+
+
+def _aclose_task_response(task: "asyncio.Task"):
+    if task.cancelled():
+        return
+    response = task.result()[0]
+    if response is not None:
+        asyncio.ensure_future(response.aclose())
@@ -0,0 +1,333 @@
+"""
+Local, offline conversation memory with the same ``add``/``search`` surface as Mem0.
+
+Turns are stored in a SQLite database (WAL mode) together with their session id,
+message type and metadata. Their embeddings live in one flat float32 file per
+user next to it, memory-mapped and L2-normalized, where row ``i`` belongs to the
+user's ``i``-th turn. Searching a user's full history is a single matrix-vector
+product over a contiguous block plus a partial sort; session and message type
+scopes use row lists kept in memory. Turns written by other processes sharing
+the same files are picked up on the next search.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Turns are appended to the vector file in chunks of this many rows
+GROW_ROWS = 4096
+
+_ScopeKey = Tuple[Optional[str], Optional[str]]
+
+
+def turn_texts(messages: List[Dict[str, str]]) -> List[str]:
+    """Render messages as one text per turn, each turn starting at a user message."""
+    turns: List[List[str]] = []
+    for message in messages:
+        role = message.get("role", "user")
+        content = str(message.get("content") or "").strip()
+        if not content:
+            continue
+        if role == "user" or not turns:
+            turns.append([])
+        turns[-1].append(f"{role.capitalize()}: {content}")
+    return ["\n".join(lines) for lines in turns]
+
+
+class LocalMemory:
+    """Conversation memory in SQLite with memory-mapped embedding vectors, scoped by user, session and message type."""
+
+    def __init__(
+        self,
+        path: str,
+        embed_model: Any,
+        user_id: str = "local",
+        grow_rows: int = GROW_ROWS,
+    ):
+        """
+        Initialize the memory, creating its files if missing.
+
+        Args:
+            path: Path of the SQLite database; vectors are stored next to it, one file per user
+            embed_model: Embedding model, or a callable returning it (resolved on first use)
+            user_id: Owner of the turns written and searched by this instance
+            grow_rows: Number of rows added to the vector file when it is full
+        """
+        self.path = path
+        self.user_id = user_id
+        self.vectors_path = f"{path}.{hashlib.sha256(user_id.encode('utf-8')).hexdigest()[:16]}.vectors"
+        self.grow_rows = grow_rows
+        self._embed_model = embed_model
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._dim: Optional[int] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._count = 0
+        self._scopes: Dict[_ScopeKey, List[int]] = {}
+        self._arrays: Dict[_ScopeKey, np.ndarray] = {}
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS turns ("
+                " id INTEGER PRIMARY KEY,"
+                " user_id TEXT NOT NULL,"
+                " row INTEGER NOT NULL,"
+                " session_id TEXT,"
+                " message_type TEXT,"
+                " content TEXT NOT NULL,"
+                " metadata TEXT NOT NULL,"
+                " created REAL NOT NULL)"
+            )
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_turns_user_row ON turns(user_id, row)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+        if "dim" in meta:
+            self._dim = int(meta["dim"])
+        self._refresh()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection; SQLite connections must not cross threads."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @property
+    def embed_model(self) -> Any:
+        """The embedding model, resolved on first use when a callable was given."""
+        model = self._embed_model
+        if callable(model) and not hasattr(model, "get_query_embedding"):
+            model = self._embed_model = model()
+        return model
+
+    def __len__(self) -> int:
+        """Number of turns stored for this user."""
+        with self._lock:
+            self._refresh()
+            return self._count
+
+    def _map_vectors(self, rows: int):
+        """Memory-map the vector file, growing it to hold at least ``rows`` rows."""
+        row_bytes = self._dim * 4
+        size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        capacity = size // row_bytes
+        if rows > capacity:
+            capacity = (rows // self.grow_rows + 1) * self.grow_rows
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        elif self._vectors is not None and len(self._vectors) == capacity:
+            return
+        # Searches holding the previous map keep using it until they finish
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self._dim))
+
+    def _refresh(self):
+        """Index this user's turns written since the last refresh, including those of other processes."""
+        rows = self._connection().execute(
+            "SELECT row, session_id, message_type FROM turns WHERE user_id = ? AND row >= ? ORDER BY row",
+            (self.user_id, self._count),
+        ).fetchall()
+        if not rows:
+            return
+        for row, session_id, message_type in rows:
+            for key in ((session_id, None), (None, message_type), (session_id, message_type)):
+                self._scopes.setdefault(key, []).append(row)
+        self._count = rows[-1][0] + 1
+        if self._dim is not None:
+            self._map_vectors(self._count)
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.asarray(self.embed_model.get_text_embedding_batch(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def add(self, messages: List[Dict[str, str]], metadata: Optional[Dict[str, Any]] = None, **kwargs: Any):
+        """
+        Store conversation turns.
+
+        Args:
+            messages: Chat messages (``role``/``content`` dicts); each user message starts a new turn
+            metadata: Metadata stored with every turn; ``session_id`` and ``message_type`` scope searches
+
+        Returns:
+            Row numbers of the stored turns
+        """
+        metadata = dict(metadata or {}, **kwargs)
+        metadata.pop("turns", None)
+        texts = turn_texts(messages)
+        if not texts:
+            return []
+        vectors = self._embed(texts)
+        session_id = metadata.get("session_id")
+        message_type = metadata.get("message_type")
+        created = time.time()
+        encoded = json.dumps(metadata, default=str)
+
+        with self._lock:
+            conn = self._connection()
+            # The write lock also orders row allocation between processes
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                start = conn.execute(
+                    "SELECT COALESCE(MAX(row) + 1, 0) FROM turns WHERE user_id = ?", (self.user_id,)
+                ).fetchone()[0]
+                if self._dim is None:
+                    self._dim = vectors.shape[1]
+                    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (str(self._dim),))
+                elif vectors.shape[1] != self._dim:
+                    raise ValueError(
+                        f"Embedding dimension {vectors.shape[1]} does not match the memory's {self._dim}; "
+                        f"use a new MEMORY_DB for a different embedding model"
+                    )
+                # Vectors are written before their rows commit, so a committed row always has one
+                self._map_vectors(start + len(texts))
+                self._vectors[start:start + len(texts)] = vectors
+                self._vectors.flush()
+                rows = list(range(start, start + len(texts)))
+                conn.executemany(
+                    "INSERT INTO turns (user_id, row, session_id, message_type, content, metadata, created)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(self.user_id, row, session_id, message_type, text, encoded, created) for row, text in zip(rows, texts)],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._refresh()
+        return rows
+
+    def _rows(self, key: _ScopeKey) -> Optional[np.ndarray]:
+        """Row numbers of a scope (None for the user's full history)."""
+        if key == (None, None):
+            return None
+        rows = self._scopes.get(key)
+        if not rows:
+            return np.empty(0, dtype=np.int64)
+        cached = self._arrays.get(key)
+        if cached is None or len(cached) != len(rows):
+            cached = self._arrays[key] = np.asarray(rows, dtype=np.int64)
+        return cached
+
+    def search_vector(
+        self,
+        vector: Any,
+        session_id: Optional[str] = None,
+        message_type: Optional[str] = None,
+        limit: int = 5,
+    ) -> List[Tuple[int, float]]:
+        """
+        Find the turns closest to an embedding.
+
+        Returns:
+            List of (row number, cosine similarity), best first
+        """
+        with self._lock:
+            self._refresh()
+            rows = self._rows((session_id, message_type))
+            count, vectors = self._count, self._vectors
+        if not count or vectors is None or (rows is not None and not len(rows)):
+            return []
+        target = np.asarray(vector, dtype=np.float32)
+        target = target / max(float(np.linalg.norm(target)), 1e-12)
+        if rows is None:
+            scores = vectors[:count] @ target
+        elif len(rows) * 4 < count:
+            # Gathering a small scope is cheaper than scoring every row
+            scores = vectors[rows] @ target
+        else:
+            scores = (vectors[:count] @ target)[rows]
+        k = min(limit, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        if rows is not None:
+            return [(int(rows[i]), float(scores[i])) for i in top]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def search(
+        self,
+        query: str,
+        session_id: Optional[str] = None,
+        message_type: Optional[str] = None,
+        limit: int = 5,
+        **kwargs: Any,
+    ) -> List[Dict[str, Any]]:
+        """
+        Search this user's turns by meaning.
+
+        Args:
+            query: Text to search for
+            session_id: Only search turns of this session
+            message_type: Only search turns of this message type
+            limit: Maximum number of results
+
+        Returns:
+            List of dicts with ``id``, ``content``, ``score``, ``session_id``, ``message_type``,
+            ``metadata`` and ``created_at``, best first
+        """
+        if not query or not query.strip():
+            return []
+        vector = self.embed_model.get_query_embedding(query)
+        return self.fetch(self.search_vector(vector, session_id, message_type, limit))
+
+    def fetch(self, hits: List[Tuple[int, float]]) -> List[Dict[str, Any]]:
+        """Load the stored turns for (row number, score) pairs, keeping their order."""
+        if not hits:
+            return []
+        placeholders = ",".join("?" * len(hits))
+        rows = self._connection().execute(
+            "SELECT row, session_id, message_type, content, metadata, created FROM turns"
+            f" WHERE user_id = ? AND row IN ({placeholders})",
+            [self.user_id] + [row for row, _ in hits],
+        ).fetchall()
+        by_row = {row[0]: row for row in rows}
+        results = []
+        for row, score in hits:
+            if row not in by_row:
+                continue
+            _, session_id, message_type, content, metadata, created = by_row[row]
+            results.append({
+                "id": row,
+                "content": content,
+                "score": score,
+                "session_id": session_id,
+                "message_type": message_type,
+                "metadata": json.loads(metadata),
+                "created_at": created,
+            })
+        return results
+
+    def recent(self, limit: int = 5, session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Return this user's most recent turns, newest first."""
+        with self._lock:
+            self._refresh()
+            rows = self._rows((session_id, None))
+            if rows is None:
+                rows = np.arange(self._count)
+        return self.fetch([(int(row), 1.0) for row in rows[::-1][:limit]])
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of turns, sessions and message types stored for this user."""
+        with self._lock:
+            self._refresh()
+            return {
+                "turns": self._count,
+                "sessions": sum(1 for s, t in self._scopes if s is not None and t is None),
+                "message_types": sum(1 for s, t in self._scopes if s is None and t is not None),
+                "dim": self._dim,
+                "path": self.path,
+            }
@@ -0,0 +1,240 @@
+"""
+Write-behind queue for conversation memory.
+
+Chat turns are queued on the response path and written to the memory backend
+by a background worker, which batches several turns into one ``add`` call,
+retries failed writes with jittered exponential backoff and can be flushed on
+demand (on conversation reset and on shutdown).
+"""
+
+import logging
+import math
+import queue
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of ``values`` (0.0 when empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, math.ceil(pct / 100.0 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+class MemoryWriter:
+    """Bounded write-behind queue that batches conversation turns into fewer memory writes."""
+
+    def __init__(
+        self,
+        get_memory: Callable[[], Any],
+        max_queue: int = 1000,
+        max_batch: int = 8,
+        max_wait: float = 0.5,
+        max_retries: int = 5,
+        backoff: float = 0.5,
+        max_backoff: float = 8.0,
+        enqueue_timeout: float = 0.05,
+        tracer: Any = None,
+    ):
+        """
+        Initialize the writer and start its background worker.
+
+        Args:
+            get_memory: Returns the memory backend (or None) when the worker needs it;
+                called from the worker thread so lazy connections stay off the response path
+            max_queue: Maximum number of queued turns; further turns are dropped
+            max_batch: Maximum number of turns combined into one batch
+            max_wait: Seconds to wait for more turns before writing a partial batch
+            max_retries: Attempts per write before the turns are given up on
+            backoff: Initial retry delay in seconds (doubled each attempt, with jitter)
+            max_backoff: Upper bound for the retry delay in seconds
+            enqueue_timeout: Seconds ``submit`` may block when the queue is full
+            tracer: Optional ``AgentTracer``; each write is recorded as a ``memory.add`` span
+        """
+        self.get_memory = get_memory
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.enqueue_timeout = enqueue_timeout
+        self.tracer = tracer
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._pending = 0
+        self._pending_cond = threading.Condition()
+        self._latencies = deque(maxlen=1000)
+        self._batch_sizes = deque(maxlen=1000)
+        self._counters = {
+            "enqueued": 0,
+            "dropped": 0,
+            "written_turns": 0,
+            "failed_turns": 0,
+            "add_calls": 0,
+            "retries": 0,
+        }
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="memory-writer", daemon=True)
+        self._worker.start()
+
+    def submit(self, messages: List[Dict[str, str]], metadata: Dict[str, Any]) -> bool:
+        """
+        Queue a conversation turn for writing.
+
+        Returns:
+            True if the turn was queued, False if the writer is closed or the queue stayed full
+        """
+        if self._closed:
+            return False
+        with self._pending_cond:
+            self._pending += 1
+        try:
+            self._queue.put((messages, metadata), timeout=self.enqueue_timeout)
+        except queue.Full:
+            self._done(1)
+            self._count("dropped")
+            logger.warning("Memory write queue is full; dropping conversation turn")
+            return False
+        self._count("enqueued")
+        return True
+
+    def flush(self, timeout: Optional[float] = 30.0) -> bool:
+        """
+        Block until every queued turn has been written (or given up on).
+
+        Returns:
+            True if the queue drained within ``timeout``
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._pending_cond:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    logger.warning(f"Memory flush timed out with {self._pending} turns pending")
+                    return False
+                self._pending_cond.wait(remaining)
+        return True
+
+    def close(self, timeout: Optional[float] = 30.0) -> bool:
+        """Flush pending turns and stop the background worker."""
+        if self._closed:
+            return True
+        self._closed = True
+        flushed = self.flush(timeout)
+        self._queue.put(_STOP)
+        self._worker.join(timeout)
+        return flushed
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return queue depth, batch size and write latency metrics."""
+        latencies = list(self._latencies)
+        batch_sizes = list(self._batch_sizes)
+        with self._pending_cond:
+            counters = dict(self._counters)
+        counters.update({
+            "queue_depth": self._queue.qsize(),
+            "batches": len(batch_sizes),
+            "avg_batch_size": sum(batch_sizes) / len(batch_sizes) if batch_sizes else 0.0,
+            "last_batch_size": batch_sizes[-1] if batch_sizes else 0,
+            "write_latency_avg": sum(latencies) / len(latencies) if latencies else 0.0,
+            "write_latency_p50": _percentile(latencies, 50),
+            "write_latency_p95": _percentile(latencies, 95),
+        })
+        return counters
+
+    def _count(self, name: str, amount: int = 1):
+        with self._pending_cond:
+            self._counters[name] += amount
+
+    def _done(self, turns: int):
+        with self._pending_cond:
+            self._pending -= turns
+            if not self._pending:
+                self._pending_cond.notify_all()
+
+    def _next_batch(self) -> Tuple[List[Tuple[List[Dict[str, str]], Dict[str, Any]]], bool]:
+        """Collect up to ``max_batch`` turns, waiting at most ``max_wait`` after the first."""
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=max(remaining, 0)) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    @staticmethod
+    def _group(batch: List[Tuple[List[Dict[str, str]], Dict[str, Any]]]) -> List[Tuple[List[Dict[str, str]], Dict[str, Any], int]]:
+        """Combine turns of the same session and message type into single writes."""
+        groups: Dict[Tuple[Any, Any], Tuple[List[Dict[str, str]], Dict[str, Any], int]] = {}
+        for messages, metadata in batch:
+            key = (metadata.get("session_id"), metadata.get("message_type"))
+            if key in groups:
+                combined, _, turns = groups[key]
+                groups[key] = (combined + list(messages), dict(metadata, turns=turns + 1), turns + 1)
+            else:
+                groups[key] = (list(messages), dict(metadata, turns=1), 1)
+        return list(groups.values())
+
+    def _write(self, memory: Any, messages: List[Dict[str, str]], metadata: Dict[str, Any]) -> bool:
+        """Write one combined entry, retrying with jittered exponential backoff."""
+        delay = self.backoff
+        for attempt in range(1, self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                if self.tracer is None:
+                    memory.add(messages=messages, metadata=metadata)
+                else:
+                    with self.tracer.span("memory.add", session_id=metadata.get("session_id"),
+                                          messages=len(messages), attempt=attempt):
+                        memory.add(messages=messages, metadata=metadata)
+                self._latencies.append(time.perf_counter() - start)
+                self._count("add_calls")
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.warning(f"Failed to store in memory after {attempt} attempts: {e}")
+                    return False
+                self._count("retries")
+                logger.debug(f"Memory write failed (attempt {attempt}), retrying in {delay:.2f}s: {e}")
+                time.sleep(delay * random.uniform(0.5, 1.5))
+                delay = min(delay * 2, self.max_backoff)
+        return False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if not batch:
+                continue
+            try:
+                memory = self.get_memory()
+                self._batch_sizes.append(len(batch))
+                for messages, metadata, turns in self._group(batch):
+                    if memory is None:
+                        continue
+                    if self._write(memory, messages, metadata):
+                        self._count("written_turns", turns)
+                    else:
+                        self._count("failed_turns", turns)
+            except Exception as e:
+                logger.warning(f"Memory writer error: {e}")
+                self._count("failed_turns", len(batch))
+            finally:
+                self._done(len(batch))
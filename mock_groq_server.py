@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Groq chat completions API, for testing the LLM gateway.
+
+Serves ``POST /openai/v1/chat/completions`` (plain and streamed) with configurable
+latency per model, injected failures and account rate limits. Rate-limited
+requests get 429 with ``Retry-After`` and the ``x-ratelimit-*`` headers Groq
+sends. Replies follow the ReAct answer format when the prompt asks for it, so
+the agent runs against the mock end to end:
+
+    python mock_groq_server.py --port 8001 --latency 0.5 --error-rate 0.05 --rpm 60
+    GROQ_API_BASE=http://127.0.0.1:8001/openai/v1 python agent_.py
+
+``GET /stats`` returns the request counts per model and status.
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+
+class MockGroqServer(ThreadingHTTPServer):
+    """HTTP server holding the mock's settings, rate-limit windows and counters."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        latency: float = 0.2,
+        model_latency: Optional[Dict[str, float]] = None,
+        jitter: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 5.0,
+        error_rate: float = 0.0,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        token_latency: float = 0.01,
+        seed: Optional[int] = None,
+    ):
+        """
+        Initialize the server.
+
+        Args:
+            address: (host, port) to listen on; port 0 picks a free one
+            latency: Seconds before the response starts
+            model_latency: Latency overrides per model, matched by substring (e.g. {"8b": 0.05})
+            jitter: Extra latency drawn uniformly from [0, jitter]
+            slow_rate: Share of requests that take ``slow_latency`` instead (tail latency)
+            slow_latency: Latency of slow requests
+            error_rate: Share of requests answered with 503
+            requests_per_minute: Request limit per model over a sliding minute (0 disables)
+            tokens_per_minute: Token limit per model over a sliding minute (0 disables)
+            token_latency: Seconds between streamed chunks
+            seed: Random seed for reproducible failures
+        """
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.model_latency = model_latency or {}
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.token_latency = token_latency
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.windows: Dict[str, Deque[Tuple[float, int]]] = {}
+        self.counts: Counter = Counter()
+
+    def handle_error(self, request: Any, client_address: Any):
+        # Clients dropping connections (e.g. a losing hedged request) are expected
+        if not isinstance(sys.exc_info()[1], (ConnectionError, TimeoutError)):
+            super().handle_error(request, client_address)
+
+    @property
+    def base_url(self) -> str:
+        """API base to point the client at (``GROQ_API_BASE``)."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/openai/v1"
+
+    def latency_for(self, model: str) -> float:
+        """Response latency of one request to ``model``."""
+        latency = self.latency
+        for pattern, value in self.model_latency.items():
+            if pattern in model:
+                latency = value
+        with self.lock:
+            if self.slow_rate and self.random.random() < self.slow_rate:
+                latency = self.slow_latency
+            return latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def fails(self) -> bool:
+        """Whether to answer this request with an injected 503."""
+        with self.lock:
+            return bool(self.error_rate) and self.random.random() < self.error_rate
+
+    def admit(self, model: str, tokens: int) -> Tuple[bool, Dict[str, str]]:
+        """
+        Count a request against the model's sliding-minute limits.
+
+        Returns:
+            Tuple of (admitted, rate-limit headers)
+        """
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.setdefault(model, deque())
+            while window and window[0][0] <= now - 60:
+                window.popleft()
+            used_requests = len(window)
+            used_tokens = sum(count for _, count in window)
+            reset = (window[0][0] + 60 - now) if window else 0.0
+            over_requests = self.requests_per_minute and used_requests + 1 > self.requests_per_minute
+            over_tokens = self.tokens_per_minute and used_tokens + tokens > self.tokens_per_minute
+            admitted = not (over_requests or over_tokens)
+            if admitted:
+                window.append((now, tokens))
+                used_requests += 1
+                used_tokens += tokens
+        headers = {}
+        if self.requests_per_minute:
+            headers["x-ratelimit-limit-requests"] = str(self.requests_per_minute)
+            headers["x-ratelimit-remaining-requests"] = str(max(self.requests_per_minute - used_requests, 0))
+            headers["x-ratelimit-reset-requests"] = f"{reset:.2f}s"
+        if self.tokens_per_minute:
+            headers["x-ratelimit-limit-tokens"] = str(self.tokens_per_minute)
+            headers["x-ratelimit-remaining-tokens"] = str(max(self.tokens_per_minute - used_tokens, 0))
+            headers["x-ratelimit-reset-tokens"] = f"{reset:.2f}s"
+        if not admitted:
+            # Time until the oldest request leaves the window
+            headers["retry-after"] = str(max(int(reset + 0.999), 1))
+        return admitted, headers
+
+
+def mock_reply(messages: List[Dict[str, Any]], model: str) -> str:
+    """Reply to a conversation; ReAct prompts get a final answer in ReAct format."""
+    question = ""
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            question = str(message.get("content") or "")
+            break
+    system = str(messages[0].get("content") or "") if messages and messages[0].get("role") == "system" else ""
+    answer = f"This is a mock response from {model} to: {question.strip()[:200]}"
+    if "Action Input" in system:
+        return f"Thought: I can answer without using any tools.\nAnswer: {answer}"
+    return answer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: MockGroqServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any):
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            with self.server.lock:
+                counts = {f"{model} {status}": count for (model, status), count in self.server.counts.items()}
+            self._send_json(200, counts)
+        else:
+            self._send_json(404, {"error": {"message": f"No route for {self.path}"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "Invalid JSON"}})
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"No route for {self.path}"}})
+            return
+        model = str(request.get("model") or "unknown")
+        messages = request.get("messages") or []
+        prompt_tokens = sum(len(str(m.get("content") or "")) for m in messages) // 4 + 4 * len(messages)
+        reply = mock_reply(messages, model)
+        completion_tokens = len(reply) // 4 + 1
+
+        admitted, headers = self.server.admit(model, prompt_tokens + completion_tokens)
+        if not admitted:
+            self._count(model, 429)
+            self._send_json(429, {"error": {"message": f"Rate limit reached for model {model}",
+                                            "type": "tokens", "code": "rate_limit_exceeded"}}, headers)
+            return
+        time.sleep(self.server.latency_for(model))
+        if self.server.fails():
+            self._count(model, 503)
+            self._send_json(503, {"error": {"message": "Service unavailable", "type": "internal_server_error"}})
+            return
+        self._count(model, 200)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        if not request.get("stream"):
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            }, headers)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.close_connection = True
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            delta = {"content": word if i == 0 else " " + word}
+            if i == 0:
+                delta["role"] = "assistant"
+            self._event({"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                         "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+            if self.server.token_latency:
+                time.sleep(self.server.token_latency)
+        self._event({"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "x_groq": {"usage": usage}})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _event(self, payload: Dict[str, Any]):
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _count(self, model: str, status: int):
+        with self.server.lock:
+            self.server.counts[(model, status)] += 1
+
+
+def start_mock_server(host: str = "127.0.0.1", port: int = 0, **kwargs: Any) -> MockGroqServer:
+    """Start the mock in a background thread; call ``shutdown()`` on the result to stop it."""
+    server = MockGroqServer((host, port), **kwargs)
+    threading.Thread(target=server.serve_forever, name="mock-groq", daemon=True).start()
+    return server
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Local mock of the Groq chat completions API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before each response starts")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="PATTERN=SECONDS",
+                        help="Latency for models containing PATTERN, e.g. 8b=0.05 (repeatable)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random latency up to this many seconds")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Share of requests that are slow")
+    parser.add_argument("--slow-latency", type=float, default=5.0, help="Latency of slow requests")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests failing with 503")
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute per model (0: unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="Tokens per minute per model (0: unlimited)")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Seconds between streamed chunks")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    model_latency = {}
+    for entry in args.model_latency:
+        pattern, _, seconds = entry.partition("=")
+        model_latency[pattern] = float(seconds)
+    server = MockGroqServer(
+        (args.host, args.port),
+        latency=args.latency,
+        model_latency=model_latency,
+        jitter=args.jitter,
+        slow_rate=args.slow_rate,
+        slow_latency=args.slow_latency,
+        error_rate=args.error_rate,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        token_latency=args.token_latency,
+        seed=args.seed,
+    )
+    print(f"Mock Groq API at {server.base_url} (set GROQ_API_BASE to this)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,641 @@
+"""
+Indexed movie catalog backed by a compact SQLite database.
+
+The catalog source is a JSONL or CSV file (see ``data/movies.jsonl``). It is
+compiled once into a SQLite database with indexes on the exact title, the
+normalized title, the year and the rating, a trigram index for "did you mean"
+suggestions, and inverted indexes on director, cast member and genre for
+structured search. The database is rebuilt automatically when the source changes.
+
+Usage:
+    python movie_catalog.py build data/movies.jsonl storage/movies.sqlite
+"""
+
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import unicodedata
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = "3"
+
+# Suggestion candidates come from at most MAX_QUERY_GRAMS of the query's rarest
+# trigrams, scanning at most MAX_POSTINGS postings, and the best MAX_CANDIDATES
+# of those are re-ranked by exact trigram similarity.
+MAX_QUERY_GRAMS = 8
+MAX_POSTINGS = 4000
+MAX_CANDIDATES = 50
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+_ARTICLES = ("the ", "a ", "an ")
+_NAME_STOPWORDS = {"the", "and", "jr", "sr"}
+MAX_SEARCH_LIMIT = 50
+
+# Search totals are counted exactly up to MAX_COUNT; larger result sets report MAX_COUNT + 1.
+MAX_COUNT = 1000
+
+# The most common genres get a bit in movies.genre_mask, so genre filters are
+# checked while scanning the year or rating index instead of joining a huge posting list.
+MAX_GENRE_BITS = 62
+
+
+def normalize_title(title: str) -> str:
+    """Normalize a title for matching: case, accents, punctuation and leading articles."""
+    text = unicodedata.normalize("NFKD", title)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = text.replace("&", " and ")
+    text = _PUNCTUATION.sub(" ", text)
+    text = _WHITESPACE.sub(" ", text).strip()
+    for article in _ARTICLES:
+        if text.startswith(article):
+            text = text[len(article):]
+            break
+    return text
+
+
+def normalize_name(name: str) -> str:
+    """Normalize a person or genre name for matching: case, accents and punctuation."""
+    text = unicodedata.normalize("NFKD", name)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def name_keys(name: str) -> Set[str]:
+    """Index keys for a person: the full name plus each name part ("nolan")."""
+    full = normalize_name(name)
+    if not full:
+        return set()
+    parts = {part for part in full.split() if len(part) > 1 and part not in _NAME_STOPWORDS}
+    return {full} | parts
+
+
+def _gram_set(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def trigrams(text: str) -> List[str]:
+    """Return the distinct padded character trigrams of a normalized string."""
+    return sorted(_gram_set(text))
+
+
+def _parse_rating(value: Any) -> Optional[float]:
+    if value in (None, ""):
+        return None
+    if isinstance(value, str):
+        value = value.split("/")[0]
+    return float(value)
+
+
+def _split_list(value: Any, separator: str) -> List[str]:
+    if value in (None, ""):
+        return []
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [part.strip() for part in str(value).split(separator) if part.strip()]
+
+
+def read_source(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream movie records from a JSONL or CSV file.
+
+    CSV files use the same column names as the JSONL records; ``cast`` and
+    ``aliases`` are ``|``-separated.
+    """
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                row["cast"] = _split_list(row.get("cast"), "|")
+                row["aliases"] = _split_list(row.get("aliases"), "|")
+                yield row
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    logger.warning(f"Skipping malformed catalog line {line_number}: {e}")
+
+
+def _source_fingerprint(path: str) -> str:
+    digest = hashlib.sha256(SCHEMA_VERSION.encode())
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_stat(path: str) -> str:
+    """Cheap change check: size and modification time of the source file."""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def build_catalog(source_path: str, db_path: str, batch_size: int = 5000) -> int:
+    """
+    Compile a catalog source file into an indexed SQLite database.
+
+    The database is written to a temporary file and moved into place, so readers
+    never see a half-built catalog.
+
+    Returns:
+        Number of movies in the catalog
+    """
+    directory = os.path.dirname(os.path.abspath(db_path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{db_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    conn.executescript("""
+        PRAGMA journal_mode=OFF;
+        PRAGMA synchronous=OFF;
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE movies (
+            id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL,
+            norm_title TEXT NOT NULL,
+            year INTEGER,
+            director TEXT,
+            genre TEXT,
+            rating REAL,
+            plot TEXT,
+            cast_json TEXT,
+            genre_mask INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE genre_bits (key TEXT PRIMARY KEY, bit INTEGER NOT NULL);
+    """)
+
+    # Postings are collected in temporary tables and copied, sorted, into clustered
+    # (WITHOUT ROWID) tables at the end, so each index is its own table.
+    conn.executescript("""
+        CREATE TEMP TABLE title_postings (key TEXT NOT NULL, movie_id INTEGER NOT NULL);
+        CREATE TEMP TABLE gram_postings (gram TEXT NOT NULL, movie_id INTEGER NOT NULL);
+        CREATE TEMP TABLE people_postings (role TEXT NOT NULL, key TEXT NOT NULL, movie_id INTEGER NOT NULL);
+        CREATE TEMP TABLE genre_postings (key TEXT NOT NULL, movie_id INTEGER NOT NULL);
+    """)
+
+    count = 0
+    genre_bits: Dict[str, int] = {}
+    movies, titles, grams, people, genres = [], [], [], [], []
+
+    def flush():
+        conn.executemany("INSERT INTO movies VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", movies)
+        conn.executemany("INSERT INTO title_postings VALUES (?, ?)", titles)
+        conn.executemany("INSERT INTO gram_postings VALUES (?, ?)", grams)
+        conn.executemany("INSERT INTO people_postings VALUES (?, ?, ?)", people)
+        conn.executemany("INSERT INTO genre_postings VALUES (?, ?)", genres)
+        for rows in (movies, titles, grams, people, genres):
+            rows.clear()
+
+    for record in read_source(source_path):
+        title = str(record.get("title", "")).strip()
+        if not title:
+            continue
+        count += 1
+        norm = normalize_title(title)
+        genre = record.get("genre") or ""
+        if isinstance(genre, list):
+            genre = ", ".join(genre)
+        cast = _split_list(record.get("cast"), "|")
+        director = record.get("director") or ""
+        year = record.get("year")
+
+        # Inverted indexes for structured search
+        genre_mask = 0
+        for genre_key in {normalize_name(g) for g in _split_list(genre, ",")}:
+            genres.append((genre_key, count))
+            if genre_key not in genre_bits and len(genre_bits) < MAX_GENRE_BITS:
+                genre_bits[genre_key] = len(genre_bits)
+            if genre_key in genre_bits:
+                genre_mask |= 1 << genre_bits[genre_key]
+        for person in _split_list(director, ","):
+            people.extend(("director", key, count) for key in name_keys(person))
+        for member in cast:
+            people.extend(("cast", key, count) for key in name_keys(member))
+
+        movies.append((
+            count, title, norm, int(year) if year not in (None, "") else None,
+            director, genre, _parse_rating(record.get("rating")),
+            record.get("plot"), json.dumps(cast), genre_mask,
+        ))
+        # Exact (case-insensitive) and normalized keys for the title and its aliases
+        keys = {title.lower(), norm}
+        for alias in _split_list(record.get("aliases"), "|"):
+            keys.update({alias.lower(), normalize_title(alias)})
+        titles.extend((key, count) for key in keys)
+        grams.extend((gram, count) for gram in _gram_set(norm))
+        if len(movies) >= batch_size:
+            flush()
+    flush()
+    conn.executemany("INSERT INTO genre_bits VALUES (?, ?)", genre_bits.items())
+
+    conn.executescript("""
+        CREATE INDEX idx_movies_norm_title ON movies(norm_title);
+        CREATE INDEX idx_movies_year ON movies(year, rating);
+        CREATE INDEX idx_movies_rating ON movies(rating);
+
+        CREATE TABLE titles (
+            key TEXT NOT NULL, movie_id INTEGER NOT NULL, PRIMARY KEY (key, movie_id)
+        ) WITHOUT ROWID;
+        INSERT OR IGNORE INTO titles SELECT key, movie_id FROM title_postings ORDER BY key, movie_id;
+
+        CREATE TABLE people (
+            role TEXT NOT NULL, key TEXT NOT NULL, movie_id INTEGER NOT NULL,
+            PRIMARY KEY (role, key, movie_id)
+        ) WITHOUT ROWID;
+        INSERT OR IGNORE INTO people
+            SELECT role, key, movie_id FROM people_postings ORDER BY role, key, movie_id;
+
+        CREATE TABLE genres (
+            key TEXT NOT NULL, movie_id INTEGER NOT NULL, PRIMARY KEY (key, movie_id)
+        ) WITHOUT ROWID;
+        INSERT OR IGNORE INTO genres SELECT key, movie_id FROM genre_postings ORDER BY key, movie_id;
+
+        CREATE TABLE grams (
+            gram TEXT NOT NULL, movie_id INTEGER NOT NULL, PRIMARY KEY (gram, movie_id)
+        ) WITHOUT ROWID;
+        INSERT OR IGNORE INTO grams SELECT gram, movie_id FROM gram_postings ORDER BY gram, movie_id;
+        CREATE TABLE gram_df (gram TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID;
+        INSERT INTO gram_df SELECT gram, COUNT(*) FROM grams GROUP BY gram;
+
+        DROP TABLE title_postings;
+        DROP TABLE people_postings;
+        DROP TABLE genre_postings;
+        DROP TABLE gram_postings;
+        ANALYZE;
+    """)
+    conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+        ("schema_version", SCHEMA_VERSION),
+        ("source_fingerprint", _source_fingerprint(source_path)),
+        ("source_stat", _source_stat(source_path)),
+        ("movie_count", str(count)),
+    ])
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    os.replace(tmp_path, db_path)
+    logger.info(f"Built movie catalog with {count} movies at {db_path}")
+    return count
+
+
+class MovieCatalog:
+    """Read-only, thread-safe lookups against a compiled movie catalog."""
+
+    def __init__(self, db_path: str, source_path: str = None):
+        """
+        Open the catalog, (re)building it first if the source file changed.
+
+        Args:
+            db_path: Path of the compiled SQLite catalog
+            source_path: JSONL or CSV catalog source (optional if the database exists)
+        """
+        self.db_path = db_path
+        self.source_path = source_path
+        self._local = threading.local()
+        self._genre_bits: Optional[Dict[str, int]] = None
+        if source_path and self._needs_build():
+            build_catalog(source_path, db_path)
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"Movie catalog not found: {db_path}")
+
+    def _needs_build(self) -> bool:
+        if not os.path.exists(self.db_path):
+            return True
+        try:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            try:
+                meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return True
+        if meta.get("schema_version") != SCHEMA_VERSION:
+            return True
+        stat = _source_stat(self.source_path)
+        if meta.get("source_stat") == stat:
+            return False
+        if meta.get("source_fingerprint") != _source_fingerprint(self.source_path):
+            return True
+        # Touched but unchanged: record the new stat so later opens skip the hash
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            try:
+                with conn:
+                    conn.execute("UPDATE meta SET value = ? WHERE key = 'source_stat'", (stat,))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.debug(f"Could not refresh catalog source stat: {e}")
+        return False
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's read-only connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            conn.row_factory = sqlite3.Row
+            # Read through a memory map so worker processes share the catalog's pages
+            conn.execute("PRAGMA mmap_size=268435456")
+            self._local.conn = conn
+        return conn
+
+    @property
+    def fingerprint(self) -> str:
+        """Content hash of the catalog source, for caches derived from the catalog."""
+        row = self._connection().execute(
+            "SELECT value FROM meta WHERE key = 'source_fingerprint'"
+        ).fetchone()
+        return row[0]
+
+    @property
+    def genre_bits(self) -> Dict[str, int]:
+        """Genres that have a bit in ``movies.genre_mask``."""
+        if self._genre_bits is None:
+            self._genre_bits = dict(self._connection().execute("SELECT key, bit FROM genre_bits").fetchall())
+        return self._genre_bits
+
+    @staticmethod
+    def _to_movie(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "id": row["id"],
+            "title": row["title"],
+            "year": row["year"],
+            "director": row["director"],
+            "cast": json.loads(row["cast_json"] or "[]"),
+            "genre": row["genre"],
+            "rating": row["rating"],
+            "plot": row["plot"],
+        }
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM movies").fetchone()[0]
+
+    def get_by_ids(self, movie_ids: List[int]) -> List[Dict[str, Any]]:
+        """Fetch movies by id, preserving the order of ``movie_ids``."""
+        if not movie_ids:
+            return []
+        placeholders = ",".join("?" * len(movie_ids))
+        rows = self._connection().execute(
+            f"SELECT * FROM movies WHERE id IN ({placeholders})", list(movie_ids)
+        ).fetchall()
+        by_id = {row["id"]: self._to_movie(row) for row in rows}
+        return [by_id[movie_id] for movie_id in movie_ids if movie_id in by_id]
+
+    def get(self, title: str, year: int = None) -> Optional[Dict[str, Any]]:
+        """
+        Look up a movie by exact or normalized title (or alias).
+
+        Args:
+            title: Movie title as typed by the user
+            year: Release year, to disambiguate remakes (optional)
+
+        Returns:
+            The best-rated matching movie, or None
+        """
+        keys = [title.lower().strip(), normalize_title(title)]
+        sql = (
+            "SELECT m.* FROM titles t JOIN movies m ON m.id = t.movie_id "
+            "WHERE t.key = ?" + (" AND m.year = ?" if year else "") +
+            " ORDER BY m.rating IS NULL, m.rating DESC LIMIT 1"
+        )
+        conn = self._connection()
+        for key in keys:
+            row = conn.execute(sql, (key, year) if year else (key,)).fetchone()
+            if row is not None:
+                return self._to_movie(row)
+        return None
+
+    def by_year(self, year: int, limit: int = 20) -> List[Dict[str, Any]]:
+        """Return the best-rated movies released in ``year``."""
+        rows = self._connection().execute(
+            "SELECT * FROM movies WHERE year = ? ORDER BY rating DESC LIMIT ?", (year, limit)
+        ).fetchall()
+        return [self._to_movie(row) for row in rows]
+
+    def top_titles(self, limit: int = 15) -> List[str]:
+        """Return the titles of the best-rated movies."""
+        rows = self._connection().execute(
+            "SELECT title FROM movies ORDER BY rating DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [row["title"] for row in rows]
+
+    def _where(
+        self,
+        director: str = None,
+        cast: List[str] = None,
+        genres: List[str] = None,
+        year_from: int = None,
+        year_to: int = None,
+        min_rating: float = None,
+    ) -> Tuple[str, List[Any]]:
+        """Build the WHERE clause and parameters for a structured movie filter."""
+        clauses, params = [], []
+        if director:
+            clauses.append("m.id IN (SELECT movie_id FROM people WHERE role = 'director' AND key = ?)")
+            params.append(normalize_name(director))
+        for member in cast or []:
+            clauses.append("m.id IN (SELECT movie_id FROM people WHERE role = 'cast' AND key = ?)")
+            params.append(normalize_name(member))
+        genre_mask = 0
+        for genre in genres or []:
+            key = normalize_name(genre)
+            if key in self.genre_bits:
+                genre_mask |= 1 << self.genre_bits[key]
+            else:
+                clauses.append("m.id IN (SELECT movie_id FROM genres WHERE key = ?)")
+                params.append(key)
+        if genre_mask:
+            clauses.append("(m.genre_mask & ?) = ?")
+            params.extend([genre_mask, genre_mask])
+        if year_from:
+            clauses.append("m.year >= ?")
+            params.append(int(year_from))
+        if year_to:
+            clauses.append("m.year <= ?")
+            params.append(int(year_to))
+        if min_rating:
+            clauses.append("m.rating >= ?")
+            params.append(float(min_rating))
+        return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+    def search(
+        self,
+        director: str = None,
+        cast: List[str] = None,
+        genres: List[str] = None,
+        year_from: int = None,
+        year_to: int = None,
+        min_rating: float = None,
+        sort_by: str = "rating",
+        limit: int = 10,
+        offset: int = 0,
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Find movies matching every given criterion.
+
+        Args:
+            director: Director name or surname
+            cast: Cast members that must all appear in the movie
+            genres: Genres that must all apply to the movie
+            year_from: Earliest release year (inclusive)
+            year_to: Latest release year (inclusive)
+            min_rating: Minimum rating out of 10
+            sort_by: "rating" (best first) or "year" (newest first)
+            limit: Page size, capped at MAX_SEARCH_LIMIT
+            offset: Number of results to skip
+
+        Returns:
+            Tuple of (total number of matches, capped at MAX_COUNT + 1; movies on this page)
+        """
+        where, params = self._where(director, cast, genres, year_from, year_to, min_rating)
+        order = "m.year DESC, m.rating DESC" if sort_by == "year" else "m.rating DESC, m.year DESC"
+        limit = max(1, min(int(limit), MAX_SEARCH_LIMIT))
+        conn = self._connection()
+        total = conn.execute(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM movies m {where} LIMIT ?)", params + [MAX_COUNT + 1]
+        ).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT m.* FROM movies m {where} ORDER BY {order} LIMIT ? OFFSET ?",
+            params + [limit, max(0, int(offset))],
+        ).fetchall()
+        return total, [self._to_movie(row) for row in rows]
+
+    def matching_ids(self, **filters: Any) -> List[int]:
+        """Return the ids of all movies matching the ``search`` filters, in id order."""
+        where, params = self._where(**filters)
+        rows = self._connection().execute(f"SELECT m.id FROM movies m {where} ORDER BY m.id", params)
+        return [row[0] for row in rows]
+
+    def iter_movies(self, batch_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        """Stream the whole catalog in id order, ``batch_size`` movies at a time."""
+        conn = self._connection()
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                "SELECT * FROM movies WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            yield [self._to_movie(row) for row in rows]
+            last_id = rows[-1]["id"]
+
+    def suggest(self, title: str, limit: int = 5, min_similarity: float = 0.3) -> List[str]:
+        """
+        Suggest titles for a query that did not match exactly.
+
+        Titles that start with the normalized query come first, then titles that
+        contain it, then titles ranked by trigram (Jaccard) similarity.
+        """
+        norm = normalize_title(title)
+        if not norm:
+            return []
+        conn = self._connection()
+        suggestions: List[str] = []
+
+        # Prefix matches are a range scan on the normalized-title index
+        rows = conn.execute(
+            "SELECT title FROM movies WHERE norm_title >= ? AND norm_title < ? "
+            "ORDER BY rating DESC LIMIT ?",
+            (norm, norm + "\uffff", limit),
+        ).fetchall()
+        for row in rows:
+            if row["title"] not in suggestions:
+                suggestions.append(row["title"])
+        if len(suggestions) >= limit:
+            return suggestions[:limit]
+
+        query_grams = trigrams(norm)
+        query_set = set(query_grams)
+        placeholders = ",".join("?" * len(query_grams))
+        gram_dfs = conn.execute(
+            f"SELECT gram, df FROM gram_df WHERE gram IN ({placeholders}) ORDER BY df", query_grams
+        ).fetchall()
+
+        # A title containing the query has all of its unpadded trigrams, so the
+        # postings of the rarest one hold every containing title. When even that
+        # gram is too common to scan within MAX_POSTINGS, the contains pass is
+        # skipped and such titles can only come from the similarity ranking below.
+        inner = {norm[i:i + 3] for i in range(len(norm) - 2)}
+        dfs = {row["gram"]: row["df"] for row in gram_dfs}
+        rarest = min(inner, key=dfs.get) if inner and inner <= dfs.keys() else None
+        if rarest is not None and dfs[rarest] <= MAX_POSTINGS:
+            rows = conn.execute(
+                "SELECT title FROM movies WHERE id IN (SELECT movie_id FROM grams WHERE gram = ?) "
+                "AND instr(norm_title, ?) > 0 ORDER BY rating DESC LIMIT ?",
+                (rarest, norm, limit),
+            ).fetchall()
+            for row in rows:
+                if row["title"] not in suggestions:
+                    suggestions.append(row["title"])
+            if len(suggestions) >= limit:
+                return suggestions[:limit]
+
+        # Use the rarest grams until the postings budget is spent; common grams
+        # ("the", "of") would only add scanning work, not discriminating power.
+        rare_grams, postings = [], 0
+        for row in gram_dfs[:MAX_QUERY_GRAMS]:
+            if rare_grams and postings + row["df"] > MAX_POSTINGS:
+                break
+            rare_grams.append(row["gram"])
+            postings += row["df"]
+        if not rare_grams:
+            return suggestions
+        placeholders = ",".join("?" * len(rare_grams))
+        candidates = [
+            row["movie_id"] for row in conn.execute(
+                f"SELECT movie_id, COUNT(*) AS hits FROM "
+                f"(SELECT movie_id FROM grams WHERE gram IN ({placeholders}) LIMIT ?) "
+                "GROUP BY movie_id ORDER BY hits DESC LIMIT ?",
+                rare_grams + [MAX_POSTINGS, MAX_CANDIDATES],
+            )
+        ]
+        if not candidates:
+            return suggestions
+
+        # Exact Jaccard similarity over the full trigram sets of the candidates
+        placeholders = ",".join("?" * len(candidates))
+        rows = conn.execute(
+            f"SELECT title, norm_title, rating FROM movies WHERE id IN ({placeholders})", candidates
+        ).fetchall()
+        ranked = []
+        for row in rows:
+            title_grams = _gram_set(row["norm_title"])
+            shared = len(query_set & title_grams)
+            similarity = shared / (len(query_set) + len(title_grams) - shared)
+            ranked.append((similarity, row["rating"] or 0, row["title"]))
+        ranked.sort(reverse=True)
+        for similarity, _, candidate in ranked:
+            if similarity < min_similarity or len(suggestions) >= limit:
+                break
+            if candidate not in suggestions:
+                suggestions.append(candidate)
+        return suggestions
+
+
+def main(argv: List[str]) -> int:
+    """Command-line entry point: build a catalog database from a source file."""
+    if len(argv) != 3 or argv[0] != "build":
+        print("Usage: python movie_catalog.py build <source.jsonl|source.csv> <catalog.sqlite>")
+        return 2
+    logging.basicConfig(level=logging.INFO)
+    build_catalog(argv[1], argv[2])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
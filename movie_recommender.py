@@ -0,0 +1,209 @@
+"""
+Semantic movie recommendations over the movie catalog.
+
+Every movie's title, genre, director, cast and plot are embedded once with the
+agent's embedding model and stored as a contiguous, L2-normalized float32
+matrix on disk (``movie_vectors.npy``), memory-mapped on load. A query is a
+single matrix-vector product over the (optionally filtered) rows followed by a
+partial sort for the top k.
+
+Usage:
+    python movie_recommender.py build [catalog.sqlite] [persist_dir]
+"""
+
+import json
+import logging
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from movie_catalog import MovieCatalog
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "movie_vectors.npy"
+IDS_FILE = "movie_vector_ids.npy"
+META_FILE = "movie_vectors.json"
+
+
+def movie_text(movie: Dict[str, Any]) -> str:
+    """The text embedded for a movie."""
+    return (
+        f"{movie['title']}. Genre: {movie['genre']}. Directed by {movie['director']}. "
+        f"Starring {', '.join(movie['cast'])}. {movie['plot'] or ''}"
+    )
+
+
+class MovieRecommender:
+    """Nearest-neighbour movie recommendations from a persisted embedding matrix."""
+
+    def __init__(self, catalog: MovieCatalog, embed_model: Any, persist_dir: str, batch_size: int = 256):
+        """
+        Initialize the recommender.
+
+        Args:
+            catalog: Movie catalog to recommend from
+            embed_model: Embedding model used for movie texts and free-text queries
+            persist_dir: Directory where the embedding matrix is stored
+            batch_size: Number of movies embedded per batch when building
+        """
+        self.catalog = catalog
+        self.embed_model = embed_model
+        self.persist_dir = persist_dir
+        self.batch_size = batch_size
+        self.vectors: Optional[np.ndarray] = None
+        self.ids: Optional[np.ndarray] = None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.persist_dir, name)
+
+    def _expected_meta(self) -> Dict[str, Any]:
+        return {
+            "catalog_fingerprint": self.catalog.fingerprint,
+            "embed_model": getattr(self.embed_model, "model_name", type(self.embed_model).__name__),
+        }
+
+    def load_or_build(self) -> "MovieRecommender":
+        """Memory-map the persisted matrix, rebuilding it if the catalog or model changed."""
+        try:
+            with open(self._path(META_FILE), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+        expected = self._expected_meta()
+        if any(meta.get(key) != value for key, value in expected.items()):
+            self.build()
+        else:
+            self.vectors = np.load(self._path(VECTORS_FILE), mmap_mode="r")
+            self.ids = np.load(self._path(IDS_FILE))
+            logger.info(f"Loaded {len(self.ids)} movie vectors from {self.persist_dir}")
+        return self
+
+    def build(self):
+        """Embed every movie in the catalog and persist the normalized matrix."""
+        os.makedirs(self.persist_dir, exist_ok=True)
+        count = len(self.catalog)
+        vectors_tmp = self._path(VECTORS_FILE + ".tmp")
+        matrix = None
+        ids = np.empty(count, dtype=np.int64)
+        row = 0
+        for movies in self.catalog.iter_movies(self.batch_size):
+            embeddings = np.asarray(
+                self.embed_model.get_text_embedding_batch([movie_text(m) for m in movies]),
+                dtype=np.float32,
+            )
+            if matrix is None:
+                # Written straight to disk so peak memory stays at one batch
+                matrix = np.lib.format.open_memmap(
+                    vectors_tmp, mode="w+", dtype=np.float32, shape=(count, embeddings.shape[1])
+                )
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            matrix[row:row + len(movies)] = embeddings / np.maximum(norms, 1e-12)
+            ids[row:row + len(movies)] = [m["id"] for m in movies]
+            row += len(movies)
+
+        if matrix is None:
+            raise ValueError("Cannot build recommendations for an empty movie catalog")
+        matrix.flush()
+        del matrix
+        np.save(self._path(IDS_FILE), ids)
+        os.replace(vectors_tmp, self._path(VECTORS_FILE))
+        with open(self._path(META_FILE), "w", encoding="utf-8") as f:
+            json.dump(dict(self._expected_meta(), count=count), f, indent=2)
+
+        self.vectors = np.load(self._path(VECTORS_FILE), mmap_mode="r")
+        self.ids = ids
+        logger.info(f"Embedded {count} movies for recommendations")
+
+    def _rows_for_ids(self, movie_ids: List[int]) -> np.ndarray:
+        """Map catalog ids to matrix rows (ids are stored in ascending order)."""
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        rows = np.searchsorted(self.ids, movie_ids)
+        rows = np.clip(rows, 0, len(self.ids) - 1)
+        return rows[self.ids[rows] == movie_ids]
+
+    def recommend(
+        self,
+        title: str = None,
+        query: str = None,
+        top_k: int = 5,
+        **filters: Any,
+    ) -> Tuple[Optional[Dict[str, Any]], List[Tuple[Dict[str, Any], float]]]:
+        """
+        Find the movies most similar to a title or a free-text description.
+
+        Args:
+            title: Movie to find similar movies for
+            query: Free-text description (used when no title is given)
+            top_k: Number of recommendations
+            **filters: Catalog filters (genres, year_from, year_to, min_rating, director, cast)
+
+        Returns:
+            Tuple of (the seed movie or None, list of (movie, cosine similarity))
+        """
+        if self.vectors is None:
+            raise RuntimeError("Recommender is not loaded; call load_or_build() first")
+
+        seed = None
+        if title:
+            seed = self.catalog.get(title)
+            if seed is None:
+                return None, []
+            seed_rows = self._rows_for_ids([seed["id"]])
+            if not len(seed_rows):
+                return seed, []
+            target = np.asarray(self.vectors[seed_rows[0]])
+        elif query:
+            target = np.asarray(self.embed_model.get_query_embedding(query), dtype=np.float32)
+            target /= max(float(np.linalg.norm(target)), 1e-12)
+        else:
+            raise ValueError("Provide a title or a query")
+
+        active = {key: value for key, value in filters.items() if value}
+        if active:
+            rows = self._rows_for_ids(self.catalog.matching_ids(**active))
+            if not len(rows):
+                return seed, []
+            scores = self.vectors[rows] @ target
+        else:
+            rows = None
+            scores = self.vectors @ target
+
+        if seed is not None:
+            # Never recommend the seed movie itself
+            seed_row = self._rows_for_ids([seed["id"]])[0]
+            if rows is None:
+                scores[seed_row] = -np.inf
+            else:
+                scores[rows == seed_row] = -np.inf
+
+        k = min(top_k, len(scores))
+        if k <= 0:
+            return seed, []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top = top[np.isfinite(scores[top])]
+        matrix_rows = top if rows is None else rows[top]
+        movies = self.catalog.get_by_ids([int(self.ids[r]) for r in matrix_rows])
+        return seed, list(zip(movies, (float(scores[i]) for i in top)))
+
+
+def main(argv: List[str]) -> int:
+    """Command-line entry point: embed the catalog ahead of time."""
+    if not argv or argv[0] != "build":
+        print("Usage: python movie_recommender.py build [catalog.sqlite] [persist_dir]")
+        return 2
+    from fast_embedding import create_embed_model
+
+    logging.basicConfig(level=logging.INFO)
+    db_path = argv[1] if len(argv) > 1 else os.path.join("storage", "movies.sqlite")
+    persist_dir = argv[2] if len(argv) > 2 else os.path.dirname(db_path) or "."
+    embed_model = create_embed_model()
+    MovieRecommender(MovieCatalog(db_path), embed_model, persist_dir).build()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
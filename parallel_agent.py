@@ -0,0 +1,425 @@
+"""
+Function-calling agent that runs independent tool calls concurrently.
+
+A ReAct agent takes one LLM step per tool call, so "compare The Matrix and
+Inception and tell me the weather in London" costs three sequential steps.
+With native function calling the model can request all three calls in one
+step; ``ParallelFunctionCallingAgentWorker`` then runs them together on a
+thread pool (or ``asyncio`` for ``achat``), each with its own timeout, and
+feeds every result back to the model in the next step.
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import partial
+from threading import Thread
+from typing import Any, AsyncGenerator, Dict, Generator, List, Optional, Sequence
+
+from llama_index.core.agent import AgentRunner
+from llama_index.core.agent.function_calling.step import (
+    FunctionCallingAgentWorker,
+    build_missing_tool_output,
+    get_function_by_name,
+)
+from llama_index.core.agent.types import Task, TaskStep, TaskStepOutput
+from llama_index.core.agent.utils import add_user_step_to_memory
+from llama_index.core.callbacks import CallbackManager, CBEventType, EventPayload, trace_method
+from llama_index.core.chat_engine.types import AgentChatResponse, StreamingAgentChatResponse
+from llama_index.core.instrumentation import get_dispatcher
+from llama_index.core.instrumentation.events.agent import AgentToolCallEvent
+from llama_index.core.llms import ChatMessage, ChatResponse, MessageRole
+from llama_index.core.memory import BaseMemory
+from llama_index.core.tools import BaseTool, ToolMetadata, ToolOutput
+from llama_index.core.tools.calling import acall_tool_with_selection, call_tool_with_selection
+from llama_index.core.llms.llm import ToolSelection
+
+logger = logging.getLogger(__name__)
+dispatcher = get_dispatcher(__name__)
+
+DEFAULT_TOOL_TIMEOUT = 30.0
+
+
+def parse_tool_timeouts(spec: str) -> Dict[str, float]:
+    """Parse ``"knowledge_base=60,weather=5"`` into per-tool timeouts in seconds."""
+    timeouts = {}
+    for item in (spec or "").split(","):
+        name, sep, value = item.partition("=")
+        if not sep:
+            continue
+        try:
+            timeouts[name.strip()] = float(value)
+        except ValueError:
+            logger.warning(f"Ignoring invalid tool timeout '{item}'")
+    return timeouts
+
+
+def _timeout_output(tool_call: ToolSelection, timeout: float) -> ToolOutput:
+    return ToolOutput(
+        content=f"⏱️ {tool_call.tool_name} did not finish within {timeout:g}s; try again or use another tool.",
+        tool_name=tool_call.tool_name,
+        raw_input={"kwargs": tool_call.tool_kwargs},
+        raw_output=None,
+        is_error=True,
+    )
+
+
+class ParallelFunctionCallingAgentWorker(FunctionCallingAgentWorker):
+    """Function-calling agent worker that executes one step's tool calls concurrently."""
+
+    def __init__(
+        self,
+        *args: Any,
+        executor: Optional[ThreadPoolExecutor] = None,
+        tool_timeout: float = DEFAULT_TOOL_TIMEOUT,
+        tool_timeouts: Optional[Dict[str, float]] = None,
+        **kwargs: Any,
+    ):
+        """
+        Initialize the worker.
+
+        Args:
+            executor: Thread pool the tool calls run on (one is created if omitted)
+            tool_timeout: Seconds a tool call may take before its result is reported as timed out
+            tool_timeouts: Per-tool overrides of ``tool_timeout``
+            *args, **kwargs: Passed to ``FunctionCallingAgentWorker``
+        """
+        kwargs["allow_parallel_tool_calls"] = True
+        super().__init__(*args, **kwargs)
+        self._executor = executor or ThreadPoolExecutor(max_workers=8, thread_name_prefix="agent-tool")
+        self.tool_timeout = tool_timeout
+        self.tool_timeouts = dict(tool_timeouts or {})
+
+    def timeout_for(self, tool_name: str) -> float:
+        return self.tool_timeouts.get(tool_name, self.tool_timeout)
+
+    def _tool_metadata(self, tool: Optional[BaseTool], tool_call: ToolSelection) -> ToolMetadata:
+        return tool.metadata if tool is not None else ToolMetadata(description="", name=tool_call.tool_name)
+
+    def _record_output(self, tool_call: ToolSelection, output: ToolOutput, memory: BaseMemory, sources: List[ToolOutput]):
+        memory.put(ChatMessage(
+            content=str(output),
+            role=MessageRole.TOOL,
+            additional_kwargs={"name": tool_call.tool_name, "tool_call_id": tool_call.tool_id},
+        ))
+        sources.append(output)
+
+    def _call_functions(
+        self,
+        tools: Sequence[BaseTool],
+        tool_calls: List[ToolSelection],
+        memory: BaseMemory,
+        sources: List[ToolOutput],
+    ) -> List[bool]:
+        """
+        Run a step's tool calls concurrently and record their results in call order.
+
+        Returns:
+            Whether each tool returns its output directly
+        """
+        started = []
+        for tool_call in tool_calls:
+            tool = get_function_by_name(tools, tool_call.tool_name)
+            metadata = self._tool_metadata(tool, tool_call)
+            arguments = json.dumps(tool_call.tool_kwargs)
+            dispatcher.event(AgentToolCallEvent(arguments=arguments, tool=metadata))
+            # Each call gets its own context, so its callback event is not nested under its
+            # siblings and spans raised inside the tool stay attached to the current turn
+            context = contextvars.copy_context()
+            event_id = context.run(
+                self.callback_manager.on_event_start,
+                CBEventType.FUNCTION_CALL,
+                payload={EventPayload.FUNCTION_CALL: arguments, EventPayload.TOOL: metadata},
+            )
+            if tool is None:
+                future: Future = Future()
+                future.set_result(build_missing_tool_output(tool_call))
+            else:
+                future = self._executor.submit(
+                    context.run, call_tool_with_selection, tool_call, tools, self._verbose
+                )
+            deadline = time.monotonic() + self.timeout_for(tool_call.tool_name)
+            started.append((tool_call, tool, context, event_id, future, deadline))
+
+        return_directs = []
+        for tool_call, tool, context, event_id, future, deadline in started:
+            try:
+                output = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                # The thread cannot be interrupted; its late result is discarded
+                future.cancel()
+                timeout = self.timeout_for(tool_call.tool_name)
+                logger.warning(f"Tool {tool_call.tool_name} timed out after {timeout:g}s")
+                output = _timeout_output(tool_call, timeout)
+            except Exception as e:
+                logger.error(f"Tool {tool_call.tool_name} failed: {e}")
+                output = ToolOutput(
+                    content=f"Error: {e}", tool_name=tool_call.tool_name,
+                    raw_input={"kwargs": tool_call.tool_kwargs}, raw_output=e, is_error=True,
+                )
+            context.copy().run(
+                self.callback_manager.on_event_end,
+                CBEventType.FUNCTION_CALL,
+                payload={EventPayload.FUNCTION_OUTPUT: str(output)},
+                event_id=event_id,
+            )
+            self._record_output(tool_call, output, memory, sources)
+            return_directs.append(tool.metadata.return_direct if tool is not None else False)
+        return return_directs
+
+    async def _acall_function(
+        self,
+        tools: Sequence[BaseTool],
+        tool_call: ToolSelection,
+        memory: BaseMemory,
+        sources: List[ToolOutput],
+        verbose: bool = False,
+    ) -> bool:
+        """Run one tool call with its timeout (``arun_step`` gathers these concurrently)."""
+        tool = get_function_by_name(tools, tool_call.tool_name)
+        metadata = self._tool_metadata(tool, tool_call)
+        arguments = json.dumps(tool_call.tool_kwargs)
+        dispatcher.event(AgentToolCallEvent(arguments=arguments, tool=metadata))
+        with self.callback_manager.event(
+            CBEventType.FUNCTION_CALL,
+            payload={EventPayload.FUNCTION_CALL: arguments, EventPayload.TOOL: metadata},
+        ) as event:
+            if tool is None:
+                output = build_missing_tool_output(tool_call)
+            else:
+                timeout = self.timeout_for(tool_call.tool_name)
+                try:
+                    output = await asyncio.wait_for(
+                        acall_tool_with_selection(tool_call, tools, verbose=verbose), timeout
+                    )
+                except asyncio.TimeoutError:
+                    logger.warning(f"Tool {tool_call.tool_name} timed out after {timeout:g}s")
+                    output = _timeout_output(tool_call, timeout)
+            event.on_end(payload={EventPayload.FUNCTION_OUTPUT: str(output)})
+        self._record_output(tool_call, output, memory, sources)
+        return tool.metadata.return_direct if tool is not None else False
+
+    def _pending_tool_calls(self, task: Task, response: ChatResponse) -> List[ToolSelection]:
+        """Record a complete LLM response and return the tool calls still to run for it."""
+        tool_calls = self._llm.get_tool_calls_from_response(response, error_on_no_tool_call=False)
+        if self._verbose and response.message.content:
+            print("=== LLM Response ===")
+            print(str(response.message.content))
+        task.extra_state["new_memory"].put(response.message)
+        if task.extra_state["n_function_calls"] >= self._max_function_calls:
+            return []
+        return tool_calls
+
+    def _step_output(
+        self,
+        step: TaskStep,
+        task: Task,
+        response: ChatResponse,
+        tool_calls: List[ToolSelection],
+        tool_outputs: List[ToolOutput],
+        return_directs: Sequence[bool],
+        streaming: bool = False,
+    ) -> TaskStepOutput:
+        """Build the step output once the step's tool calls (if any) have run."""
+        task.extra_state["sources"].extend(tool_outputs)
+        task.extra_state["n_function_calls"] += len(tool_calls)
+        response_str = str(response.message.content or "")
+        # Returning a tool's output directly only makes sense for a single call
+        direct = len(tool_calls) == 1 and return_directs[0]
+        if direct:
+            response_str = str(tool_outputs[0].content)
+        is_done = not tool_calls or direct
+        agent_response = AgentChatResponse(
+            response=response_str, sources=tool_outputs, is_dummy_stream=streaming and is_done
+        )
+        return TaskStepOutput(
+            output=agent_response,
+            task_step=step,
+            is_last=is_done,
+            next_steps=[] if is_done else [step.get_next_step(step_id=str(uuid.uuid4()), input=None)],
+        )
+
+    def _finish_step(
+        self, step: TaskStep, task: Task, tools: Sequence[BaseTool], response: ChatResponse, streaming: bool = False
+    ) -> TaskStepOutput:
+        """Run the tool calls of a complete LLM response concurrently and build the step output."""
+        tool_calls = self._pending_tool_calls(task, response)
+        tool_outputs: List[ToolOutput] = []
+        return_directs = self._call_functions(tools, tool_calls, task.extra_state["new_memory"], tool_outputs)
+        return self._step_output(step, task, response, tool_calls, tool_outputs, return_directs, streaming)
+
+    async def _afinish_step(
+        self, step: TaskStep, task: Task, tools: Sequence[BaseTool], response: ChatResponse, streaming: bool = False
+    ) -> TaskStepOutput:
+        """Async counterpart of ``_finish_step``."""
+        tool_calls = self._pending_tool_calls(task, response)
+        tool_outputs: List[ToolOutput] = []
+        return_directs = await asyncio.gather(*(
+            self._acall_function(tools, tool_call, task.extra_state["new_memory"], tool_outputs, self._verbose)
+            for tool_call in tool_calls
+        ))
+        return self._step_output(step, task, response, tool_calls, tool_outputs, return_directs, streaming)
+
+    @trace_method("run_step")
+    def run_step(self, step: TaskStep, task: Task, **kwargs: Any) -> TaskStepOutput:
+        """Run step, executing all requested tool calls concurrently."""
+        if step.input is not None:
+            add_user_step_to_memory(step, task.extra_state["new_memory"], verbose=self._verbose)
+        tools = self.get_tools(task.input)
+        response = self._llm.chat_with_tools(
+            tools=tools,
+            user_msg=None,
+            chat_history=self.get_all_messages(task),
+            verbose=self._verbose,
+            allow_parallel_tool_calls=True,
+        )
+        return self._finish_step(step, task, tools, response)
+
+    @trace_method("run_step")
+    async def arun_step(self, step: TaskStep, task: Task, **kwargs: Any) -> TaskStepOutput:
+        """Run step (async), gathering all requested tool calls."""
+        if step.input is not None:
+            add_user_step_to_memory(step, task.extra_state["new_memory"], verbose=self._verbose)
+        tools = self.get_tools(task.input)
+        response = await self._llm.achat_with_tools(
+            tools=tools,
+            user_msg=None,
+            chat_history=self.get_all_messages(task),
+            verbose=self._verbose,
+            allow_parallel_tool_calls=True,
+        )
+        return await self._afinish_step(step, task, tools, response)
+
+    @staticmethod
+    def _is_answer_chunk(chunk: ChatResponse) -> bool:
+        """Whether a streamed chunk is answer text rather than part of a tool call."""
+        return bool(chunk.delta) and not chunk.message.additional_kwargs.get("tool_calls")
+
+    @trace_method("run_step")
+    def stream_step(self, step: TaskStep, task: Task, **kwargs: Any) -> TaskStepOutput:
+        """Run step (stream): answer text is streamed, tool calls are run concurrently."""
+        if step.input is not None:
+            add_user_step_to_memory(step, task.extra_state["new_memory"], verbose=self._verbose)
+        tools = self.get_tools(task.input)
+        chat_stream = self._llm.stream_chat_with_tools(
+            tools=tools,
+            chat_history=self.get_all_messages(task),
+            verbose=self._verbose,
+            allow_parallel_tool_calls=True,
+        )
+        last_chunk = ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=None))
+        for chunk in chat_stream:
+            last_chunk = chunk
+            if self._is_answer_chunk(chunk):
+                break
+        else:
+            return self._finish_step(step, task, tools, last_chunk, streaming=True)
+
+        def answer_stream(first: ChatResponse) -> Generator[ChatResponse, None, None]:
+            yield first
+            yield from chat_stream
+
+        response = StreamingAgentChatResponse(
+            chat_stream=answer_stream(last_chunk), sources=task.extra_state["sources"]
+        )
+        Thread(
+            target=response.write_response_to_history,
+            args=(task.extra_state["new_memory"],),
+            kwargs={"on_stream_end_fn": partial(self.finalize_task, task)},
+            daemon=True,
+        ).start()
+        return TaskStepOutput(output=response, task_step=step, is_last=True, next_steps=[])
+
+    @trace_method("run_step")
+    async def astream_step(self, step: TaskStep, task: Task, **kwargs: Any) -> TaskStepOutput:
+        """Run step (async stream)."""
+        if step.input is not None:
+            add_user_step_to_memory(step, task.extra_state["new_memory"], verbose=self._verbose)
+        tools = self.get_tools(task.input)
+        chat_stream = await self._llm.astream_chat_with_tools(
+            tools=tools,
+            chat_history=self.get_all_messages(task),
+            verbose=self._verbose,
+            allow_parallel_tool_calls=True,
+        )
+        last_chunk = ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=None))
+        is_answer = False
+        async for chunk in chat_stream:
+            last_chunk = chunk
+            if self._is_answer_chunk(chunk):
+                is_answer = True
+                break
+        if not is_answer:
+            return await self._afinish_step(step, task, tools, last_chunk, streaming=True)
+
+        async def answer_stream(first: ChatResponse) -> AsyncGenerator[ChatResponse, None]:
+            yield first
+            async for chunk in chat_stream:
+                yield chunk
+
+        response = StreamingAgentChatResponse(
+            achat_stream=answer_stream(last_chunk), sources=task.extra_state["sources"]
+        )
+        asyncio.create_task(
+            response.awrite_response_to_history(
+                task.extra_state["new_memory"],
+                on_stream_end_fn=partial(self.finalize_task, task),
+            )
+        )
+        response._ensure_async_setup()
+        await response.is_function_false_event.wait()
+        return TaskStepOutput(output=response, task_step=step, is_last=True, next_steps=[])
+
+
+def build_parallel_agent(
+    tools: List[BaseTool],
+    llm: Any,
+    memory: Optional[BaseMemory] = None,
+    callback_manager: Optional[CallbackManager] = None,
+    executor: Optional[ThreadPoolExecutor] = None,
+    tool_timeout: float = DEFAULT_TOOL_TIMEOUT,
+    tool_timeouts: Optional[Dict[str, float]] = None,
+    max_function_calls: int = 10,
+    verbose: bool = False,
+) -> AgentRunner:
+    """
+    Create an agent that runs independent tool calls of a step concurrently.
+
+    Args:
+        tools: Tools the agent may call
+        llm: Function-calling LLM (e.g. Groq)
+        memory: Chat memory (a fresh buffer if omitted)
+        callback_manager: Callback manager for tool, LLM and tracing events
+        executor: Thread pool shared by the agent's tool calls
+        tool_timeout: Default per-call timeout in seconds
+        tool_timeouts: Per-tool timeout overrides
+        max_function_calls: Tool calls per turn after which the agent must answer
+        verbose: Print steps and tool calls
+
+    Returns:
+        An AgentRunner with the same chat/stream_chat/achat/astream_chat interface as ReActAgent
+    """
+    if not getattr(llm.metadata, "is_function_calling_model", False):
+        raise ValueError(f"{llm.metadata.model_name} does not support function calling")
+    worker = ParallelFunctionCallingAgentWorker.from_tools(
+        tools=tools,
+        llm=llm,
+        verbose=verbose,
+        max_function_calls=max_function_calls,
+        callback_manager=callback_manager,
+        executor=executor,
+        tool_timeout=tool_timeout,
+        tool_timeouts=tool_timeouts,
+    )
+    return AgentRunner(
+        worker,
+        memory=memory,
+        llm=llm,
+        callback_manager=callback_manager,
+        verbose=verbose,
+    )
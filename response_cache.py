@@ -0,0 +1,231 @@
+"""
+Caches for repeated queries.
+
+Two tiers:
+
+* ``TTLCache`` / ``memoize`` memoize deterministic tools (calculator, movie
+  lookups, knowledge base queries) with a TTL and LRU eviction.
+* ``SemanticCache`` stores final answers keyed by the query embedding and
+  serves any later query whose embedding is within a cosine-similarity
+  threshold. Callers decide when conversation context or the user makes an
+  answer unsafe to reuse.
+"""
+
+import functools
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Messages that refer back to the conversation cannot be answered from a cache
+_CONTEXT_REFERENCE = re.compile(
+    r"\b(it|its|that|this|those|these|they|them|their|he|she|him|her|his|"
+    r"above|earlier|previous|previously|before|again|last|same|also|too|more)\b",
+    re.IGNORECASE,
+)
+
+
+def refers_to_context(message: str) -> bool:
+    """Whether a message likely depends on earlier turns ("what about its cast?")."""
+    return bool(_CONTEXT_REFERENCE.search(message))
+
+
+# Messages about the user are answered from their own memory, so their answers are never shared
+_USER_REFERENCE = re.compile(r"\b(i|me|my|mine|myself|we|our|ours|ourselves)\b", re.IGNORECASE)
+
+
+def refers_to_user(message: str) -> bool:
+    """Whether a message is about the user ("what's my favourite movie?"), even on a first turn."""
+    return bool(_USER_REFERENCE.search(message))
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 3600.0):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of entries; the least recently used are evicted
+            ttl: Seconds an entry stays valid (0 disables expiry)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        """Return the cached value for ``key``, or ``default`` if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if not expires or expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Any, value: Any):
+        """Store ``value`` under ``key``, evicting the least recently used entry if full."""
+        expires = time.monotonic() + self.ttl if self.ttl else 0.0
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry (e.g. after the underlying data changed)."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current size."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+        }
+
+
+def memoize(cache: TTLCache, should_cache: Callable[[Any], bool] = None) -> Callable:
+    """
+    Memoize a tool function in ``cache``, keyed by its arguments.
+
+    The wrapper keeps the function's signature and docstring, so tool schemas
+    generated from it are unchanged.
+
+    Args:
+        cache: Cache holding the results
+        should_cache: Predicate deciding whether a result may be cached (e.g. not errors)
+    """
+    missing = object()
+
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            key = (args, tuple(sorted(kwargs.items())))
+            result = cache.get(key, missing)
+            if result is missing:
+                result = fn(*args, **kwargs)
+                if should_cache is None or should_cache(result):
+                    cache.set(key, result)
+            return result
+        return wrapper
+    return decorator
+
+
+class SemanticCache:
+    """Final-answer cache keyed by query embedding, matched by cosine similarity."""
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 10000, ttl: float = 3600.0):
+        """
+        Initialize the cache.
+
+        Args:
+            threshold: Minimum cosine similarity between queries for a hit
+            max_entries: Maximum number of cached answers (least recently used are evicted)
+            ttl: Seconds an answer stays valid (0 disables expiry)
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._vectors: Optional[np.ndarray] = None
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._slots: "OrderedDict[int, Tuple[float, str, str]]" = OrderedDict()
+        self._free: List[int] = list(range(max_entries - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        return array / max(float(np.linalg.norm(array)), 1e-12)
+
+    def lookup(self, vector: List[float]) -> Optional[str]:
+        """Return the cached answer for the most similar query above the threshold."""
+        query = self._normalize(vector)
+        with self._lock:
+            if self._vectors is None or not self._slots:
+                self.misses += 1
+                return None
+            slots = np.fromiter(self._slots.keys(), dtype=np.int64, count=len(self._slots))
+            if self.ttl:
+                # Expired answers are dropped so they cannot shadow a valid, slightly less similar one
+                expires = self._expires[slots]
+                expired = (expires != 0) & (expires <= time.monotonic())
+                if expired.any():
+                    for slot in slots[expired].tolist():
+                        del self._slots[slot]
+                        self._free.append(slot)
+                    slots = slots[~expired]
+                    if not len(slots):
+                        self.misses += 1
+                        return None
+            scores = self._vectors[slots] @ query
+            best = int(np.argmax(scores))
+            slot = int(slots[best])
+            _, _, answer = self._slots[slot]
+            if scores[best] >= self.threshold:
+                self._slots.move_to_end(slot)
+                self.hits += 1
+                return answer
+            self.misses += 1
+            return None
+
+    def store(self, vector: List[float], query: str, answer: str):
+        """Cache ``answer`` for the query with embedding ``vector``."""
+        normalized = self._normalize(vector)
+        expires = time.monotonic() + self.ttl if self.ttl else 0.0
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(normalized)), dtype=np.float32)
+            if not self._free:
+                oldest, _ = self._slots.popitem(last=False)
+                self._free.append(oldest)
+            slot = self._free.pop()
+            self._vectors[slot] = normalized
+            self._expires[slot] = expires
+            self._slots[slot] = (expires, query, answer)
+
+    def record_bypass(self):
+        """Count a query that skipped the cache because it depends on conversation context."""
+        with self._lock:
+            self.bypassed += 1
+
+    def clear(self):
+        """Drop every cached answer."""
+        with self._lock:
+            self._free.extend(self._slots.keys())
+            self._slots.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/bypass counters and the current size."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._slots),
+            "threshold": self.threshold,
+        }
@@ -0,0 +1,425 @@
+"""
+Safe arithmetic engine for the calculator tool.
+
+Expressions are parsed with ``ast`` and compiled into small closures instead of
+being passed to ``eval``. Every operation is checked against limits on integer
+size, exponent and evaluation time, so inputs such as ``9**9**9`` fail fast
+instead of pinning a core. Parsed expressions are cached, and a batch of
+expressions with the same shape (differing only in their numbers) is evaluated
+in one pass with NumPy.
+"""
+
+import ast
+import functools
+import math
+import operator
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+Number = Union[int, float]
+
+# Largest integer a float64 represents exactly; vectorized results beyond it are recomputed exactly
+_EXACT_FLOAT_LIMIT = 2 ** 53
+
+# Largest |ndigits| accepted by round(); past float64's range it changes nothing, while a huge
+# negative value makes Python build an enormous power of ten before any time limit is checked
+MAX_ROUND_DIGITS = 400
+
+CONSTANTS = {"pi": math.pi, "e": math.e, "tau": math.tau}
+
+
+class CalculatorError(ValueError):
+    """An expression that is invalid or exceeds the calculator's limits."""
+
+
+def _log(x: Number, base: Optional[Number] = None) -> float:
+    return math.log(x) if base is None else math.log(x, base)
+
+
+def _vector_log(x: np.ndarray, base: Optional[np.ndarray] = None) -> np.ndarray:
+    return np.log(x) if base is None else np.log(x) / np.log(base)
+
+
+# name: (scalar implementation, vectorized implementation or None, min args, max args or None)
+FUNCTIONS: Dict[str, Tuple[Callable, Optional[Callable], int, Optional[int]]] = {
+    "sqrt": (math.sqrt, np.sqrt, 1, 1),
+    "log": (_log, _vector_log, 1, 2),
+    "ln": (math.log, np.log, 1, 1),
+    "log10": (math.log10, np.log10, 1, 1),
+    "log2": (math.log2, np.log2, 1, 1),
+    "exp": (math.exp, np.exp, 1, 1),
+    "sin": (math.sin, np.sin, 1, 1),
+    "cos": (math.cos, np.cos, 1, 1),
+    "tan": (math.tan, np.tan, 1, 1),
+    "asin": (math.asin, np.arcsin, 1, 1),
+    "acos": (math.acos, np.arccos, 1, 1),
+    "atan": (math.atan, np.arctan, 1, 1),
+    "radians": (math.radians, np.radians, 1, 1),
+    "degrees": (math.degrees, np.degrees, 1, 1),
+    "abs": (abs, np.abs, 1, 1),
+    "round": (round, None, 1, 2),
+    "floor": (math.floor, np.floor, 1, 1),
+    "ceil": (math.ceil, np.ceil, 1, 1),
+    "min": (min, lambda *args: functools.reduce(np.minimum, args), 2, None),
+    "max": (max, lambda *args: functools.reduce(np.maximum, args), 2, None),
+    "factorial": (math.factorial, None, 1, 1),
+}
+
+_BINARY_OPS = {
+    ast.Add: ("add", operator.add),
+    ast.Sub: ("sub", operator.sub),
+    ast.Mult: ("mul", operator.mul),
+    ast.Div: ("div", operator.truediv),
+    ast.FloorDiv: ("floordiv", operator.floordiv),
+    ast.Mod: ("mod", operator.mod),
+    ast.Pow: ("pow", operator.pow),
+}
+_BINARY = {name: fn for name, fn in _BINARY_OPS.values()}
+_VECTOR_BINARY = {
+    "add": np.add, "sub": np.subtract, "mul": np.multiply, "div": np.true_divide,
+    "floordiv": np.floor_divide, "mod": np.mod, "pow": np.power,
+}
+
+# "15% of 80" -> "(15/100)*80"; "80 * 15%" -> "80 * (15/100)"; "%" between operands stays modulo
+_PERCENT_OF = re.compile(r"(\d+(?:\.\d+)?)\s*%\s*of\b", re.IGNORECASE)
+_PERCENT = re.compile(r"(\d+(?:\.\d+)?)\s*%(?!\s*[\d(.a-z])", re.IGNORECASE)
+_REPLACEMENTS = str.maketrans({"×": "*", "÷": "/", "−": "-", "^": "**"})
+
+
+def normalize_expression(expression: str) -> str:
+    """Rewrite common notations (``^``, ``×``, ``÷``, percentages) into Python syntax."""
+    text = expression.strip().translate(_REPLACEMENTS)
+    text = _PERCENT_OF.sub(r"(\1/100)*", text)
+    return _PERCENT.sub(r"(\1/100)", text)
+
+
+def format_number(value: Number) -> str:
+    """Format a result: integers exactly, floats to 15 significant digits."""
+    if isinstance(value, float):
+        return f"{value:.15g}"
+    return str(value)
+
+
+class _Compiled:
+    """An expression shape compiled to a closure over its constants."""
+
+    __slots__ = ("fn", "vectorizable")
+
+    def __init__(self, fn: Callable, vectorizable: bool):
+        self.fn = fn
+        self.vectorizable = vectorizable
+
+
+class _Parsed:
+    """A parsed expression: its shape, its numbers and the compiled shape."""
+
+    __slots__ = ("key", "constants", "compiled", "exact_in_float")
+
+    def __init__(self, key: str, constants: Tuple[Number, ...], compiled: _Compiled):
+        self.key = key
+        self.constants = constants
+        self.compiled = compiled
+        self.exact_in_float = all(abs(c) < _EXACT_FLOAT_LIMIT for c in constants)
+
+
+class _ScalarOps:
+    """Exact evaluation with size, exponent and time limits."""
+
+    def __init__(self, max_int_bits: int, max_exponent: float, deadline: float):
+        self.max_int_bits = max_int_bits
+        self.max_exponent = max_exponent
+        self.deadline = deadline
+
+    def _check(self, value: Any) -> Number:
+        if time.perf_counter() > self.deadline:
+            raise CalculatorError("Evaluation timed out")
+        if isinstance(value, complex):
+            raise CalculatorError("Math domain error")
+        if isinstance(value, int) and value.bit_length() > self.max_int_bits:
+            raise CalculatorError("Result too large")
+        if isinstance(value, float) and not math.isfinite(value):
+            raise CalculatorError("Result too large" if not math.isnan(value) else "Math domain error")
+        return value
+
+    def _check_pow(self, base: Number, exponent: Number):
+        if abs(base) in (0, 1):
+            return
+        if abs(exponent) > self.max_exponent:
+            raise CalculatorError("Exponent too large")
+        if isinstance(base, int) and isinstance(exponent, int) and exponent > 0:
+            if (base.bit_length() - 1) * exponent > self.max_int_bits:
+                raise CalculatorError("Result too large")
+
+    def binary(self, name: str, left: Number, right: Number) -> Number:
+        if name == "pow":
+            self._check_pow(left, right)
+        elif name == "mul" and isinstance(left, int) and isinstance(right, int):
+            if left.bit_length() + right.bit_length() > self.max_int_bits + 1:
+                raise CalculatorError("Result too large")
+        try:
+            result = _BINARY[name](left, right)
+        except ZeroDivisionError:
+            raise CalculatorError("Division by zero")
+        except OverflowError:
+            raise CalculatorError("Result too large")
+        return self._check(result)
+
+    def neg(self, value: Number) -> Number:
+        return -value
+
+    def call(self, name: str, args: List[Number]) -> Number:
+        if name == "factorial":
+            n = args[0]
+            if not isinstance(n, int) or n < 0:
+                raise CalculatorError("factorial() needs a non-negative integer")
+            if math.lgamma(n + 1) / math.log(2) > self.max_int_bits:
+                raise CalculatorError("Result too large")
+        elif name == "round" and len(args) == 2:
+            if isinstance(args[1], int) and abs(args[1]) > MAX_ROUND_DIGITS:
+                raise CalculatorError(f"round() digits must be between -{MAX_ROUND_DIGITS} and {MAX_ROUND_DIGITS}")
+        try:
+            result = FUNCTIONS[name][0](*args)
+        except ZeroDivisionError:
+            raise CalculatorError("Division by zero")
+        except OverflowError:
+            raise CalculatorError("Result too large")
+        except (ValueError, TypeError):
+            raise CalculatorError(f"Math domain error in {name}()")
+        return self._check(result)
+
+
+class _VectorOps:
+    """Float64 evaluation over arrays; rows that hit a limit are flagged for exact re-evaluation."""
+
+    def __init__(self, rows: int, max_exponent: float):
+        self.max_exponent = max_exponent
+        self.invalid = np.zeros(rows, dtype=bool)
+
+    def _track(self, value: np.ndarray) -> np.ndarray:
+        # An intermediate past 2**53 may already have lost digits ("3**40 + 1 - 3**40"),
+        # even when the final value is small, so such rows are recomputed exactly
+        self.invalid |= ~(np.abs(value) < _EXACT_FLOAT_LIMIT)
+        return value
+
+    def binary(self, name: str, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+        if name == "pow":
+            self.invalid |= (np.abs(right) > self.max_exponent) & (np.abs(left) != 0) & (np.abs(left) != 1)
+        elif name in ("div", "floordiv", "mod"):
+            self.invalid |= np.asarray(right) == 0
+        return self._track(_VECTOR_BINARY[name](left, right))
+
+    def neg(self, value: np.ndarray) -> np.ndarray:
+        return np.negative(value)
+
+    def call(self, name: str, args: List[np.ndarray]) -> np.ndarray:
+        return self._track(FUNCTIONS[name][1](*args))
+
+
+class _Compiler:
+    """Validates an expression tree and compiles it into closures ``fn(constants, ops)``."""
+
+    def __init__(self, max_nodes: int):
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        self.constants: List[Number] = []
+        self.shape: List[str] = []
+        self.vectorizable = True
+
+    def compile(self, node: ast.AST) -> Callable:
+        self.nodes += 1
+        if self.nodes > self.max_nodes:
+            raise CalculatorError("Expression is too long")
+        if isinstance(node, ast.Constant):
+            if type(node.value) not in (int, float):
+                raise CalculatorError(f"Unsupported value {node.value!r}")
+            index = len(self.constants)
+            self.constants.append(node.value)
+            self.shape.append("c")
+            return lambda c, ops: c[index]
+        if isinstance(node, ast.Name):
+            if node.id not in CONSTANTS:
+                raise CalculatorError(f"Unknown name '{node.id}'")
+            value = CONSTANTS[node.id]
+            self.shape.append(node.id)
+            return lambda c, ops: value
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+            name = _BINARY_OPS[type(node.op)][0]
+            self.shape.append(f"{name}(")
+            left, right = self.compile(node.left), self.compile(node.right)
+            self.shape.append(")")
+            return lambda c, ops: ops.binary(name, left(c, ops), right(c, ops))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            self.shape.append("neg(" if isinstance(node.op, ast.USub) else "pos(")
+            operand = self.compile(node.operand)
+            self.shape.append(")")
+            if isinstance(node.op, ast.UAdd):
+                return operand
+            return lambda c, ops: ops.neg(operand(c, ops))
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+                name = node.func.id if isinstance(node.func, ast.Name) else "this function"
+                raise CalculatorError(f"Unknown function '{name}'")
+            name = node.func.id
+            _, vectorized, min_args, max_args = FUNCTIONS[name]
+            if len(node.args) < min_args or (max_args is not None and len(node.args) > max_args):
+                raise CalculatorError(f"Wrong number of arguments for {name}()")
+            self.vectorizable &= vectorized is not None
+            self.shape.append(f"{name}(")
+            args = [self.compile(arg) for arg in node.args]
+            self.shape.append(")")
+            return lambda c, ops: ops.call(name, [arg(c, ops) for arg in args])
+        raise CalculatorError(f"Unsupported syntax: {type(node).__name__}")
+
+
+class SafeCalculator:
+    """Evaluates arithmetic expressions within limits, with parse caching and batch mode."""
+
+    def __init__(self, max_length: int = 500, max_nodes: int = 200, max_int_bits: int = 4096,
+                 max_exponent: float = 10000, timeout: float = 0.05, cache_size: int = 4096,
+                 min_batch: int = 8):
+        """
+        Initialize the calculator.
+
+        Args:
+            max_length: Maximum expression length in characters
+            max_nodes: Maximum number of syntax nodes (numbers, operators, calls)
+            max_int_bits: Maximum size of an integer operand or result in bits
+            max_exponent: Maximum absolute exponent
+            timeout: Maximum evaluation time per expression in seconds
+            cache_size: Number of parsed expressions kept
+            min_batch: Smallest group of same-shape expressions evaluated with NumPy
+        """
+        self.max_length = max_length
+        self.max_nodes = max_nodes
+        self.max_int_bits = max_int_bits
+        self.max_exponent = max_exponent
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.min_batch = min_batch
+        self._parsed: "OrderedDict[str, _Parsed]" = OrderedDict()
+        self._shapes: Dict[str, _Compiled] = {}
+        self._lock = threading.Lock()
+
+    def parse(self, expression: str) -> _Parsed:
+        """Parse and compile an expression, reusing cached results."""
+        with self._lock:
+            parsed = self._parsed.get(expression)
+            if parsed is not None:
+                self._parsed.move_to_end(expression)
+                return parsed
+        text = normalize_expression(expression)
+        if not text:
+            raise CalculatorError("Empty expression")
+        if len(text) > self.max_length:
+            raise CalculatorError("Expression is too long")
+        try:
+            tree = ast.parse(text, mode="eval")
+        except SyntaxError:
+            raise CalculatorError(f"Invalid expression: {expression}")
+        compiler = _Compiler(self.max_nodes)
+        fn = compiler.compile(tree.body)
+        key = " ".join(compiler.shape)
+        with self._lock:
+            compiled = self._shapes.get(key)
+            if compiled is None:
+                compiled = self._shapes[key] = _Compiled(fn, compiler.vectorizable)
+            parsed = _Parsed(key, tuple(compiler.constants), compiled)
+            self._parsed[expression] = parsed
+            while len(self._parsed) > self.cache_size:
+                self._parsed.popitem(last=False)
+            if len(self._shapes) > self.cache_size:
+                self._shapes = {p.key: p.compiled for p in self._parsed.values()}
+        return parsed
+
+    def _evaluate(self, parsed: _Parsed) -> Number:
+        ops = _ScalarOps(self.max_int_bits, self.max_exponent, time.perf_counter() + self.timeout)
+        return ops._check(parsed.compiled.fn(parsed.constants, ops))
+
+    def evaluate(self, expression: str) -> Number:
+        """
+        Evaluate one expression.
+
+        Args:
+            expression: Arithmetic such as ``"sqrt(2) * 15% of 80"``
+
+        Returns:
+            The result (an exact ``int`` where possible)
+
+        Raises:
+            CalculatorError: If the expression is invalid or exceeds a limit
+        """
+        return self._evaluate(self.parse(expression))
+
+    def evaluate_many(self, expressions: Sequence[str]) -> List[Union[Number, CalculatorError]]:
+        """
+        Evaluate a batch of expressions.
+
+        Expressions with the same shape are evaluated together with NumPy once a
+        group reaches ``min_batch``; results of those groups are floats. Rows that
+        would lose precision or hit a limit are re-evaluated exactly.
+
+        Args:
+            expressions: Expressions to evaluate
+
+        Returns:
+            One result per expression, or the ``CalculatorError`` it raised
+        """
+        results: List[Union[Number, CalculatorError, None]] = [None] * len(expressions)
+        groups: Dict[str, List[Tuple[int, _Parsed]]] = defaultdict(list)
+        for i, expression in enumerate(expressions):
+            try:
+                parsed = self.parse(expression)
+            except CalculatorError as e:
+                results[i] = e
+                continue
+            if parsed.compiled.vectorizable and parsed.exact_in_float:
+                groups[parsed.key].append((i, parsed))
+            else:
+                results[i] = self._evaluate_or_error(parsed)
+        for members in groups.values():
+            if len(members) < self.min_batch:
+                for i, parsed in members:
+                    results[i] = self._evaluate_or_error(parsed)
+                continue
+            matrix = np.array([parsed.constants for _, parsed in members], dtype=np.float64)
+            columns = [matrix[:, j] for j in range(matrix.shape[1])]
+            ops = _VectorOps(len(members), self.max_exponent)
+            with np.errstate(all="ignore"):
+                values = np.broadcast_to(members[0][1].compiled.fn(columns, ops), (len(members),))
+                retry = ops.invalid | ~np.isfinite(values) | (np.abs(values) >= _EXACT_FLOAT_LIMIT)
+            for row, (i, parsed) in enumerate(members):
+                results[i] = self._evaluate_or_error(parsed) if retry[row] else float(values[row])
+        return results
+
+    def _evaluate_or_error(self, parsed: _Parsed) -> Union[Number, CalculatorError]:
+        try:
+            return self._evaluate(parsed)
+        except CalculatorError as e:
+            return e
+
+    def __call__(self, expression: str) -> str:
+        """
+        Evaluate one expression, or several separated by ``;`` or newlines, as tool output.
+
+        Returns:
+            ``"Result: <value>"`` for one expression, one ``"<expression> = <value>"``
+            line per expression for several, and ``"Error: ..."`` for failures
+        """
+        parts = [part.strip() for part in re.split(r"[;\n]", expression) if part.strip()]
+        if len(parts) <= 1:
+            try:
+                return f"Result: {format_number(self.evaluate(parts[0] if parts else ''))}"
+            except CalculatorError as e:
+                return f"Error: {e}"
+        lines = []
+        for part, result in zip(parts, self.evaluate_many(parts)):
+            if isinstance(result, CalculatorError):
+                lines.append(f"{part}: Error: {result}")
+            else:
+                lines.append(f"{part} = {format_number(result)}")
+        return "\n".join(lines)
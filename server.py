@@ -0,0 +1,740 @@
+#!/usr/bin/env python3
+"""
+Multi-worker HTTP server for the AI Agent.
+
+The parent process loads the read-only state once (the embedding model weights
+and the knowledge base index), freezes it out of the garbage collector's reach
+and forks ``--workers`` worker processes, which share those pages copy-on-write.
+The movie catalog, the recommendation vectors and the knowledge base vectors
+are memory-mapped files, so workers share them through the page cache as well. Persisted artifacts are
+built or updated first in a throwaway process so the parent never runs model
+inference before forking.
+
+The parent owns the listening socket. It reads each request, routes it to a
+worker (chat sessions always go to the same worker, which holds their history)
+and hands the connection over with its file descriptor. Each worker runs at most
+``--concurrency`` turns at once plus ``--max-queue`` waiting ones; beyond that
+the parent answers 503 with ``Retry-After``. SIGTERM or Ctrl+C drains: no new
+connections are accepted, in-flight turns finish (up to ``--drain-timeout``) and
+workers flush their memory writes before exiting.
+
+Endpoints:
+    POST /chat          {"message": ..., "session_id": ...} -> {"response": ..., "session_id": ...}
+    POST /chat/stream   same body; server-sent events: token, then done (or error)
+    GET  /health        worker status, in-flight turns and per-worker memory
+
+Usage:
+    python server.py [--host 127.0.0.1] [--port 8000] [--workers N] [--concurrency N]
+"""
+
+import argparse
+import asyncio
+import gc
+import http
+import http.client
+import io
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import selectors
+import signal
+import socket
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024
+# Worker -> parent control messages
+_READY = b"r"
+_DONE = b"d"
+
+
+def preload(documents_path: Optional[str], index_dir: str) -> Dict[str, Any]:
+    """
+    Load the read-only state shared by every worker: embedding model weights and the knowledge index.
+
+    Nothing here runs inference, so no thread pools are started before forking. ONNX
+    Runtime sessions own threads from the start, so with ``EMBED_BACKEND=onnx*`` each
+    worker loads its own session (and index).
+
+    Returns:
+        Keyword arguments for ``AIAgent`` (``embed_model``, ``knowledge_index``)
+    """
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    backend = os.getenv("EMBED_BACKEND", "huggingface").lower()
+    if backend.startswith("onnx"):
+        logger.info("ONNX Runtime sessions are not fork-safe; each worker loads its own model")
+        return {}
+    try:
+        import torch
+
+        # Keep the intra-op pool unstarted until the workers set their own thread counts
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+
+    from fast_embedding import create_embed_model
+
+    shared: Dict[str, Any] = {"embed_model": create_embed_model(backend)}
+    if documents_path and os.path.exists(documents_path):
+        from knowledge_index import PersistentKnowledgeIndex
+
+        knowledge_index = PersistentKnowledgeIndex(
+            documents_path,
+            index_dir,
+            embed_model=shared["embed_model"],
+            chunk_size=int(os.getenv("KB_CHUNK_SIZE", "1024")),
+            chunk_overlap=int(os.getenv("KB_CHUNK_OVERLAP", "200")),
+        )
+        # The server never updates the index in place, so its vectors can stay memory-mapped
+        loaded = knowledge_index.load(mmap=True)
+        if loaded is not None:
+            knowledge_index.index = loaded[0]
+            shared["knowledge_index"] = knowledge_index
+        else:
+            logger.warning("Knowledge index is missing or stale; workers will load it themselves")
+    return shared
+
+
+def _prepare(groq_api_key: str, documents_path: Optional[str], index_dir: str):
+    """Build or update every persisted artifact (index, catalog, vectors) in a throwaway process."""
+    from agent_ import AIAgent
+
+    AIAgent(groq_api_key, documents_path, index_dir=index_dir, lazy=False, warmup=False).close()
+
+
+def prepare(groq_api_key: str, documents_path: Optional[str], index_dir: str):
+    """Run ``_prepare`` in a spawned process, so model inference never happens in the parent."""
+    process = multiprocessing.get_context("spawn").Process(
+        target=_prepare, args=(groq_api_key, documents_path, index_dir), name="agent-prepare"
+    )
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"Preparing the agent's indexes failed (exit code {process.exitcode})")
+
+
+def _response(status: int, body: bytes, content_type: str = "application/json",
+              headers: Optional[Dict[str, str]] = None) -> bytes:
+    """Serialize a complete HTTP/1.1 response that closes the connection."""
+    lines = [
+        f"HTTP/1.1 {status} {http.HTTPStatus(status).phrase}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        "Connection: close",
+    ]
+    lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+def _json_response(status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> bytes:
+    return _response(status, json.dumps(payload).encode("utf-8"), headers=headers)
+
+
+def _memory_usage(pid: int) -> Dict[str, float]:
+    """Resident and proportional set size (shared pages split between processes) in MB, on Linux."""
+    usage = {}
+    for path, fields in ((f"/proc/{pid}/status", {"VmRSS:": "rss_mb"}),
+                         (f"/proc/{pid}/smaps_rollup", {"Pss:": "pss_mb"})):
+        try:
+            with open(path, "r") as f:
+                for line in f:
+                    parts = line.split()
+                    if parts and parts[0] in fields:
+                        usage[fields[parts[0]]] = round(int(parts[1]) / 1024, 1)
+        except (OSError, ValueError, IndexError):
+            pass
+    return usage
+
+
+class _Request:
+    """A connection whose request the parent is still reading."""
+
+    __slots__ = ("sock", "address", "buffer", "deadline", "head_end", "method", "path", "content_length")
+
+    def __init__(self, sock: socket.socket, address: Any, deadline: float):
+        self.sock = sock
+        self.address = address
+        self.buffer = bytearray()
+        self.deadline = deadline
+        self.head_end = -1
+        self.method = ""
+        self.path = ""
+        self.content_length = 0
+
+
+class _WorkerSlot:
+    """Parent-side bookkeeping of one worker process."""
+
+    __slots__ = ("index", "pid", "ctrl", "ready", "inflight", "served", "started")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.pid = 0
+        self.ctrl: Optional[socket.socket] = None
+        self.ready = False
+        self.inflight = 0
+        self.served = 0
+        self.started = 0.0
+
+
+class Worker:
+    """Runs inside a worker process: serves the connections the parent hands over."""
+
+    def __init__(self, ctrl: socket.socket, agent: Any, concurrency: int, request_timeout: float,
+                 drain_timeout: float):
+        """
+        Initialize the worker.
+
+        Args:
+            ctrl: Control socket to the parent (requests with their connections in, ready/done out)
+            agent: The worker's ``AIAgent``
+            concurrency: Turns handled at once
+            request_timeout: Seconds a turn may take before the client gets a 504
+            drain_timeout: Seconds in-flight turns get to finish on shutdown
+        """
+        self.ctrl = ctrl
+        self.agent = agent
+        self.request_timeout = request_timeout
+        self.drain_timeout = drain_timeout
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="server-request")
+        self.loop = asyncio.new_event_loop()
+        self.draining = threading.Event()
+        self._send_lock = threading.Lock()
+
+    def _notify(self, message: bytes):
+        try:
+            with self._send_lock:
+                self.ctrl.send(message)
+        except OSError:
+            pass
+
+    def run(self) -> int:
+        """Serve until SIGTERM, then drain."""
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.draining.set())
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        threading.Thread(target=self.loop.run_forever, name="server-agent-loop", daemon=True).start()
+        self._notify(_READY)
+        self.ctrl.settimeout(0.5)
+        while True:
+            if self.draining.is_set():
+                # Take whatever the parent already dispatched, then stop
+                self.ctrl.setblocking(False)
+            try:
+                message, fds, _, _ = socket.recv_fds(self.ctrl, MAX_BODY_BYTES + MAX_HEADER_BYTES, 1)
+            except (socket.timeout, BlockingIOError, InterruptedError):
+                if self.draining.is_set():
+                    break
+                continue
+            except OSError:
+                break
+            if not message and not fds:
+                # Parent went away
+                break
+            if not fds:
+                continue
+            conn = socket.socket(fileno=fds[0])
+            try:
+                request = json.loads(message)
+            except ValueError:
+                conn.close()
+                self._notify(_DONE)
+                continue
+            self.executor.submit(self._handle, conn, request)
+        return self._drain()
+
+    def _drain(self) -> int:
+        start = time.monotonic()
+        self.executor.shutdown(wait=False)
+        for thread in list(getattr(self.executor, "_threads", ())):
+            thread.join(max(self.drain_timeout - (time.monotonic() - start), 0))
+        try:
+            self.agent.close()
+        except Exception as e:
+            logger.warning(f"Worker {os.getpid()} failed to close the agent: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        logger.info(f"Worker {os.getpid()} drained in {time.monotonic() - start:.2f}s")
+        return 0
+
+    def _handle(self, conn: socket.socket, request: Dict[str, Any]):
+        try:
+            conn.settimeout(self.request_timeout)
+            try:
+                body = json.loads(request.get("body") or "{}")
+                message = body.get("message") if isinstance(body, dict) else None
+            except ValueError:
+                message = None
+            if not isinstance(message, str) or not message.strip():
+                conn.sendall(_json_response(400, {"error": "Body must be JSON with a non-empty 'message'"}))
+                return
+            session_id = body.get("session_id")
+            session_id = str(session_id) if session_id is not None else None
+            if request["path"] == "/chat/stream":
+                self._stream(conn, message, session_id)
+            else:
+                self._chat(conn, message, session_id)
+        except OSError as e:
+            logger.debug(f"Client went away: {e}")
+        except Exception as e:
+            logger.error(f"Request failed: {e}")
+            try:
+                conn.sendall(_json_response(500, {"error": str(e)}))
+            except OSError:
+                pass
+        finally:
+            conn.close()
+            self._notify(_DONE)
+
+    def _chat(self, conn: socket.socket, message: str, session_id: Optional[str]):
+        future = asyncio.run_coroutine_threadsafe(self.agent.achat(message, session_id=session_id), self.loop)
+        try:
+            response = future.result(timeout=self.request_timeout)
+        except TimeoutError:
+            # Stop the turn too, or it keeps running after the parent reuses this slot
+            future.cancel()
+            conn.sendall(_json_response(504, {"error": "The agent did not answer in time"}))
+            return
+        conn.sendall(_json_response(200, {"response": response, "session_id": session_id, "worker": os.getpid()}))
+
+    def _stream(self, conn: socket.socket, message: str, session_id: Optional[str]):
+        chunks: "queue.Queue" = queue.Queue()
+        finished = object()
+
+        async def pump():
+            async for chunk in self.agent.astream_chat(message, session_id=session_id):
+                chunks.put(chunk)
+
+        start = time.perf_counter()
+        future = asyncio.run_coroutine_threadsafe(pump(), self.loop)
+        future.add_done_callback(lambda _: chunks.put(finished))
+        conn.sendall(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        parts: List[str] = []
+        ttft = None
+        deadline = time.monotonic() + self.request_timeout
+        try:
+            while True:
+                try:
+                    chunk = chunks.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    event = {"type": "error", "message": "The agent did not answer in time"}
+                    break
+                if chunk is finished:
+                    error = future.exception()
+                    event = ({"type": "error", "message": str(error)} if error is not None else
+                             {"type": "done", "response": "".join(parts), "ttft": ttft,
+                              "total": time.perf_counter() - start})
+                    break
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                parts.append(chunk)
+                conn.sendall(f"data: {json.dumps({'type': 'token', 'text': chunk})}\n\n".encode("utf-8"))
+            conn.sendall(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        finally:
+            # A client that went away stops the writes but the turn still completes;
+            # hold the slot until it does, and cancel it once the deadline passes
+            wait([future], timeout=max(deadline - time.monotonic(), 0))
+            if not future.done():
+                future.cancel()
+
+
+class PreforkServer:
+    """Parent process: accepts connections, routes requests to forked workers and supervises them."""
+
+    def __init__(
+        self,
+        agent_factory: Callable[[Dict[str, Any]], Any],
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        workers: int = 2,
+        concurrency: int = 8,
+        max_queue: int = 16,
+        drain_timeout: float = 30.0,
+        request_timeout: float = 120.0,
+        header_timeout: float = 10.0,
+        shared: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Initialize the server.
+
+        Args:
+            agent_factory: Builds a worker's agent from the shared state (called in each worker)
+            host: Interface to listen on
+            port: Port to listen on (0 picks a free one; see ``address`` after ``start``)
+            workers: Number of worker processes
+            concurrency: Turns each worker handles at once
+            max_queue: Requests each worker may have waiting beyond ``concurrency`` before 503s
+            drain_timeout: Seconds in-flight turns get to finish on shutdown
+            request_timeout: Seconds a turn may take before the client gets a 504
+            header_timeout: Seconds a client has to send its complete request
+            shared: Read-only state loaded before forking (see ``preload``)
+        """
+        if not hasattr(os, "fork") or not hasattr(socket, "send_fds"):
+            raise RuntimeError("The multi-worker server needs os.fork and socket.send_fds (Linux or macOS)")
+        self.agent_factory = agent_factory
+        self.host = host
+        self.port = port
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.drain_timeout = drain_timeout
+        self.request_timeout = request_timeout
+        self.header_timeout = header_timeout
+        self.shared = shared or {}
+        self.slots = [_WorkerSlot(i) for i in range(max(workers, 1))]
+        self.address: Optional[Tuple[str, int]] = None
+        self.rejected = 0
+        self._listener: Optional[socket.socket] = None
+        self._selector = selectors.DefaultSelector()
+        self._pending: Dict[int, _Request] = {}
+        self._stopping = False
+
+    # --- supervision -------------------------------------------------------
+
+    def start(self):
+        """Bind the listening socket and fork the workers."""
+        self._listener = socket.create_server((self.host, self.port), backlog=1024, reuse_port=False)
+        self._listener.setblocking(False)
+        self.address = self._listener.getsockname()[:2]
+        # Objects loaded so far are never collected; the collector would otherwise
+        # write to their pages and un-share them in every worker
+        gc.collect()
+        gc.freeze()
+        for slot in self.slots:
+            self._spawn(slot)
+        self._selector.register(self._listener, selectors.EVENT_READ, "accept")
+        logger.info(f"Serving on http://{self.address[0]}:{self.address[1]} with {len(self.slots)} workers")
+
+    def _spawn(self, slot: _WorkerSlot):
+        parent_end, child_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        for end in (parent_end, child_end):
+            end.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * (MAX_BODY_BYTES + MAX_HEADER_BYTES))
+        pid = os.fork()
+        if pid == 0:
+            parent_end.close()
+            os._exit(self._run_worker(slot, child_end))
+        child_end.close()
+        slot.pid, slot.ctrl, slot.ready, slot.inflight, slot.started = pid, parent_end, False, 0, time.time()
+        self._selector.register(parent_end, selectors.EVENT_READ, slot)
+        logger.info(f"Started worker {slot.index} (pid {pid})")
+
+    def _run_worker(self, slot: _WorkerSlot, ctrl: socket.socket) -> int:
+        """Worker process body; never returns to the parent's code."""
+        try:
+            # Inherited descriptors belong to the parent
+            self._selector.close()
+            if self._listener is not None:
+                self._listener.close()
+            for pending in self._pending.values():
+                pending.sock.close()
+            for other in self.slots:
+                if other.ctrl is not None:
+                    other.ctrl.close()
+            threads = int(os.getenv("EMBED_THREADS", "0")) or max((os.cpu_count() or 1) // len(self.slots), 1)
+            if "torch" in sys.modules:
+                sys.modules["torch"].set_num_threads(threads)
+            # Every worker schedules LLM calls on its own, so each gets a share of the account's limits
+            os.environ["LLM_PROCESSES"] = str(max(int(os.getenv("LLM_PROCESSES", "1")), 1) * len(self.slots))
+            agent = self.agent_factory(self.shared)
+            return Worker(ctrl, agent, self.concurrency, self.request_timeout, self.drain_timeout).run()
+        except Exception as e:
+            logger.error(f"Worker {slot.index} failed: {e}")
+            return 1
+
+    def _reap(self):
+        """Collect exited workers and replace them unless the server is stopping."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            for slot in self.slots:
+                if slot.pid != pid:
+                    continue
+                if self._stopping and status == 0:
+                    logger.info(f"Worker {slot.index} (pid {pid}) stopped")
+                else:
+                    logger.warning(f"Worker {slot.index} (pid {pid}) exited with status {status}")
+                slot.pid = 0
+                if slot.ctrl is not None:
+                    self._selector.unregister(slot.ctrl)
+                    slot.ctrl.close()
+                    slot.ctrl = None
+                if not self._stopping:
+                    self._spawn(slot)
+
+    def stop(self, signum: int = 0, frame: Any = None):
+        """Begin a graceful drain (also the SIGTERM/SIGINT handler)."""
+        self._stopping = True
+
+    def serve_forever(self):
+        """Serve until SIGTERM/SIGINT, then drain the workers."""
+        if self._listener is None:
+            self.start()
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        while not self._stopping:
+            for key, _ in self._selector.select(timeout=0.5):
+                if key.data == "accept":
+                    self._accept()
+                elif isinstance(key.data, _WorkerSlot):
+                    self._read_control(key.data)
+                else:
+                    self._read_request(key.data)
+            self._expire()
+            self._reap()
+        self._drain()
+
+    def _drain(self):
+        logger.info("Draining: no new connections, waiting for in-flight turns")
+        self._selector.unregister(self._listener)
+        self._listener.close()
+        for request in list(self._pending.values()):
+            self._reply(request, _json_response(503, {"error": "Server is shutting down"}))
+        for slot in self.slots:
+            if slot.pid:
+                os.kill(slot.pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.drain_timeout + 5
+        while any(slot.pid for slot in self.slots) and time.monotonic() < deadline:
+            for key, _ in self._selector.select(timeout=0.2):
+                if isinstance(key.data, _WorkerSlot):
+                    self._read_control(key.data)
+            self._reap()
+        for slot in self.slots:
+            if slot.pid:
+                logger.warning(f"Worker {slot.index} (pid {slot.pid}) did not drain in time; killing it")
+                os.kill(slot.pid, signal.SIGKILL)
+                os.waitpid(slot.pid, 0)
+                slot.pid = 0
+        self._selector.close()
+        logger.info("Server stopped")
+
+    def _read_control(self, slot: _WorkerSlot):
+        while slot.ctrl is not None:
+            try:
+                message = slot.ctrl.recv(16, socket.MSG_DONTWAIT)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                message = b""
+            if not message:
+                # The worker exited; _reap replaces it
+                self._selector.unregister(slot.ctrl)
+                slot.ctrl.close()
+                slot.ctrl = None
+                return
+            if message == _READY:
+                slot.ready = True
+                logger.info(f"Worker {slot.index} (pid {slot.pid}) ready in {time.time() - slot.started:.2f}s")
+            elif message == _DONE:
+                slot.inflight = max(slot.inflight - 1, 0)
+                slot.served += 1
+
+    # --- requests ----------------------------------------------------------
+
+    def _accept(self):
+        while len(self._pending) < 1024:
+            try:
+                sock, address = self._listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logger.warning(f"Accept failed: {e}")
+                return
+            sock.setblocking(False)
+            request = _Request(sock, address, time.monotonic() + self.header_timeout)
+            self._pending[sock.fileno()] = request
+            self._selector.register(sock, selectors.EVENT_READ, request)
+
+    def _expire(self):
+        now = time.monotonic()
+        for request in [r for r in self._pending.values() if r.deadline < now]:
+            self._reply(request, _json_response(408, {"error": "Request not received in time"}))
+
+    def _forget(self, request: _Request):
+        if self._pending.pop(request.sock.fileno(), None) is not None:
+            self._selector.unregister(request.sock)
+
+    def _reply(self, request: _Request, response: bytes):
+        """Answer a request from the parent (errors, health, 503s) and close it."""
+        self._forget(request)
+        try:
+            request.sock.setblocking(True)
+            request.sock.settimeout(1.0)
+            request.sock.sendall(response)
+        except OSError:
+            pass
+        finally:
+            request.sock.close()
+
+    def _read_request(self, request: _Request):
+        try:
+            data = request.sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._forget(request)
+            request.sock.close()
+            return
+        request.buffer += data
+        if request.head_end < 0:
+            head_end = request.buffer.find(b"\r\n\r\n")
+            if head_end < 0:
+                if len(request.buffer) > MAX_HEADER_BYTES:
+                    self._reply(request, _json_response(431, {"error": "Request headers too large"}))
+                return
+            try:
+                request_line, _, rest = bytes(request.buffer[:head_end]).partition(b"\r\n")
+                request.method, request.path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = http.client.parse_headers(io.BytesIO(rest + b"\r\n\r\n"))
+                request.content_length = int(headers.get("Content-Length") or 0)
+            except ValueError:
+                self._reply(request, _json_response(400, {"error": "Malformed request"}))
+                return
+            if request.content_length > MAX_BODY_BYTES:
+                self._reply(request, _json_response(413, {"error": f"Body over {MAX_BODY_BYTES} bytes"}))
+                return
+            request.head_end = head_end + 4
+        if len(request.buffer) - request.head_end >= request.content_length:
+            self._route(request)
+
+    def _route(self, request: _Request):
+        path = request.path.split("?", 1)[0]
+        if request.method == "GET" and path == "/health":
+            status = 503 if self._stopping else 200
+            self._reply(request, _json_response(status, self.health()))
+            return
+        if path not in ("/chat", "/chat/stream"):
+            self._reply(request, _json_response(404, {"error": f"No route for {request.method} {path}"}))
+            return
+        if request.method != "POST":
+            self._reply(request, _json_response(405, {"error": "Use POST"}))
+            return
+        body = bytes(request.buffer[request.head_end:request.head_end + request.content_length])
+        slot = self._pick_worker(body)
+        if slot is None:
+            self.rejected += 1
+            self._reply(request, _json_response(503, {"error": "All workers are busy; retry shortly"},
+                                                headers={"Retry-After": "1"}))
+            return
+        envelope = json.dumps({"method": request.method, "path": path,
+                               "body": body.decode("utf-8", errors="replace")}).encode("utf-8")
+        self._forget(request)
+        try:
+            socket.send_fds(slot.ctrl, [envelope], [request.sock.fileno()])
+            slot.inflight += 1
+        except OSError as e:
+            logger.warning(f"Could not hand a request to worker {slot.index}: {e}")
+            self._reply(request, _json_response(503, {"error": "Worker unavailable; retry shortly"},
+                                                headers={"Retry-After": "1"}))
+            return
+        # The worker holds its own copy of the descriptor now
+        request.sock.close()
+
+    def _pick_worker(self, body: bytes) -> Optional[_WorkerSlot]:
+        """The worker owning the request's session, or the least busy one; None when saturated."""
+        limit = self.concurrency + self.max_queue
+        session_id = None
+        try:
+            payload = json.loads(body or b"{}")
+            if isinstance(payload, dict) and payload.get("session_id") is not None:
+                session_id = str(payload["session_id"])
+        except ValueError:
+            pass
+        if session_id is not None:
+            # A session's history lives in one worker, so its turns must always go there
+            slot = self.slots[zlib.crc32(session_id.encode("utf-8")) % len(self.slots)]
+            return slot if slot.ctrl is not None and slot.inflight < limit else None
+        available = [slot for slot in self.slots if slot.ctrl is not None and slot.inflight < limit]
+        return min(available, key=lambda slot: (not slot.ready, slot.inflight)) if available else None
+
+    def health(self) -> Dict[str, Any]:
+        """Worker status, in-flight turns, capacity and per-worker memory."""
+        workers = []
+        for slot in self.slots:
+            entry = {"index": slot.index, "pid": slot.pid, "ready": slot.ready,
+                     "inflight": slot.inflight, "served": slot.served}
+            if slot.pid:
+                entry.update(_memory_usage(slot.pid))
+            workers.append(entry)
+        return {
+            "status": "draining" if self._stopping else "ok",
+            "workers": workers,
+            "inflight": sum(slot.inflight for slot in self.slots),
+            "capacity": len(self.slots) * self.concurrency,
+            "rejected": self.rejected,
+            "parent": dict(_memory_usage(os.getpid()), pid=os.getpid()),
+        }
+
+
+def _create_agent(groq_api_key: str, documents_path: Optional[str], index_dir: str, concurrency: int,
+                  shared: Dict[str, Any]) -> Any:
+    from agent_ import AIAgent
+
+    return AIAgent(groq_api_key, documents_path, index_dir=index_dir, lazy=False, warmup=False,
+                   max_concurrency=concurrency, **shared)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command-line entry point."""
+    import functools
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Serve the AI Agent over HTTP with several worker processes")
+    parser.add_argument("--host", default=os.getenv("SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVER_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SERVER_WORKERS", "0")) or (os.cpu_count() or 2),
+                        help="Worker processes (default: one per CPU)")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("SERVER_CONCURRENCY", "8")),
+                        help="Turns each worker handles at once")
+    parser.add_argument("--max-queue", type=int, default=int(os.getenv("SERVER_MAX_QUEUE", "16")),
+                        help="Requests each worker may have waiting before new ones get 503")
+    parser.add_argument("--drain-timeout", type=float, default=float(os.getenv("SERVER_DRAIN_TIMEOUT", "30")))
+    parser.add_argument("--request-timeout", type=float, default=float(os.getenv("SERVER_REQUEST_TIMEOUT", "120")))
+    parser.add_argument("--no-prepare", action="store_true",
+                        help="Skip building/updating the persisted indexes before starting")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(name)s %(levelname)s %(message)s")
+    groq_api_key = os.getenv("GROQ_API_KEY")
+    if not groq_api_key:
+        print("Please set the GROQ_API_KEY environment variable")
+        return 2
+    documents_path = os.getenv("DOCUMENTS_PATH", "./documents")
+    index_dir = os.getenv("INDEX_DIR", "./storage")
+
+    if not args.no_prepare:
+        prepare(groq_api_key, documents_path, index_dir)
+    shared = preload(documents_path, index_dir)
+    server = PreforkServer(
+        functools.partial(_create_agent, groq_api_key, documents_path, index_dir, args.concurrency),
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        concurrency=args.concurrency,
+        max_queue=args.max_queue,
+        drain_timeout=args.drain_timeout,
+        request_timeout=args.request_timeout,
+        shared=shared,
+    )
+    server.serve_forever()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
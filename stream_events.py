@@ -0,0 +1,80 @@
+"""
+Tool-step events for streaming chat.
+
+``ToolEventHandler`` is a LlamaIndex callback handler that forwards the agent's
+tool calls and results to whichever stream is running in the current context,
+so a caller rendering tokens can also show "calling movie_info..." as it
+happens. The sink lives in a ContextVar rather than a thread-local, so tool
+calls run on the parallel tool pool or LlamaIndex's worker threads (both of
+which copy the caller's context) still reach it. Contexts without an attached
+sink are ignored.
+"""
+
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+from llama_index.core.callbacks import CBEventType, EventPayload
+from llama_index.core.callbacks.base_handler import BaseCallbackHandler
+
+
+class _Stream:
+    """The sink of one streamed turn and the names of its open tool calls."""
+
+    __slots__ = ("sink", "tools")
+
+    def __init__(self, sink: Callable[[Dict[str, Any]], None]):
+        self.sink = sink
+        self.tools: Dict[str, str] = {}
+
+
+_current_stream: ContextVar[Optional[_Stream]] = ContextVar("tool_event_stream", default=None)
+
+
+class ToolEventHandler(BaseCallbackHandler):
+    """Forwards FUNCTION_CALL start/end callbacks to the current context's event sink."""
+
+    def __init__(self):
+        super().__init__(event_starts_to_ignore=[], event_ends_to_ignore=[])
+
+    def attach(self, sink: Callable[[Dict[str, Any]], None]):
+        """Send tool events raised in the current context, and contexts copied from it, to ``sink``."""
+        _current_stream.set(_Stream(sink))
+
+    def detach(self):
+        """Stop forwarding tool events for the current context."""
+        _current_stream.set(None)
+
+    def on_event_start(
+        self,
+        event_type: CBEventType,
+        payload: Optional[Dict[str, Any]] = None,
+        event_id: str = "",
+        parent_id: str = "",
+        **kwargs: Any,
+    ) -> str:
+        stream = _current_stream.get()
+        if stream is not None and event_type == CBEventType.FUNCTION_CALL and payload:
+            tool = payload.get(EventPayload.TOOL)
+            name = getattr(tool, "name", None) or "unknown"
+            stream.tools[event_id] = name
+            stream.sink({"type": "tool_call", "tool": name, "input": payload.get(EventPayload.FUNCTION_CALL)})
+        return event_id
+
+    def on_event_end(
+        self,
+        event_type: CBEventType,
+        payload: Optional[Dict[str, Any]] = None,
+        event_id: str = "",
+        **kwargs: Any,
+    ) -> None:
+        stream = _current_stream.get()
+        if stream is not None and event_type == CBEventType.FUNCTION_CALL:
+            name = stream.tools.pop(event_id, "unknown")
+            output = (payload or {}).get(EventPayload.FUNCTION_OUTPUT, "")
+            stream.sink({"type": "tool_result", "tool": name, "output": str(output)})
+
+    def start_trace(self, trace_id: Optional[str] = None) -> None:
+        pass
+
+    def end_trace(self, trace_id: Optional[str] = None, trace_map: Optional[Dict[str, Any]] = None) -> None:
+        pass